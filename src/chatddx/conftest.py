@@ -1,6 +1,8 @@
 import pytest
 from django.contrib.contenttypes.models import ContentType
 
+from chatddx.core.identity_cache import identity_cache
+
 
 @pytest.fixture(scope="session")
 def django_db_setup(django_test_environment, django_db_blocker):  # type: ignore
@@ -20,3 +22,10 @@ def django_db_setup(django_test_environment, django_db_blocker):  # type: ignore
 def clear_content_type_cache():
     ContentType.objects.clear_cache()
     yield
+
+
+@pytest.fixture(autouse=True)
+def clear_identity_cache():
+    # the database is flushed between tests, cached rows would outlive it
+    identity_cache.clear()
+    yield
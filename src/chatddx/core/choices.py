@@ -42,3 +42,10 @@ class MessageKindChoices(TextChoices):
     RESPONSE = "response"
     ERROR = "error"
     PROMPT = "prompt"
+
+
+class JobStatusChoices(TextChoices):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
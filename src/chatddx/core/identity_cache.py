@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+
+from chatddx.core.models import IdentityModel
+
+
+@dataclass
+class IdentityCacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+
+class IdentityCache:
+    """
+    Identities by name for the API request path, created on first use like
+    ensure_identity. Secrets are decrypted when the row is loaded, so a hit
+    costs neither a query nor a decrypt.
+
+    Saving or deleting an identity drops it in this process, other processes
+    see the change once their entry expires after ttl seconds. Cached
+    identities are shared between requests and must not be modified.
+    """
+
+    cache: OrderedDict[str, tuple[float, IdentityModel]]
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.stats = IdentityCacheStats()
+        self._lock = Lock()
+
+    async def aget(self, name: str) -> IdentityModel:
+        with self._lock:
+            if (entry := self.cache.get(name)) is not None:
+                expires, identity = entry
+
+                if expires > time.monotonic():
+                    self.cache.move_to_end(name)
+                    self.stats.hits += 1
+                    return identity
+
+            self.stats.misses += 1
+
+        identity, _ = await IdentityModel.objects.aget_or_create(name=name)
+
+        with self._lock:
+            self.cache[name] = (time.monotonic() + self.ttl, identity)
+            self.cache.move_to_end(name)
+
+            while len(self.cache) > self.max_size:
+                _ = self.cache.popitem(last=False)
+
+            self.stats.size = len(self.cache)
+
+        return identity
+
+    def invalidate(self, pk: Any):
+        # by pk, the name it is cached under may be the one it was renamed from
+        with self._lock:
+            for name in [
+                name for name, (_, identity) in self.cache.items() if identity.pk == pk
+            ]:
+                del self.cache[name]
+                self.stats.invalidations += 1
+
+            self.stats.size = len(self.cache)
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.stats = IdentityCacheStats()
+
+
+def invalidate_identity(sender, instance: IdentityModel, **kwargs):
+    identity_cache.invalidate(instance.pk)
+
+
+identity_cache = IdentityCache(
+    max_size=getattr(settings, "IDENTITY_CACHE_MAX_SIZE", 1024),
+    ttl=getattr(settings, "IDENTITY_CACHE_TTL", 60),
+)
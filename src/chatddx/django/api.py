@@ -1,17 +1,37 @@
-from asgiref.sync import sync_to_async
+import hashlib
+from collections.abc import AsyncIterator
+from typing import Any
+from uuid import UUID
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpRequest
+from django.core.cache import BaseCache, caches
+from django.http import HttpRequest, StreamingHttpResponse
 from ninja import NinjaAPI, Schema
-from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai import TextPart
+from pydantic_core import to_json, to_jsonable_python
 
+from chatddx.core.choices import JobStatusChoices
+from chatddx.core.identity_cache import identity_cache
 from chatddx.core.models import IdentityModel
+from chatddx.history.models import SessionModel
 from chatddx.history.session import start_session
+from chatddx.repo.base import BranchSpec
 from chatddx.repo.shufflers.main import (
-    ensure_identity,
     load_agents_async,
     load_branch_async,
 )
-from chatddx.runtime.runners import run_from_session
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.batch import BatchCase, BatchItem, run_batch
+from chatddx.runtime.errors import execution_error
+from chatddx.runtime.runners import (
+    StreamChunk,
+    run_from_session,
+    stream_from_session,
+)
+from chatddx.runtime.single_flight import single_flight
+from chatddx.runtime.tasks import diagnose_queue, diagnose_task
+from chatddx.utils import make_async
 
 api = NinjaAPI(title="ChatDDx Swift API", version="1.0.0")
 User = get_user_model()
@@ -20,6 +40,21 @@ User = get_user_model()
 class SwiftDiagnoseRequest(Schema):
     symptoms: str
     model: str
+    # replay an identical earlier run if the agent samples deterministically,
+    # streamed runs are never replayed
+    cache: bool = False
+
+
+class SwiftBatchCase(Schema):
+    symptoms: str
+    id: str | None = None
+
+
+class SwiftDiagnoseBatchRequest(Schema):
+    cases: list[SwiftBatchCase]
+    model: str
+    concurrency: int | None = None
+    timeout: float | None = None
 
 
 class ModelOptionResponse(Schema):
@@ -27,20 +62,23 @@ class ModelOptionResponse(Schema):
     label: str
 
 
-def get_authenticated_username(request: HttpRequest) -> IdentityModel:
-    if not request.user or request.user.is_anonymous:
+async def get_authenticated_username(request: HttpRequest) -> IdentityModel:
+    # requests built without the auth middleware, like ninja's test client,
+    # only carry a resolved user
+    auser = getattr(request, "auser", None)
+    user = await auser() if auser else request.user
+
+    if not user or user.is_anonymous:
         username = "guest"
     else:
-        username = request.user.username
+        username = user.username
 
-    owner = ensure_identity(username)
-
-    return owner
+    return await identity_cache.aget(username)
 
 
 @api.get("/agents", response=list[ModelOptionResponse])
 async def get_agents_endpoint(request: HttpRequest, output_type: str | None = None):
-    owner = await sync_to_async(get_authenticated_username)(request)
+    owner = await get_authenticated_username(request)
 
     agents = await load_agents_async(owner_name=owner.name, output_type=output_type)
 
@@ -49,58 +87,298 @@ async def get_agents_endpoint(request: HttpRequest, output_type: str | None = No
     return options
 
 
+async def load_diagnose_branch(owner: IdentityModel, model: str):
+    agent = await load_branch_async(
+        bundle_name="agent",
+        owner_name=owner.name,
+        branch_name=model,
+    )
+
+    if not agent:
+        raise ValueError(f"No configuration branch found named '{model}'")
+
+    return agent
+
+
+def load_error(owner: IdentityModel, model: str, e: Exception) -> dict[str, str]:
+    return {
+        "error": f"could not load model '{model}' found registered for user '{owner.name}'. Detail: {e}"
+    }
+
+
 @api.post("/diagnose")
 async def swift_diagnose_endpoint(request: HttpRequest, payload: SwiftDiagnoseRequest):
-    owner = await sync_to_async(get_authenticated_username)(request)
+    """
+    Identical requests in flight at the same time share one run. With an
+    Idempotency-Key header, a request retried after its run finished gets
+    the stored answer instead of a new run.
+    """
+    owner = await get_authenticated_username(request)
 
     try:
-        agent = await load_branch_async(
-            bundle_name="agent",
-            owner_name=owner.name,
-            branch_name=payload.model,
+        agent = await load_diagnose_branch(owner, payload.model)
+    except Exception as e:
+        return api.create_response(
+            request, load_error(owner, payload.model, e), status=400
         )
 
-        if not agent:
-            raise ValueError(f"No configuration branch found named '{payload.model}'")
+    request_hash = hashlib.sha256(to_json(payload)).hexdigest()
+    idempotency_key = request.headers.get("Idempotency-Key")
+    stored_key = None
 
-        agent_spec = agent.target
+    if idempotency_key:
+        key_hash = hashlib.sha256(idempotency_key.encode()).hexdigest()
+        stored_key = f"idempotency:{owner.pk}:{key_hash}"
 
-    except Exception as e:
-        return api.create_response(
-            request,
-            {
-                "error": f"could not load model '{payload.model}' found registered for user '{owner.name}'. Detail: {e}"
-            },
-            status=400,
+        if (stored := await idempotency_cache().aget(stored_key)) is not None:
+            if stored["request"] != request_hash:
+                return api.create_response(
+                    request,
+                    {"error": "Idempotency-Key was used for a different request"},
+                    status=422,
+                )
+
+            response = api.create_response(
+                request, stored["body"], status=stored["status"]
+            )
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+    status, body = await single_flight.do(
+        ("diagnose", owner.pk, agent.target.fingerprint, request_hash),
+        lambda: run_diagnose(owner, agent, payload),
+    )
+
+    # server errors are worth retrying, everything else is the answer
+    if stored_key and status < 500:
+        _ = await idempotency_cache().aadd(
+            stored_key,
+            {"request": request_hash, "status": status, "body": body},
+            timeout=getattr(settings, "IDEMPOTENCY_TTL", 24 * 60 * 60),
         )
 
+    return api.create_response(request, body, status=status)
+
+
+def idempotency_cache() -> BaseCache:
+    return caches[getattr(settings, "IDEMPOTENCY_CACHE_ALIAS", "default")]
+
+
+async def run_diagnose(
+    owner: IdentityModel,
+    agent: BranchSpec[AgentSpec],
+    payload: SwiftDiagnoseRequest,
+) -> tuple[int, Any]:
     api_key = owner.secrets.get("api-keys", {}).get(agent.name)
-    session = await start_session(owner.pk, agent.id)
+    session = await start_session(owner.pk, agent)
 
     try:
         run_result = await run_from_session(
             session=session,
             prompt=payload.symptoms,
-            agent_spec=agent_spec,
+            agent_spec=agent.target,
             api_key=api_key,
+            cache=payload.cache,
+        )
+        return 200, to_jsonable_python(run_result.output)
+
+    except Exception as e:
+        return execution_error(e)
+
+
+@api.post("/diagnose/stream")
+async def swift_diagnose_stream_endpoint(
+    request: HttpRequest, payload: SwiftDiagnoseRequest
+):
+    owner = await get_authenticated_username(request)
+
+    try:
+        agent = await load_diagnose_branch(owner, payload.model)
+    except Exception as e:
+        return api.create_response(
+            request, load_error(owner, payload.model, e), status=400
+        )
+
+    api_key = owner.secrets.get("api-keys", {}).get(agent.name)
+    session = await start_session(owner.pk, agent)
+
+    events = diagnose_events(
+        stream_from_session(
+            session=session,
+            prompt=payload.symptoms,
+            agent_spec=agent.target,
+            api_key=api_key,
+        )
+    )
+
+    return event_stream_response(request, events)
+
+
+@api.post("/diagnose/batch")
+async def swift_diagnose_batch_endpoint(
+    request: HttpRequest, payload: SwiftDiagnoseBatchRequest
+):
+    owner = await get_authenticated_username(request)
+
+    try:
+        agent = await load_diagnose_branch(owner, payload.model)
+    except Exception as e:
+        return api.create_response(
+            request, load_error(owner, payload.model, e), status=400
         )
-        return run_result.output
 
-    except ModelHTTPError as e:
-        error_message = "An upstream model error occurred."
-        if isinstance(e.body, dict) and "message" in e.body:
-            error_message = e.body["message"]
-        elif hasattr(e, "message"):
-            error_message = e.message
+    api_key = owner.secrets.get("api-keys", {}).get(agent.name)
+
+    items = run_batch(
+        owner.pk,
+        agent,
+        [BatchCase(case.symptoms, case.id) for case in payload.cases],
+        api_key=api_key,
+        concurrency=payload.concurrency,
+        timeout=payload.timeout,
+    )
+
+    return event_stream_response(request, batch_events(items))
+
 
+@api.post("/diagnose/jobs")
+async def swift_diagnose_submit_endpoint(
+    request: HttpRequest, payload: SwiftDiagnoseRequest
+):
+    owner = await get_authenticated_username(request)
+
+    try:
+        agent = await load_diagnose_branch(owner, payload.model)
+    except Exception as e:
         return api.create_response(
-            request,
-            {"error": error_message},
-            status=400,
+            request, load_error(owner, payload.model, e), status=400
+        )
+
+    session = await start_session(owner.pk, agent)
+    _ = await SessionModel.objects.filter(pk=session.id).aupdate(
+        job_status=JobStatusChoices.QUEUED
+    )
+
+    # queued before publishing, a worker may pick the job up right away.
+    # publishing to the broker is blocking io
+    try:
+        _ = await make_async(diagnose_task.apply_async)(
+            args=[session.id, payload.symptoms, payload.cache],
+            queue=diagnose_queue(agent.target),
         )
     except Exception as e:
+        # no worker will ever run it, do not leave it queued
+        status, body = execution_error(e)
+        _ = await SessionModel.objects.filter(pk=session.id).aupdate(
+            job_status=JobStatusChoices.FAILED,
+            job_error=body | {"status": status},
+        )
+        return api.create_response(
+            request, body | {"job": str(session.uuid)}, status=status
+        )
+
+    return api.create_response(
+        request,
+        {"job": str(session.uuid), "status": JobStatusChoices.QUEUED},
+        status=202,
+    )
+
+
+@api.get("/diagnose/jobs/{job}")
+async def swift_diagnose_poll_endpoint(request: HttpRequest, job: UUID):
+    owner = await get_authenticated_username(request)
+
+    session = await SessionModel.objects.filter(
+        uuid=job, owner=owner, job_status__isnull=False
+    ).afirst()
+
+    if session is None:
         return api.create_response(
-            request,
-            {"error": f"Execution error: {str(e)}"},
-            status=500,
+            request, {"error": f"No diagnose job '{job}'"}, status=404
         )
+
+    body: dict[str, Any] = {"job": str(session.uuid), "status": session.job_status}
+
+    match session.job_status:
+        case JobStatusChoices.SUCCEEDED:
+            body["output"] = session.job_output
+        case JobStatusChoices.FAILED:
+            error = session.job_error or {}
+            body["error"] = error.get("error")
+            body["error_status"] = error.get("status")
+
+    return body
+
+
+def event_stream_response(
+    request: HttpRequest,
+    events: AsyncIterator[tuple[str, Any]],
+) -> StreamingHttpResponse:
+    if "text/event-stream" in request.headers.get("Accept", ""):
+        content_type = "text/event-stream"
+        lines = (format_sse(event, data) async for event, data in events)
+    else:
+        content_type = "application/x-ndjson"
+        lines = (format_ndjson(event, data) async for event, data in events)
+
+    return StreamingHttpResponse(
+        lines,
+        content_type=content_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def diagnose_events(
+    chunks: AsyncIterator[StreamChunk],
+) -> AsyncIterator[tuple[str, Any]]:
+    # "delta" carries new text, "output" the partial structured output and
+    # "result" the final output, the same body /diagnose returns. Errors
+    # after the response has started are sent in band with their status.
+    text = ""
+
+    try:
+        async for chunk in chunks:
+            content = "".join(
+                part.content
+                for part in chunk.response.parts
+                if isinstance(part, TextPart)
+            )
+
+            if len(content) > len(text) and content.startswith(text):
+                yield "delta", {"text": content[len(text) :]}
+            text = content
+
+            if chunk.is_last:
+                yield "result", chunk.output
+            elif chunk.output is not None and not isinstance(chunk.output, str):
+                yield "output", chunk.output
+
+    except Exception as e:
+        status, body = execution_error(e)
+        yield "error", body | {"status": status}
+
+
+async def batch_events(
+    items: AsyncIterator[BatchItem],
+) -> AsyncIterator[tuple[str, Any]]:
+    # one "result" or "error" event per case, in completion order
+    async for item in items:
+        case = {
+            "index": item.index,
+            "id": item.case.id,
+            "session": str(item.session.uuid),
+        }
+
+        if item.error is None:
+            yield "result", case | {"output": item.output}
+        else:
+            status, body = execution_error(item.error)
+            yield "error", case | body | {"status": status}
+
+
+def format_sse(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + to_json(data) + b"\n\n"
+
+
+def format_ndjson(event: str, data: Any) -> bytes:
+    return to_json({"event": event, "data": data}) + b"\n"
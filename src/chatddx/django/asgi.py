@@ -1,3 +1,25 @@
 from django.core.asgi import get_asgi_application
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # django does not speak the lifespan protocol, answer it here so pooled
+    # http clients are closed and queued writes flushed on shutdown
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    from chatddx.runtime.http_pool import http_pool
+    from chatddx.runtime.runners import write_behind
+
+    while True:
+        message = await receive()
+
+        match message["type"]:
+            case "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            case "lifespan.shutdown":
+                await write_behind.aclose()
+                await http_pool.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
@@ -5,6 +5,7 @@ app = Celery("app")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
+app.autodiscover_tasks(["chatddx.runtime"])
 
 
 @app.task(bind=True, ignore_result=True)
@@ -1,7 +1,7 @@
 from pathlib import Path
 
 from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class OrmConfig(AppConfig):
@@ -9,7 +9,12 @@ class OrmConfig(AppConfig):
     verbose_name = "Database"
 
     def ready(self):
+        from chatddx.core.identity_cache import invalidate_identity
+        from chatddx.core.models import IdentityModel
+
         post_migrate.connect(install_trail_triggers, sender=self)
+        post_save.connect(invalidate_identity, sender=IdentityModel)
+        post_delete.connect(invalidate_identity, sender=IdentityModel)
 
 
 def install_trail_triggers(sender, **kwargs):
@@ -0,0 +1,56 @@
+# Generated by Django 6.0.5 on 2026-10-18 15:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BRANCH_TABLES = [
+    "agents_agent_branch",
+    "agents_connection_branch",
+    "agents_sampling_params_branch",
+    "agents_output_type_branch",
+    "agents_tool_group_branch",
+    "agents_tool_branch",
+]
+
+
+def backfill_branch_heads(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in BRANCH_TABLES:
+            cursor.execute(
+                f"""
+                INSERT INTO agents_branch_head
+                    (branch_table, owner_id, name, head_id, version_count)
+                SELECT DISTINCT ON (owner_id, name)
+                    %s, owner_id, name, id, COUNT(*) OVER (PARTITION BY owner_id, name)
+                FROM {table}
+                ORDER BY owner_id, name, timestamp DESC, id DESC
+                """,
+                [table],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0009_sharedagent_sharedsuperagent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchHeadModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch_table', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=255)),
+                ('head_id', models.BigIntegerField()),
+                ('version_count', models.PositiveIntegerField(default=1)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='orm.identitymodel')),
+            ],
+            options={
+                'db_table': 'agents_branch_head',
+                'constraints': [models.UniqueConstraint(fields=('branch_table', 'owner', 'name'), name='unique_branch_head')],
+            },
+        ),
+        migrations.RunPython(backfill_branch_heads, migrations.RunPython.noop),
+    ]
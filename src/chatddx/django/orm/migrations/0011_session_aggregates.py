@@ -0,0 +1,59 @@
+# Generated by Django 6.0.5 on 2026-10-18 16:06
+
+import datetime
+from django.db import migrations, models
+
+
+def backfill_session_aggregates(apps, schema_editor):
+    from chatddx.history.aggregates import rebuild_session_aggregates
+
+    _ = rebuild_session_aggregates(
+        apps.get_model("orm", "SessionModel"),
+        apps.get_model("orm", "MessageModel"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0010_branchheadmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='first_message_at',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='input_tokens',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='last_kind',
+            field=models.CharField(choices=[('request', 'Request'), ('response', 'Response'), ('error', 'Error'), ('prompt', 'Prompt')], default=None, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='last_message_at',
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='latency',
+            field=models.DurationField(default=datetime.timedelta(0)),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='messages'),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='output_tokens',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_session_aggregates, migrations.RunPython.noop),
+    ]
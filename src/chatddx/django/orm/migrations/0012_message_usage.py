@@ -0,0 +1,49 @@
+# Generated by Django 6.0.5 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+def backfill_message_usage(apps, schema_editor):
+    from chatddx.history.aggregates import rebuild_message_usage
+
+    _ = rebuild_message_usage(apps.get_model("orm", "MessageModel"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0011_session_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagemodel',
+            name='cache_read_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagemodel',
+            name='input_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagemodel',
+            name='latency',
+            field=models.DurationField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='messagemodel',
+            name='model_name',
+            field=models.CharField(db_index=True, default=None, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='messagemodel',
+            name='output_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['agent', 'timestamp'], name='message_agent_timestamp'),
+        ),
+        migrations.RunPython(backfill_message_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.5 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0012_message_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='job_error',
+            field=models.JSONField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='job_output',
+            field=models.JSONField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='sessionmodel',
+            name='job_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default=None, max_length=255, null=True),
+        ),
+    ]
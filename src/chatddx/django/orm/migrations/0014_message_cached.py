@@ -0,0 +1,18 @@
+# Generated by Django 6.0.5 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0013_session_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagemodel',
+            name='cached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.5 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orm', '0014_message_cached'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='messagemodel',
+            index=models.Index(fields=['session', 'id'], name='message_session_id'),
+        ),
+    ]
@@ -4,6 +4,7 @@ from typing import Any, cast, no_type_check, override
 
 from django.contrib import admin, messages
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.db.models import Model as DjangoModel
 from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponseRedirect
@@ -12,11 +13,14 @@ from unfold.admin import ModelAdmin
 
 from chatddx.django.portal.forms.base import BaseForm
 from chatddx.repo.base import BranchModel, BranchProxy, TrailModel, TrailSchema
+from chatddx.repo.branch_models import BranchHeadModel
 from chatddx.repo.main import BundleName, Repo
 from chatddx.repo.shufflers.main import (
+    branch_table,
     dump_branch,
     load_template_data,
     qs_canon,
+    refresh_branch_heads,
 )
 
 
@@ -67,19 +71,35 @@ class BranchModelAdmin[T: BranchModel](TypedModelAdmin[T]):
             return None
 
     def delete_queryset(self, request: HttpRequest, queryset: QuerySet[DjangoModel]):
-        names_subquery = queryset.values_list("name", flat=True)
+        # read before deleting, the queryset is filtered on the heads
+        names = list(queryset.values_list("name", flat=True))
 
-        self.model.objects.filter(
-            name__in=names_subquery,
-            owner__name=request.user.username,
-        ).delete()
+        with transaction.atomic():
+            self.model.objects.filter(
+                name__in=names,
+                owner__name=request.user.username,
+            ).delete()
+
+            BranchHeadModel.objects.filter(
+                branch_table=branch_table(self.model),
+                owner__name=request.user.username,
+                name__in=names,
+            ).delete()
+
+            ThroughModel = self.model.collaborators.through
+
+            ThroughModel.objects.filter(
+                **{f"{self.name}branchmodel__name__in": names},
+                identitymodel__name=request.user.username,
+            ).delete()
 
-        ThroughModel = self.model.collaborators.through
+    def delete_model(self, request: HttpRequest, obj: DjangoModel):
+        branch = cast(BranchModel, obj)
 
-        ThroughModel.objects.filter(
-            **{f"{self.name}branchmodel__name__in": names_subquery},
-            identitymodel__name=request.user.username,
-        ).delete()
+        # the head falls back to the latest version left
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            refresh_branch_heads(type(branch), branch.owner_id, [branch.name])
 
     def get_form(
         self,
@@ -4,7 +4,6 @@ from dataclasses import asdict
 from typing import Any, override
 
 from django.contrib import admin
-from django.db.models import Max, Min
 from django.http import HttpRequest
 from markdown import markdown
 from unfold.admin import mark_safe
@@ -53,16 +52,9 @@ class SessionAdmin(TypedModelAdmin[Session]):
     def get_queryset(self, request: HttpRequest):
         qs = super().get_queryset(request)
 
-        return (
-            qs.filter(
-                owner__name=request.user.username,
-            )
-            .annotate(
-                annotated_earliest=Min("messages__timestamp"),
-                annotated_latest=Max("messages__timestamp"),
-            )
-            .order_by("-timestamp")
-        )
+        return qs.filter(
+            owner__name=request.user.username,
+        ).order_by("-timestamp")
 
     @override
     def change_view(
@@ -96,16 +88,9 @@ class SharedSessionAdmin(SessionAdmin):
     def get_queryset(self, request: HttpRequest):
         qs = super().get_queryset(request)
 
-        return (
-            qs.filter(
-                collaborators__name=request.user.username,
-            )
-            .annotate(
-                annotated_earliest=Min("messages__timestamp"),
-                annotated_latest=Max("messages__timestamp"),
-            )
-            .order_by("-timestamp")
-        )
+        return qs.filter(
+            collaborators__name=request.user.username,
+        ).order_by("-timestamp")
 
 
 @admin.register(Message)
@@ -122,6 +107,9 @@ class MessageAdmin(TypedModelAdmin[Message]):
         "agent_",
     ]
     fields = list_display + [
+        "model_name",
+        "latency",
+        "cached",
         "run_id",
         "get_session",
         "thinking",
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -51,6 +52,55 @@ DATABASES = {
     },
 }
 
+TRAIL_CACHE_MAX_SIZE = int(os.environ.get("TRAIL_CACHE_MAX_SIZE", 100))
+TRAIL_CACHE_MAX_BYTES = int(os.environ.get("TRAIL_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+TRAIL_CACHE_ALIAS = os.environ.get("TRAIL_CACHE_ALIAS")
+
+IDENTITY_CACHE_MAX_SIZE = int(os.environ.get("IDENTITY_CACHE_MAX_SIZE", 1024))
+IDENTITY_CACHE_TTL = int(os.environ.get("IDENTITY_CACHE_TTL", 60))
+
+OUTPUT_VALIDATOR_CACHE_MAX_SIZE = int(
+    os.environ.get("OUTPUT_VALIDATOR_CACHE_MAX_SIZE", 256)
+)
+
+AGENT_CACHE_MAX_SIZE = int(os.environ.get("AGENT_CACHE_MAX_SIZE", 32))
+
+RESPONSE_CACHE_MAX_SIZE = int(os.environ.get("RESPONSE_CACHE_MAX_SIZE", 1024))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 24 * 60 * 60))
+RESPONSE_CACHE_ALIAS = os.environ.get("RESPONSE_CACHE_ALIAS")
+
+IDEMPOTENCY_CACHE_ALIAS = os.environ.get("IDEMPOTENCY_CACHE_ALIAS", "default")
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60))
+
+ADMISSION_CACHE_ALIAS = os.environ.get("ADMISSION_CACHE_ALIAS")
+
+# record session messages in the background instead of before answering
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND") == "1"
+WRITE_BEHIND_MAX_SIZE = int(os.environ.get("WRITE_BEHIND_MAX_SIZE", 1000))
+
+# batch the message inserts of concurrent runs
+MESSAGE_SINK = os.environ.get("MESSAGE_SINK") == "1"
+MESSAGE_SINK_MAX_BATCH = int(os.environ.get("MESSAGE_SINK_MAX_BATCH", 500))
+MESSAGE_SINK_LINGER = float(os.environ.get("MESSAGE_SINK_LINGER", 0.0))
+MESSAGE_SINK_MAX_PENDING = int(os.environ.get("MESSAGE_SINK_MAX_PENDING", 1000))
+
+# messages of a session history loaded for a run, 0 loads them all
+SESSION_HISTORY_WINDOW = int(os.environ.get("SESSION_HISTORY_WINDOW", 0))
+
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 8))
+
+# required in production, see prod.py
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "memory://")
+CELERY_TASK_ALWAYS_EAGER = os.environ.get("CELERY_TASK_ALWAYS_EAGER") == "1"
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_DEFAULT_QUEUE = "diagnose"
+
+# connection model name or endpoint -> celery queue, e.g.
+# {"Qwen/Qwen3-8B-AWQ": "diagnose.qwen3-8b"}
+DIAGNOSE_QUEUES = json.loads(os.environ.get("DIAGNOSE_QUEUES", "{}"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
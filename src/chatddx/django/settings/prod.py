@@ -11,6 +11,9 @@ SALT_KEY = SECRET_KEY
 
 ALLOWED_HOSTS = ["." + os.environ["HOST"]]
 
+# jobs sent to the in-memory broker of one process never reach the workers
+CELERY_BROKER_URL = os.environ["CELERY_BROKER_URL"]
+
 
 SESSION_COOKIE_SAMESITE = "Lax"
 SESSION_COOKIE_SECURE = True
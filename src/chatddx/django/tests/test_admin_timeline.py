@@ -6,6 +6,7 @@ from typing import Any, Callable
 
 import pytest
 from django.contrib.auth.models import User
+from django.db import connection
 from django.db.models import Q
 from django.test import Client
 from django.urls import get_resolver, reverse
@@ -13,6 +14,7 @@ from django.urls import get_resolver, reverse
 from chatddx.core.fields import dict_to_toml, parse_toml_or_dict
 from chatddx.core.models import IdentityModel
 from chatddx.repo import proxies
+from chatddx.repo.base import BranchModel
 from chatddx.repo.branch_models import (
     AgentBranchModel,
     BranchModelRegistry,
@@ -21,7 +23,9 @@ from chatddx.repo.branch_models import (
 )
 from chatddx.repo.form_data_in import SamplingParamsFormDataIn
 from chatddx.repo.form_data_out import TemplateData
+from chatddx.repo.main import Repo
 from chatddx.repo.shufflers.main import (
+    agent_relations,
     dump_trail_registry,
     load_form_data,
     qs_super_agent,
@@ -510,6 +514,30 @@ def test_agent_qs(owner: IdentityModel):
     assert agent.connection_id is not None
 
 
+@pytest.mark.django_db
+def test_agent_qs_plan(owner: IdentityModel):
+    qs = qs_super_agent(proxies.SuperAgent.objects.all(), owner.name)
+    sql, params = qs.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}", params)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+
+    # each relation is joined against one DISTINCT ON set, nothing per row
+    assert sql.count("LEFT OUTER JOIN") == len(agent_relations)
+    assert sql.count("DISTINCT ON") == len(agent_relations)
+    assert "SubPlan" not in plan
+
+    for agent in qs:
+        target = agent.target
+        for model in agent_relations:
+            branch_id = getattr(agent, f"{model}_id")
+            if branch_id is not None:
+                branch = Repo(model, BranchModel).objects.get(pk=branch_id)
+                assert branch.target_id == getattr(target, f"{model}_id")
+                assert branch.name == getattr(agent, f"{model}_name")
+
+
 @pytest.mark.django_db
 def test_agent(template_data: TemplateData, admin_client: Client):
     data = template_data.agent
@@ -0,0 +1,143 @@
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User as DjangoUser
+from django.test import override_settings
+from ninja.testing import TestAsyncClient
+from pydantic_ai import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.core.models import IdentityModel
+from chatddx.django import celery_app
+from chatddx.django.api import api
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branch
+from chatddx.runtime.agent_cache import agent_cache
+from chatddx.runtime.tasks import diagnose_queue, diagnose_task
+
+diagnosis = {"acute_warning": None, "diagnoses": [], "management": {}, "sources": []}
+
+
+@pytest.fixture(autouse=True)
+def branch_registry(owner: IdentityModel):
+    path = Path(__file__).parent / "data/test-registry.toml"
+    return dump_trail_registry(path, owner_name=owner.name)
+
+
+@pytest.fixture
+def owner(admin_user: DjangoUser):
+    owner, _created = IdentityModel.objects.get_or_create(name=admin_user.username)
+    return owner
+
+
+@pytest.fixture
+def eager(settings):
+    # celery reads its CELERY_ settings from django settings on every access
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    assert celery_app.conf.task_always_eager
+
+
+@pytest.fixture
+def swift(owner: IdentityModel):
+    branch = load_branch("agent", owner.name, "swift")
+    assert branch
+    return branch
+
+
+def diagnose(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    prompt = messages[-1].parts[-1].content  # pyright: ignore
+
+    if prompt == "fail":
+        raise ModelHTTPError(503, "qwen", {"message": "overloaded"})
+
+    (output_tool,) = info.output_tools
+    return ModelResponse(parts=[ToolCallPart(output_tool.name, diagnosis)])
+
+
+async def submit_and_poll(admin_user: DjangoUser, swift, symptoms: str):
+    client = TestAsyncClient(api)
+    agent = agent_cache.get(swift.target).agent
+
+    with agent.override(model=FunctionModel(diagnose)):
+        submitted = await client.post(
+            "/diagnose/jobs",
+            json={"symptoms": symptoms, "model": "swift"},
+            user=admin_user,
+        )
+
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+
+    polled = await client.get(
+        f"/diagnose/jobs/{submitted.json()['job']}", user=admin_user
+    )
+
+    assert polled.status_code == 200
+    return polled.json()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_job_succeeds(eager, admin_user: DjangoUser, swift):
+    job = await submit_and_poll(admin_user, swift, "Right lower quadrant pain.")
+
+    assert job["status"] == "succeeded"
+    assert job["output"]["diagnoses"] == []
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_job_fails_with_api_error(eager, admin_user: DjangoUser, swift):
+    job = await submit_and_poll(admin_user, swift, "fail")
+
+    assert job["status"] == "failed"
+    assert job["error"] == "overloaded"
+    assert job["error_status"] == 400
+    assert "output" not in job
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_job_fails_when_publishing_fails(
+    monkeypatch, admin_user: DjangoUser, swift
+):
+    def apply_async(*args, **kwargs):
+        raise ConnectionRefusedError("broker down")
+
+    monkeypatch.setattr(diagnose_task, "apply_async", apply_async)
+    client = TestAsyncClient(api)
+
+    submitted = await client.post(
+        "/diagnose/jobs",
+        json={"symptoms": "Right lower quadrant pain.", "model": "swift"},
+        user=admin_user,
+    )
+
+    assert submitted.status_code == 500
+    assert "broker down" in submitted.json()["error"]
+
+    polled = await client.get(
+        f"/diagnose/jobs/{submitted.json()['job']}", user=admin_user
+    )
+
+    assert polled.json()["status"] == "failed"
+    assert polled.json()["error_status"] == 500
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_unknown_job(admin_user: DjangoUser):
+    polled = await TestAsyncClient(api).get(
+        "/diagnose/jobs/00000000-0000-0000-0000-000000000000", user=admin_user
+    )
+
+    assert polled.status_code == 404
+
+
+@pytest.mark.django_db
+def test_queue_routing(swift):
+    with override_settings(DIAGNOSE_QUEUES={"Qwen/Qwen3-8B-AWQ": "diagnose.qwen"}):
+        assert diagnose_queue(swift.target) == "diagnose.qwen"
+
+    with override_settings(DIAGNOSE_QUEUES={}):
+        assert diagnose_queue(swift.target) == "diagnose"
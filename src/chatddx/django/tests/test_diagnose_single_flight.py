@@ -0,0 +1,101 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import caches
+from ninja.testing import TestAsyncClient
+from pydantic_ai import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.core.models import IdentityModel
+from chatddx.django.api import api
+from chatddx.history.models import SessionModel
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branch
+from chatddx.runtime.agent_cache import agent_cache
+
+diagnosis = {"acute_warning": None, "diagnoses": [], "management": {}, "sources": []}
+
+
+@pytest.fixture(autouse=True)
+def branch_registry(owner: IdentityModel):
+    path = Path(__file__).parent / "data/test-registry.toml"
+    caches["default"].clear()
+    return dump_trail_registry(path, owner_name=owner.name)
+
+
+@pytest.fixture
+def owner(admin_user: DjangoUser):
+    owner, _created = IdentityModel.objects.get_or_create(name=admin_user.username)
+    return owner
+
+
+@pytest.fixture
+def swift(owner: IdentityModel):
+    branch = load_branch("agent", owner.name, "swift")
+    assert branch
+    return branch
+
+
+class Counted:
+    def __init__(self):
+        self.calls = 0
+
+    async def diagnose(
+        self, messages: list[ModelMessage], info: AgentInfo
+    ) -> ModelResponse:
+        self.calls += 1
+        # long enough for the duplicates to arrive while this one runs
+        await asyncio.sleep(0.2)
+
+        (output_tool,) = info.output_tools
+        return ModelResponse(parts=[ToolCallPart(output_tool.name, diagnosis)])
+
+
+def post(admin_user: DjangoUser, symptoms: str, **headers):
+    return TestAsyncClient(api).post(
+        "/diagnose",
+        json={"symptoms": symptoms, "model": "swift"},
+        user=admin_user,
+        headers=headers,
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_duplicates_share_one_run(admin_user: DjangoUser, swift):
+    model = Counted()
+
+    with agent_cache.get(swift.target).agent.override(
+        model=FunctionModel(model.diagnose)
+    ):
+        responses = await asyncio.gather(
+            post(admin_user, "Right lower quadrant pain."),
+            post(admin_user, "Right lower quadrant pain."),
+            post(admin_user, "Right lower quadrant pain."),
+            post(admin_user, "Headache."),
+        )
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert all(r.json()["diagnoses"] == [] for r in responses)
+    assert model.calls == 2
+    assert await SessionModel.objects.acount() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_idempotency_key(admin_user: DjangoUser, swift):
+    model = Counted()
+
+    with agent_cache.get(swift.target).agent.override(
+        model=FunctionModel(model.diagnose)
+    ):
+        first = await post(admin_user, "Fever.", **{"Idempotency-Key": "abc"})
+        retried = await post(admin_user, "Fever.", **{"Idempotency-Key": "abc"})
+        reused = await post(admin_user, "Cough.", **{"Idempotency-Key": "abc"})
+
+    assert model.calls == 1
+    assert first.status_code == retried.status_code == 200
+    assert retried.json() == first.json()
+    assert retried["Idempotent-Replayed"] == "true"
+    assert reused.status_code == 422
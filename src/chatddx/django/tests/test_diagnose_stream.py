@@ -0,0 +1,198 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User as DjangoUser
+from ninja.testing import TestAsyncClient
+from pydantic_ai import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+from chatddx.core.models import IdentityModel
+from chatddx.django.api import api
+from chatddx.history.models import SessionModel
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branch_async
+from chatddx.runtime.agent_cache import agent_cache
+
+diagnosis = {
+    "acute_warning": "Immediate evaluation needed.",
+    "diagnoses": [
+        {
+            "diagnosis": "Appendicitis",
+            "probability": "high",
+            "critical": True,
+            "short_rationale": "Classic right lower quadrant presentation.",
+        }
+    ],
+    "management": {
+        "workup": [
+            {
+                "type": "Radiology",
+                "investigations": ["Ultrasound abdomen"],
+                "priority": "urgent",
+            }
+        ],
+        "empirical_treatment": [
+            {
+                "indication": "Suspected inflammation",
+                "treatment": "IV Fluids and Antibiotics",
+                "important": "Keep NPO",
+            }
+        ],
+        "disposition": "Admission",
+    },
+    "sources": ["UpToDate 2026"],
+}
+
+
+@pytest.fixture(autouse=True)
+def branch_registry(owner: IdentityModel):
+    path = Path(__file__).parent / "data/test-registry.toml"
+    return dump_trail_registry(path, owner_name=owner.name)
+
+
+@pytest.fixture
+def owner(admin_user: DjangoUser):
+    owner, _created = IdentityModel.objects.get_or_create(name=admin_user.username)
+    return owner
+
+
+async def stream_diagnosis(
+    messages: list[ModelMessage], info: AgentInfo
+) -> AsyncIterator[dict[int, DeltaToolCall]]:
+    (output_tool,) = info.output_tools
+    args = json.dumps(diagnosis)
+
+    yield {0: DeltaToolCall(name=output_tool.name)}
+
+    for i in range(0, len(args), 200):
+        # outlast the stream debounce so partial outputs are sent
+        await asyncio.sleep(0.15)
+        yield {0: DeltaToolCall(json_args=args[i : i + 200])}
+
+
+async def stream_failure(
+    messages: list[ModelMessage], info: AgentInfo
+) -> AsyncIterator[str]:
+    yield "Appendicitis"
+    raise ModelHTTPError(503, "qwen", {"message": "overloaded"})
+
+
+async def post_stream(
+    owner: IdentityModel,
+    admin_user: DjangoUser,
+    stream_function,
+    accept: str = "application/x-ndjson",
+):
+    branch = await load_branch_async("agent", owner.name, "swift")
+    assert branch
+
+    built = agent_cache.get(branch.target)
+
+    with built.agent.override(model=FunctionModel(stream_function=stream_function)):
+        return await TestAsyncClient(api).post(
+            "/diagnose/stream",
+            json={"symptoms": "Right lower quadrant pain.", "model": "swift"},
+            headers={"Accept": accept},
+            user=admin_user,
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_stream_partial_output(owner: IdentityModel, admin_user: DjangoUser):
+    response = await post_stream(owner, admin_user, stream_diagnosis)
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+
+    events = [json.loads(line) for line in response.content.splitlines()]
+    kinds = [event["event"] for event in events]
+
+    assert kinds[-1] == "result"
+    assert events[-1]["data"] == diagnosis
+    assert "output" in kinds
+    assert events[kinds.index("output")]["data"] != diagnosis
+
+    session = await SessionModel.objects.filter(owner=owner).alatest("pk")
+    recorded = [kind async for kind in session.messages.values_list("kind", flat=True)]
+
+    assert recorded[:3] == ["prompt", "request", "response"]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_stream_error_in_band(owner: IdentityModel, admin_user: DjangoUser):
+    response = await post_stream(
+        owner, admin_user, stream_failure, accept="text/event-stream"
+    )
+
+    assert response.status_code == 200
+    assert response["Content-Type"] == "text/event-stream"
+
+    *_, last = response.content.decode().strip().split("\n\n")
+
+    assert last.splitlines() == [
+        "event: error",
+        'data: {"error":"overloaded","status":400}',
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_stream_unknown_model(admin_user: DjangoUser):
+    response = await TestAsyncClient(api).post(
+        "/diagnose/stream",
+        json={"symptoms": "Nausea", "model": "non-existent-agent-branch"},
+        user=admin_user,
+    )
+
+    assert response.status_code == 400
+    assert "error" in response.json()
+
+
+async def diagnose(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    prompt = messages[-1].parts[-1].content  # pyright: ignore
+
+    if prompt == "fail":
+        raise ModelHTTPError(503, "qwen", {"message": "overloaded"})
+
+    (output_tool,) = info.output_tools
+    return ModelResponse(parts=[ToolCallPart(output_tool.name, diagnosis)])
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_batch(owner: IdentityModel, admin_user: DjangoUser):
+    branch = await load_branch_async("agent", owner.name, "swift")
+    assert branch
+
+    built = agent_cache.get(branch.target)
+
+    with built.agent.override(model=FunctionModel(diagnose)):
+        response = await TestAsyncClient(api).post(
+            "/diagnose/batch",
+            json={
+                "model": "swift",
+                "cases": [
+                    {"symptoms": "Right lower quadrant pain.", "id": "a"},
+                    {"symptoms": "fail", "id": "b"},
+                ],
+            },
+            user=admin_user,
+        )
+
+    assert response.status_code == 200
+
+    events = {
+        event["data"]["id"]: event
+        for event in map(json.loads, response.content.splitlines())
+    }
+
+    assert events["a"]["event"] == "result"
+    assert events["a"]["data"]["output"] == diagnosis
+    assert events["b"]["event"] == "error"
+    assert events["b"]["data"]["error"] == "overloaded"
+    assert events["b"]["data"]["status"] == 400
@@ -0,0 +1,64 @@
+import pytest
+from django.contrib.auth.models import User as DjangoUser
+from ninja.testing import TestAsyncClient
+
+from chatddx.core.identity_cache import IdentityCache, identity_cache
+from chatddx.core.models import IdentityModel
+from chatddx.django.api import api
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_hit_skips_the_database():
+    cache = IdentityCache(max_size=2, ttl=60)
+    identity = await cache.aget("alice")
+
+    assert await cache.aget("alice") is identity
+
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+    _ = await cache.aget("bob")
+    _ = await cache.aget("carol")
+    assert list(cache.cache) == ["bob", "carol"]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_save_invalidates():
+    identity = await identity_cache.aget("alice")
+    assert identity.secrets == {}
+
+    stored = await IdentityModel.objects.aget(name="alice")
+    stored.secrets = {"api-keys": {"swift": "sk-new"}}
+    await stored.asave()
+
+    identity = await identity_cache.aget("alice")
+    assert identity.secrets["api-keys"]["swift"] == "sk-new"
+    assert identity_cache.stats.invalidations == 1
+
+    await stored.adelete()
+    assert "alice" not in identity_cache.cache
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_expired_entries_are_reloaded():
+    cache = IdentityCache(max_size=2, ttl=0)
+    _ = await cache.aget("alice")
+    _ = await cache.aget("alice")
+
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_api_requests_share_the_identity(admin_user: DjangoUser):
+    client = TestAsyncClient(api)
+
+    for _ in range(3):
+        response = await client.get("/agents?output_type=diagnose", user=admin_user)
+        assert response.status_code == 200
+
+    assert identity_cache.stats.misses == 1
+    assert identity_cache.stats.hits == 2
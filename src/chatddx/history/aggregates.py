@@ -0,0 +1,246 @@
+# src/chatddx/history/aggregates.py
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, Q, QuerySet, Sum, Value, When
+from django.db.models.functions import Greatest, Least
+
+from chatddx.core.choices import MessageKindChoices
+from chatddx.history.models import MessageModel, SessionModel
+from chatddx.utils import make_async
+
+MessageRow = tuple[str, datetime, dict[str, Any]]
+
+
+@dataclass
+class MessageUsage:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    model_name: str | None = None
+    latency: timedelta | None = None
+
+
+@dataclass
+class SessionAggregate:
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency: timedelta = field(default_factory=timedelta)
+    message_count: int = 0
+    last_kind: str | None = None
+    first_message_at: datetime | None = None
+    last_message_at: datetime | None = None
+
+
+def message_usages(rows: Iterable[MessageRow]) -> Iterator[MessageUsage]:
+    """
+    Extract the usage columns of (kind, timestamp, payload) rows of one
+    session, in insertion order. Latency is the time from a request to the
+    response that follows it.
+    """
+    request_at: datetime | None = None
+
+    for kind, timestamp, payload in rows:
+        usage = payload.get("usage") or {}
+        message_usage = MessageUsage(
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            cache_read_tokens=usage.get("cache_read_tokens", 0),
+            model_name=payload.get("model_name"),
+        )
+
+        if kind == MessageKindChoices.REQUEST:
+            request_at = timestamp
+        if kind == MessageKindChoices.RESPONSE and request_at:
+            message_usage.latency = timestamp - request_at
+
+        yield message_usage
+
+
+def aggregate_messages(rows: Iterable[MessageRow]) -> SessionAggregate:
+    """
+    Fold (kind, timestamp, payload) rows of one session, in insertion order,
+    into session aggregates.
+    """
+    aggregate = SessionAggregate()
+    rows = list(rows)
+
+    for (kind, timestamp, _), usage in zip(rows, message_usages(rows)):
+        aggregate.input_tokens += usage.input_tokens
+        aggregate.output_tokens += usage.output_tokens
+        aggregate.message_count += 1
+
+        if usage.latency:
+            aggregate.latency += usage.latency
+
+        if aggregate.first_message_at is None or timestamp < aggregate.first_message_at:
+            aggregate.first_message_at = timestamp
+        if aggregate.last_message_at is None or timestamp >= aggregate.last_message_at:
+            aggregate.last_message_at = timestamp
+            aggregate.last_kind = kind
+
+    return aggregate
+
+
+def record_messages(messages: list[MessageModel]) -> list[MessageModel]:
+    """
+    Insert messages with their usage columns filled in and fold them into
+    their sessions' aggregates in the same transaction.
+    """
+    if not messages:
+        return []
+
+    rows: dict[int, list[MessageRow]] = defaultdict(list)
+    by_session: dict[int, list[MessageModel]] = defaultdict(list)
+
+    for message in messages:
+        rows[message.session_id].append(
+            (message.kind, message.timestamp, message.payload)
+        )
+        by_session[message.session_id].append(message)
+
+    for session_id, session_rows in rows.items():
+        for message, usage in zip(by_session[session_id], message_usages(session_rows)):
+            set_message_usage(message, usage)
+
+    with transaction.atomic():
+        created = MessageModel.objects.bulk_create(messages)
+
+        for session_id, session_rows in rows.items():
+            add_session_aggregate(session_id, aggregate_messages(session_rows))
+
+    return created
+
+
+def set_message_usage(message: Any, usage: MessageUsage):
+    for name, value in asdict(usage).items():
+        setattr(message, name, value)
+
+
+record_messages_async = make_async(record_messages)
+
+
+def add_session_aggregate(session_id: int, aggregate: SessionAggregate):
+    # every expression reads the row as it was before the update
+    is_latest = Q(last_message_at__isnull=True) | Q(
+        last_message_at__lte=aggregate.last_message_at
+    )
+
+    _ = SessionModel.objects.filter(pk=session_id).update(
+        input_tokens=F("input_tokens") + aggregate.input_tokens,
+        output_tokens=F("output_tokens") + aggregate.output_tokens,
+        latency=F("latency") + aggregate.latency,
+        message_count=F("message_count") + aggregate.message_count,
+        last_kind=Case(
+            When(is_latest, then=Value(aggregate.last_kind)),
+            default=F("last_kind"),
+        ),
+        first_message_at=Least("first_message_at", Value(aggregate.first_message_at)),
+        last_message_at=Greatest("last_message_at", Value(aggregate.last_message_at)),
+    )
+
+
+def rebuild_session_aggregates(
+    session_model_cls: Any = SessionModel,
+    message_model_cls: Any = MessageModel,
+) -> int:
+    """
+    Recompute every session's aggregates from its messages. The model classes
+    can be swapped for historical models inside migrations.
+    """
+    messages = (
+        message_model_cls.objects.order_by("session_id", "pk")
+        .values_list("session_id", "kind", "timestamp", "payload")
+        .iterator()
+    )
+
+    aggregates = {
+        session_id: aggregate_messages(row[1:] for row in session_rows)
+        for session_id, session_rows in groupby(messages, key=lambda row: row[0])
+    }
+
+    sessions = list(session_model_cls.objects.only("pk"))
+
+    for session in sessions:
+        aggregate = aggregates.get(session.pk, SessionAggregate())
+        for name, value in asdict(aggregate).items():
+            setattr(session, name, value)
+
+    with transaction.atomic():
+        _ = session_model_cls.objects.bulk_update(
+            sessions,
+            [f.name for f in fields(SessionAggregate)],
+            batch_size=500,
+        )
+
+    return len(sessions)
+
+
+def rebuild_message_usage(message_model_cls: Any = MessageModel) -> int:
+    """
+    Re-extract the usage columns of every message from its payload. The model
+    class can be swapped for the historical model inside migrations.
+    """
+    messages = (
+        message_model_cls.objects.order_by("session_id", "pk")
+        .only("pk", "session_id", "kind", "timestamp", "payload")
+        .iterator(chunk_size=2000)
+    )
+
+    pending = []
+    count = 0
+
+    with transaction.atomic():
+        for _, session_messages in groupby(messages, key=lambda m: m.session_id):
+            session_messages = list(session_messages)
+            rows = [(m.kind, m.timestamp, m.payload) for m in session_messages]
+
+            for message, usage in zip(session_messages, message_usages(rows)):
+                set_message_usage(message, usage)
+                pending.append(message)
+
+            if len(pending) >= 500:
+                count += flush_message_usage(message_model_cls, pending)
+
+        count += flush_message_usage(message_model_cls, pending)
+
+    return count
+
+
+def flush_message_usage(message_model_cls: Any, messages: list[Any]) -> int:
+    count = message_model_cls.objects.bulk_update(
+        messages, [f.name for f in fields(MessageUsage)]
+    )
+    messages.clear()
+    return count
+
+
+def usage_rollup(
+    *group_by: str,
+    messages: QuerySet[MessageModel] | None = None,
+) -> QuerySet[MessageModel, dict[str, Any]]:
+    """
+    Token usage and response latency summed in SQL per group, e.g.
+    usage_rollup("agent") or usage_rollup("session__owner__name").
+    """
+    if messages is None:
+        messages = MessageModel.objects.all()
+
+    return (
+        messages.filter(kind=MessageKindChoices.RESPONSE)
+        .order_by()
+        .values(*group_by)
+        .annotate(
+            responses=Count("pk"),
+            total_input_tokens=Sum("input_tokens"),
+            total_output_tokens=Sum("output_tokens"),
+            total_cache_read_tokens=Sum("cache_read_tokens"),
+            mean_latency=Avg("latency"),
+        )
+        .order_by(*group_by)
+    )
@@ -2,22 +2,28 @@
 from __future__ import annotations
 
 import uuid
+from datetime import timedelta
 from typing import Any
 
 from django.db.models import (
     PROTECT,
     SET_DEFAULT,
+    BooleanField,
     CharField,
     DateTimeField,
+    DurationField,
     ForeignKey,
+    Index,
     JSONField,
     ManyToManyField,
     Model,
+    PositiveBigIntegerField,
+    PositiveIntegerField,
     QuerySet,
     UUIDField,
 )
 
-from chatddx.core.choices import MessageKindChoices, RoleChoices
+from chatddx.core.choices import JobStatusChoices, MessageKindChoices, RoleChoices
 from chatddx.core.models import IdentityModel
 from chatddx.repo.branch_models import AgentBranchModel
 from chatddx.repo.trail_models import AgentTrailModel
@@ -55,6 +61,30 @@ class SessionModel(Model):
         related_name="shared_sessions",
     )
 
+    # maintained by history.aggregates when messages are recorded
+    input_tokens = PositiveBigIntegerField(default=0)
+    output_tokens = PositiveBigIntegerField(default=0)
+    latency = DurationField(default=timedelta(0))
+    message_count = PositiveIntegerField(default=0, verbose_name="messages")
+    last_kind = CharField(
+        max_length=255,
+        choices=MessageKindChoices.choices,
+        null=True,
+        default=None,
+    )
+    first_message_at = DateTimeField(null=True, default=None)
+    last_message_at = DateTimeField(null=True, default=None)
+
+    # set when the session runs as a queued diagnose job, see runtime.tasks
+    job_status = CharField(
+        max_length=255,
+        choices=JobStatusChoices.choices,
+        null=True,
+        default=None,
+    )
+    job_output: JSONField[Any] = JSONField(null=True, default=None)
+    job_error: JSONField[dict[str, Any]] = JSONField(null=True, default=None)
+
     messages: QuerySet[MessageModel]
 
 
@@ -63,6 +93,10 @@ class MessageModel(Model):
         app_label = "orm"
         db_table = "agents_message"
         ordering = ["pk"]
+        indexes = [
+            Index(fields=["agent", "timestamp"], name="message_agent_timestamp"),
+            Index(fields=["session", "id"], name="message_session_id"),
+        ]
 
     role = CharField(max_length=255, choices=RoleChoices.choices)
     kind = CharField(max_length=255, choices=MessageKindChoices.choices)
@@ -79,3 +113,17 @@ class MessageModel(Model):
         related_name="messages",
         on_delete=PROTECT,
     )
+
+    # extracted from the payload by history.aggregates when recorded
+    input_tokens = PositiveIntegerField(default=0)
+    output_tokens = PositiveIntegerField(default=0)
+    cache_read_tokens = PositiveIntegerField(default=0)
+    model_name = CharField(
+        max_length=255,
+        null=True,
+        default=None,
+        db_index=True,
+    )
+    latency = DurationField(null=True, default=None)
+    # replayed from the response cache instead of asking the model
+    cached = BooleanField(default=False)
@@ -1,10 +1,8 @@
 # pyright: basic
 import json
-from datetime import timedelta
 from functools import cached_property
 from typing import final, override
 
-import jsonschema
 from django.contrib import admin
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -24,6 +22,7 @@ from chatddx.history.models import MessageModel, SessionModel
 from chatddx.history.schemas import MessageSpec
 from chatddx.repo.trail_cache import trail_cache
 from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.output_validators import output_validators
 from chatddx.runtime.utils import get_part_content
 from chatddx.utils import truncate_content
 
@@ -44,38 +43,22 @@ class Session(SessionModel):
 
     @admin.display(description="Tokens")
     def total_tokens(self):
-        tokens = 0
-        for message in self.messages.all():
-            if "usage" in message.payload:
-                tokens += message.payload["usage"].get("input_tokens", 0)
-                tokens += message.payload["usage"].get("output_tokens", 0)
-        return tokens
-
-    @admin.display(description="Messages")
-    def message_count(self):
-        return self.messages.count()
-
-    @admin.display(description="Processing time")
-    def processing_time(self):
-        ptime = timedelta(0)
-        req_time = None
-        for msg in self.messages.all():
-            msg_spec = MessageSpec.model_validate(msg)
-            if msg_spec.kind == MessageKindChoices.REQUEST:
-                req_time = msg_spec.payload.timestamp
-            if msg_spec.kind == MessageKindChoices.RESPONSE and req_time:
-                ptime += msg_spec.payload.timestamp - req_time
+        return self.input_tokens + self.output_tokens
 
-        return f"{ptime.total_seconds():.2f}s"
+    @admin.display(description="Processing time", ordering="latency")
+    def processing_time(self):
+        return f"{self.latency.total_seconds():.2f}s"
 
     @admin.display(description="Collaborators")
     def collaborators_csv(self):
         return ", ".join([str(c) for c in self.collaborators.all()]) or None
 
-    @admin.display(description="Status")
+    @admin.display(description="Status", ordering="last_kind")
     def status(self):
-        message = self.messages.latest("timestamp")
-        context = {"kind": message.kind, "display_name": message.get_kind_display()}
+        if self.last_kind is None:
+            return None
+
+        context = {"kind": self.last_kind, "display_name": self.get_last_kind_display()}
         html_string = render_to_string("status_badge.html", context)
 
         return mark_safe(html_string)
@@ -144,11 +127,7 @@ class Message(MessageModel):
 
     @cached_property
     def tokens(self):
-        if "usage" in self.payload:
-            return (
-                self.payload["usage"]["input_tokens"]
-                + self.payload["usage"]["output_tokens"]
-            )
+        return self.input_tokens + self.output_tokens or None
 
     @cached_property
     def direction(self):
@@ -177,10 +156,7 @@ class Message(MessageModel):
 
         if self.output_schema and self.role == RoleChoices.ASSISTANT.value:
             data = json.loads(self.content)
-            jsonschema.validate(
-                instance=data,
-                schema=self.output_schema,
-            )
+            output_validators.validate(self.agent_spec.output_type, data)
             return data
         else:
             return self.content
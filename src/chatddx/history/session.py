@@ -1,13 +1,17 @@
 # src/chatddx/history/session.py
 from uuid import UUID
 
-from asgiref.sync import sync_to_async
+from django.conf import settings
 
+from chatddx.core.choices import MessageKindChoices
 from chatddx.core.models import IdentityModel
 from chatddx.history.models import MessageModel, SessionModel
 from chatddx.history.schemas import IdentitySpec, MessageSpec, SessionSpec
+from chatddx.repo.base import BranchSpec
 from chatddx.repo.branch_models import AgentBranchModel
-from chatddx.repo.shufflers.main import resolve_related_array_fields_async
+from chatddx.repo.shufflers.main import resolve_related_array_fields_bulk_async
+from chatddx.repo.trail_models import AgentTrailModel
+from chatddx.repo.trail_specs import AgentSpec
 
 
 async def get_identity(name: str) -> IdentitySpec:
@@ -17,9 +21,15 @@ async def get_identity(name: str) -> IdentitySpec:
 
 async def start_session(
     owner_id: int,
-    agent_id: int,
+    agent: BranchSpec[AgentSpec] | int,
     description: str | None = None,
 ) -> SessionSpec:
+    """
+    Start an empty session. Given the loaded agent branch rather than its
+    id, the session is built from the created row instead of read back.
+    """
+
+    agent_id = agent.id if isinstance(agent, BranchSpec) else agent
 
     session_model = await SessionModel.objects.acreate(
         owner_id=owner_id,
@@ -27,18 +37,48 @@ async def start_session(
         description=description,
     )
 
+    if isinstance(agent, BranchSpec):
+        return new_session_spec(session_model, agent)
+
     return await resume_session(owner_id, session_model.uuid)
 
 
+def new_session_spec(
+    session_model: SessionModel,
+    agent_branch: BranchSpec[AgentSpec],
+    messages: list[MessageSpec] | None = None,
+) -> SessionSpec:
+    return SessionSpec(
+        id=session_model.pk,
+        uuid=session_model.uuid,
+        description=session_model.description,
+        timestamp=session_model.timestamp,
+        owner_id=session_model.owner_id,
+        default_agent=agent_branch,
+        messages=messages or [],
+    )
+
+
+def history_window() -> int:
+    # 0 keeps the whole history
+    return getattr(settings, "SESSION_HISTORY_WINDOW", 0)
+
+
 async def resume_session(
     owner_id: int,
     uuid: UUID | str,
     default_agent: AgentBranchModel | None = None,
+    window: int | None = None,
 ) -> SessionSpec:
+    """
+    Resume a session with the last window messages of its history, by
+    default SESSION_HISTORY_WINDOW. Older pages are read with
+    load_older_messages.
+    """
 
     session_model = (
-        await SessionModel.objects.select_related("default_agent")
-        .prefetch_related("messages", "default_agent__collaborators")
+        await SessionModel.objects.select_related("default_agent__target")
+        .prefetch_related("default_agent__collaborators")
         .aget(
             uuid__startswith=uuid,
             owner_id=owner_id,
@@ -51,21 +91,115 @@ async def resume_session(
     if session_model.default_agent is None:
         raise ValueError("Cannot resume a session without an agent")
 
-    target_attr = await sync_to_async(lambda: session_model.default_agent.target)()
+    agent = session_model.default_agent
+
+    if not AgentBranchModel.target.field.is_cached(agent):
+        agent.target = await AgentTrailModel.objects.aget(pk=agent.target_id)
+
+    _ = await resolve_related_array_fields_bulk_async([agent.target])
+
+    messages = await load_messages(
+        session_model.pk,
+        window=history_window() if window is None else window,
+    )
+
+    return new_session_spec(
+        session_model,
+        BranchSpec[AgentSpec].model_validate(agent),
+        messages,
+    )
+
+
+async def load_messages(
+    session_id: int,
+    before: int | None = None,
+    window: int = 0,
+) -> list[MessageSpec]:
+    """
+    The last window messages of a session before the message with id
+    before, all of them for a window of 0. Pages are found by id on the
+    (session, id) index, not by offset.
 
-    session_model.default_agent.target = await resolve_related_array_fields_async(
-        session_model.default_agent.target
+    A page is extended back to the prompt that started its first run, a run
+    cut in half would give the model tool returns without their calls.
+    """
+
+    queryset = MessageModel.objects.filter(session_id=session_id)
+
+    if before is not None:
+        queryset = queryset.filter(pk__lt=before)
+
+    if window > 0:
+        first = await (
+            queryset.order_by("-pk")
+            .values_list("pk", flat=True)[window - 1 : window]
+            .afirst()
+        )
+
+        if first is not None:
+            run_start = await (
+                queryset.filter(pk__lte=first, kind=MessageKindChoices.PROMPT)
+                .order_by("-pk")
+                .values_list("pk", flat=True)
+                .afirst()
+            )
+            queryset = queryset.filter(
+                pk__gte=first if run_start is None else run_start
+            )
+
+    return [MessageSpec.model_validate(m) async for m in queryset.order_by("pk")]
+
+
+async def load_older_messages(
+    session: SessionSpec,
+    window: int | None = None,
+) -> list[MessageSpec]:
+    """
+    Prepend the page of messages before the oldest loaded one and return
+    it, an empty page once the start of the session is reached.
+    """
+
+    before = session.messages[0].id if session.messages else None
+    page = await load_messages(
+        session.id,
+        before=before,
+        window=history_window() if window is None else window,
     )
+    session.messages[:0] = page
 
-    return SessionSpec.model_validate(session_model)
+    return page
 
 
 async def refresh_messages(
     session: SessionSpec,
+    window: int | None = None,
 ) -> None:
-    queryset = MessageModel.objects.select_related().filter(session_id=session.id)
+    """
+    Append the messages stored since the last refresh, keeping the history
+    to the window resume_session loaded it with.
+    """
+
+    queryset = MessageModel.objects.filter(session_id=session.id)
 
     if len(session.messages) > 0:
         queryset = queryset.filter(pk__gt=session.messages[-1].id)
 
     session.messages.extend([MessageSpec.model_validate(m) async for m in queryset])
+    session.messages[:] = trim_messages(
+        session.messages,
+        history_window() if window is None else window,
+    )
+
+
+def trim_messages(messages: list[MessageSpec], window: int) -> list[MessageSpec]:
+    # the in memory counterpart of load_messages
+    if window <= 0 or len(messages) <= window:
+        return messages
+
+    first = len(messages) - window
+
+    for start in range(first, -1, -1):
+        if messages[start].kind == MessageKindChoices.PROMPT:
+            return messages[start:]
+
+    return messages[first:]
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from chatddx.history.aggregates import record_messages_async
+from chatddx.history.models import MessageModel
+
+type Pending = tuple[list[MessageModel], asyncio.Future[None]]
+
+
+@dataclass
+class MessageSinkStats:
+    batches: int = 0
+    writes: int = 0
+    messages: int = 0
+    max_batch: int = 0
+    failed: int = 0
+    flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+
+    @property
+    def mean_batch(self) -> float:
+        return self.messages / self.batches if self.batches else 0.0
+
+    @property
+    def mean_flush_seconds(self) -> float:
+        return self.flush_seconds / self.batches if self.batches else 0.0
+
+
+class MessageSink:
+    """
+    Gathers the messages written by concurrent runs into batches recorded
+    with one multi-row insert, one transaction and one aggregate update per
+    session, instead of a round trip per write.
+
+    A batch closes when it holds max_batch messages, or when nothing more is
+    waiting, after lingering up to linger seconds for more. Batches are
+    written in order by one task per event loop, so the messages of a
+    session are inserted in the order they were written. write returns once
+    its messages are stored.
+    """
+
+    def __init__(self, max_batch: int, linger: float = 0.0, max_pending: int = 1000):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.max_pending = max_pending
+        self.stats = MessageSinkStats()
+        self._workers: dict[
+            asyncio.AbstractEventLoop,
+            tuple[asyncio.Queue[Pending], asyncio.Task[None]],
+        ] = {}
+
+    async def write(self, messages: list[MessageModel]):
+        if not messages:
+            return
+
+        queue, _ = self._worker()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+        await queue.put((messages, future))
+        await future
+
+    async def aclose(self):
+        if (worker := self._workers.pop(asyncio.get_running_loop(), None)) is None:
+            return
+
+        queue, task = worker
+        await queue.join()
+        _ = task.cancel()
+
+    def _worker(self):
+        loop = asyncio.get_running_loop()
+
+        if (worker := self._workers.get(loop)) is None:
+            # workers of event loops that are gone went with them
+            for closed in [other for other in self._workers if other.is_closed()]:
+                del self._workers[closed]
+
+            queue: asyncio.Queue[Pending] = asyncio.Queue(self.max_pending)
+            worker = self._workers[loop] = (queue, loop.create_task(self._run(queue)))
+
+        return worker
+
+    async def _run(self, queue: asyncio.Queue[Pending]):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.linger
+
+            while size < self.max_batch:
+                try:
+                    pending = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    if (remaining := deadline - loop.time()) <= 0:
+                        break
+                    try:
+                        pending = await asyncio.wait_for(queue.get(), remaining)
+                    except TimeoutError:
+                        break
+
+                batch.append(pending)
+                size += len(pending[0])
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: list[Pending]):
+        messages = [message for rows, _ in batch for message in rows]
+        started = time.perf_counter()
+
+        try:
+            _ = await record_messages_async(messages)
+        except Exception:
+            # one bad write must not fail the others it was batched with
+            for rows, future in batch:
+                try:
+                    _ = await record_messages_async(rows)
+                    _set_result(future)
+                except Exception as e:
+                    self.stats.failed += 1
+                    _set_exception(future, e)
+        else:
+            for _, future in batch:
+                _set_result(future)
+
+        elapsed = time.perf_counter() - started
+
+        self.stats.batches += 1
+        self.stats.writes += len(batch)
+        self.stats.messages += len(messages)
+        self.stats.max_batch = max(self.stats.max_batch, len(messages))
+        self.stats.flush_seconds += elapsed
+        self.stats.max_flush_seconds = max(self.stats.max_flush_seconds, elapsed)
+
+
+def _set_result(future: asyncio.Future[None]):
+    # the writer may have gone away, e.g. a cancelled run
+    if not future.done():
+        future.set_result(None)
+
+
+def _set_exception(future: asyncio.Future[None], e: Exception):
+    if not future.done():
+        future.set_exception(e)
+
+
+message_sink = MessageSink(
+    max_batch=getattr(settings, "MESSAGE_SINK_MAX_BATCH", 500),
+    linger=getattr(settings, "MESSAGE_SINK_LINGER", 0.0),
+    max_pending=getattr(settings, "MESSAGE_SINK_MAX_PENDING", 1000),
+)
@@ -0,0 +1,185 @@
+# src/chatddx/history/tests/test_aggregates.py
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RequestUsage,
+    TextPart,
+    UserPromptPart,
+)
+
+from chatddx.core.models import IdentityModel
+from chatddx.history.aggregates import (
+    rebuild_message_usage,
+    rebuild_session_aggregates,
+    usage_rollup,
+)
+from chatddx.history.models import MessageModel, SessionModel
+from chatddx.repo.branch_models import AgentBranchModel
+from chatddx.repo.shufflers.main import dump_trail_registry
+from chatddx.runtime.runners import on_error, on_prompt, on_result
+
+started = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class Result:
+    messages: list[ModelMessage]
+    run_id: uuid.UUID
+
+    def new_messages(self):
+        return self.messages
+
+
+@pytest.fixture
+def owner(admin_user: User):
+    owner, _created = IdentityModel.objects.get_or_create(name=admin_user.username)
+    return owner
+
+
+@pytest.fixture
+def agent_branch(owner: IdentityModel) -> AgentBranchModel:
+    path = Path(__file__).parent / "data/test-llm-basics.toml"
+    branches = dump_trail_registry(path, owner_name=owner.name)
+    return next(iter(branches["agent"].values()))  # pyright: ignore[reportReturnType]
+
+
+def make_session(owner: IdentityModel, agent_branch: AgentBranchModel):
+    return SessionModel.objects.create(owner=owner, default_agent=agent_branch)
+
+
+def run(session: SessionModel, offset: int, tokens: int):
+    agent_id = session.default_agent.target_id
+    request_at = started + timedelta(seconds=offset)
+
+    async_to_sync(on_prompt(session.pk, agent_id))("hello")
+    async_to_sync(on_result(session.pk, agent_id))(
+        Result(
+            [
+                ModelRequest(parts=[UserPromptPart("hello")], timestamp=request_at),
+                ModelResponse(
+                    parts=[TextPart("hi")],
+                    usage=RequestUsage(
+                        input_tokens=tokens,
+                        output_tokens=1,
+                        cache_read_tokens=tokens // 2,
+                    ),
+                    model_name="test-model",
+                    timestamp=request_at + timedelta(seconds=2),
+                ),
+            ],
+            uuid.uuid4(),
+        )
+    )
+
+
+def aggregates(session: SessionModel):
+    session.refresh_from_db()
+    return (
+        session.input_tokens,
+        session.output_tokens,
+        session.latency,
+        session.message_count,
+        session.last_kind,
+        session.first_message_at,
+        session.last_message_at,
+    )
+
+
+@pytest.mark.django_db
+def test_maintained_on_write(owner: IdentityModel, agent_branch: AgentBranchModel):
+    session = make_session(owner, agent_branch)
+
+    run(session, 0, 10)
+    run(session, 10, 20)
+
+    input_tokens, output_tokens, latency, count, last_kind, _, last = aggregates(
+        session
+    )
+    assert (input_tokens, output_tokens) == (30, 2)
+    assert latency == timedelta(seconds=4)
+    assert count == 6
+    assert last_kind == "prompt"
+
+    async_to_sync(on_error(session.pk, agent_branch.target_id))(ValueError("boom"))
+    maintained = aggregates(session)
+
+    assert maintained[3] == 7
+    assert maintained[4] == "error"
+    assert maintained[6] > last
+
+    _ = rebuild_session_aggregates()
+
+    assert aggregates(session) == maintained
+
+
+@pytest.mark.django_db
+def test_message_usage_columns(owner: IdentityModel, agent_branch: AgentBranchModel):
+    session = make_session(owner, agent_branch)
+
+    run(session, 0, 10)
+    run(session, 10, 20)
+
+    messages = MessageModel.objects.filter(session=session)
+    response = messages.filter(kind="response").last()
+
+    assert response is not None
+    assert (response.input_tokens, response.output_tokens) == (20, 1)
+    assert response.cache_read_tokens == 10
+    assert response.model_name == "test-model"
+    assert response.latency == timedelta(seconds=2)
+    assert not messages.filter(kind="request", latency__isnull=False).exists()
+
+    (rollup,) = usage_rollup("session__owner__name", messages=messages)
+
+    assert rollup == {
+        "session__owner__name": owner.name,
+        "responses": 2,
+        "total_input_tokens": 30,
+        "total_output_tokens": 2,
+        "total_cache_read_tokens": 15,
+        "mean_latency": timedelta(seconds=2),
+    }
+
+    expected = list(messages.values())
+    _ = messages.update(input_tokens=0, model_name=None, latency=None)
+    _ = rebuild_message_usage()
+
+    assert list(messages.values()) == expected
+
+
+@pytest.mark.django_db
+def test_changelist_query_count(
+    owner: IdentityModel,
+    agent_branch: AgentBranchModel,
+    admin_client: Client,
+):
+    sessions = [make_session(owner, agent_branch) for _ in range(3)]
+    url = reverse("admin:orm_session_changelist")
+
+    for session in sessions:
+        run(session, 0, 10)
+
+    with CaptureQueriesContext(connection) as short:
+        assert admin_client.get(url).status_code == 200
+
+    for session in sessions:
+        for offset in range(1, 6):
+            run(session, offset * 10, 10)
+
+    with CaptureQueriesContext(connection) as long:
+        assert admin_client.get(url).status_code == 200
+
+    assert len(long.captured_queries) == len(short.captured_queries)
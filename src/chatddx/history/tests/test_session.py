@@ -0,0 +1,110 @@
+import uuid
+from pathlib import Path
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.utils import timezone
+
+from chatddx.core.choices import MessageKindChoices, RoleChoices
+from chatddx.history.models import MessageModel
+from chatddx.history.session import (
+    load_older_messages,
+    refresh_messages,
+    resume_session,
+    start_session,
+)
+from chatddx.repo.shufflers.main import (
+    dump_trail_registry,
+    ensure_identity,
+    load_branch,
+)
+
+OWNER = "session-owner"
+
+
+@pytest.fixture
+def branch(transactional_db):
+    registry = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(registry, owner_name=OWNER)
+    branch = load_branch("agent", OWNER, "no-thinking")
+    assert branch
+    return ensure_identity(OWNER), branch
+
+
+def test_start_session_from_branch_is_not_read_back(branch, django_assert_num_queries):
+    owner, branch = branch
+
+    # the insert alone
+    with django_assert_num_queries(1):
+        session = async_to_sync(start_session)(owner.pk, branch, "fast")
+
+    resumed = async_to_sync(resume_session)(owner.pk, session.uuid)
+
+    assert session.model_dump() == resumed.model_dump()
+
+    resumed = async_to_sync(start_session)(owner.pk, branch.id)
+    assert resumed.default_agent.model_dump() == branch.model_dump()
+
+
+def record_runs(session, first: int, count: int):
+    kinds = [
+        MessageKindChoices.PROMPT,
+        MessageKindChoices.REQUEST,
+        MessageKindChoices.RESPONSE,
+    ]
+    _ = MessageModel.objects.bulk_create(
+        [
+            MessageModel(
+                agent_id=session.default_agent.target.id,
+                session_id=session.id,
+                kind=kind,
+                run_id=uuid.UUID(int=run),
+                role=RoleChoices.USER,
+                payload={"content": f"{run}{kind}"},
+                timestamp=timezone.now(),
+            )
+            for run in range(first, first + count)
+            for kind in kinds
+        ]
+    )
+
+
+def contents(session) -> list[str]:
+    return [m.payload.content for m in session.messages]
+
+
+def test_history_window_keeps_whole_runs(branch, settings):
+    settings.SESSION_HISTORY_WINDOW = 4
+    owner, branch = branch
+    session = async_to_sync(start_session)(owner.pk, branch)
+    record_runs(session, 0, 4)
+
+    # the last four messages start inside run 2, it is loaded from its prompt
+    session = async_to_sync(resume_session)(owner.pk, session.uuid)
+    assert contents(session) == [
+        "2prompt",
+        "2request",
+        "2response",
+        "3prompt",
+        "3request",
+        "3response",
+    ]
+
+    page = async_to_sync(load_older_messages)(session)
+    assert len(page) == 6
+    assert contents(session)[0] == "0prompt"
+    assert async_to_sync(load_older_messages)(session) == []
+
+    record_runs(session, 4, 1)
+    async_to_sync(refresh_messages)(session)
+    assert contents(session) == [
+        "3prompt",
+        "3request",
+        "3response",
+        "4prompt",
+        "4request",
+        "4response",
+    ]
+
+    whole = async_to_sync(resume_session)(owner.pk, session.uuid, window=0)
+    assert len(whole.messages) == 15
@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.utils import timezone
+
+from chatddx.core.choices import RoleChoices
+from chatddx.core.models import IdentityModel
+from chatddx.history.models import MessageModel, SessionModel
+from chatddx.history.sink import MessageSink
+from chatddx.repo.branch_models import AgentBranchModel
+from chatddx.repo.shufflers.main import dump_trail_registry
+
+
+@pytest.fixture
+def sessions(transactional_db, admin_user: User) -> list[SessionModel]:
+    owner, _created = IdentityModel.objects.get_or_create(name=admin_user.username)
+    path = Path(__file__).parent / "data/test-llm-basics.toml"
+    branches = dump_trail_registry(path, owner_name=owner.name)
+    agent_branch: AgentBranchModel = next(iter(branches["agent"].values()))  # pyright: ignore
+
+    return [
+        SessionModel.objects.create(owner=owner, default_agent=agent_branch)
+        for _ in range(4)
+    ]
+
+
+def prompts(session: SessionModel, *contents: str) -> list[MessageModel]:
+    return [
+        MessageModel(
+            agent_id=session.default_agent.target_id,
+            session_id=session.pk,
+            kind="prompt",
+            run_id=uuid.UUID(int=0),
+            role=RoleChoices.USER,
+            payload={"content": content},
+            timestamp=timezone.now(),
+        )
+        for content in contents
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_batches_keep_session_order(sessions: list[SessionModel]):
+    sink = MessageSink(max_batch=100, linger=0.02)
+
+    async def run(session: SessionModel):
+        for turn in range(3):
+            await sink.write(prompts(session, f"{turn}a", f"{turn}b"))
+
+    _ = await asyncio.gather(*(run(session) for session in sessions))
+    await sink.aclose()
+
+    assert sink.stats.writes == 12
+    assert sink.stats.messages == 24
+    assert sink.stats.batches < sink.stats.writes
+    assert sink.stats.max_flush_seconds > 0
+
+    for session in sessions:
+        contents = [
+            m.payload["content"]
+            async for m in MessageModel.objects.filter(session=session).order_by("pk")
+        ]
+        assert contents == ["0a", "0b", "1a", "1b", "2a", "2b"]
+
+        await session.arefresh_from_db()
+        assert session.message_count == 6
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_failed_write_does_not_fail_its_batch(sessions: list[SessionModel]):
+    sink = MessageSink(max_batch=100, linger=0.05)
+    (missing,) = prompts(sessions[0], "lost")
+    missing.session_id = 0
+
+    good, bad = await asyncio.gather(
+        sink.write(prompts(sessions[1], "kept")),
+        sink.write([missing]),
+        return_exceptions=True,
+    )
+    await sink.aclose()
+
+    assert good is None
+    assert isinstance(bad, IntegrityError)
+    assert sink.stats.failed == 1
+    assert await MessageModel.objects.filter(session=sessions[1]).acount() == 1
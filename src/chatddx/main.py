@@ -1,17 +1,31 @@
 # src/chatddx/main.py
+import asyncio
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Any
 
 import django
 import typer
+from pydantic_core import to_json
 
 django.setup()
+from chatddx.history.aggregates import (
+    rebuild_message_usage,
+    rebuild_session_aggregates,
+)
 from chatddx.repl import app as repl_app
+from chatddx.repo.shufflers.bulk import dump_trail_registry_bulk
 from chatddx.repo.shufflers.main import (
     dump_trail_registry,
     ensure_identity,
+    ensure_identity_async,
+    load_branch_async,
+    rebuild_branch_heads,
 )
+from chatddx.runtime.batch import load_batch_cases, run_batch
+from chatddx.runtime.http_pool import http_pool
+from chatddx.runtime.jobs import run_job
+from chatddx.runtime.runners import write_behind
 
 CURRENT_DIR = Path(__file__).resolve().parent
 app = typer.Typer()
@@ -32,6 +46,170 @@ def main():
     pass
 
 
+@app.command("rebuild-branch-heads")
+def rebuild_branch_heads_():
+    """Recompute branch heads and version counts from the version history."""
+    for bundle, count in rebuild_branch_heads().items():
+        print(f"{bundle}: {count} heads")
+
+
+@app.command("rebuild-session-aggregates")
+def rebuild_session_aggregates_():
+    """Recompute token, latency and message aggregates of every session."""
+    print(f"{rebuild_session_aggregates()} sessions rebuilt")
+
+
+@app.command("rebuild-message-usage")
+def rebuild_message_usage_():
+    """Re-extract token usage, model name and latency columns of every message."""
+    print(f"{rebuild_message_usage()} messages rebuilt")
+
+
+@app.command("diagnose-batch")
+def diagnose_batch_(
+    owner: Annotated[str, typer.Argument()],
+    agent: Annotated[str, typer.Argument(help="agent branch name")],
+    cases: Annotated[
+        Path,
+        typer.Argument(
+            file_okay=True,
+            dir_okay=False,
+            exists=True,
+            help="JSON list or JSONL of cases",
+        ),
+    ],
+    concurrency: Annotated[
+        int | None,
+        typer.Option(help="cases in flight, capped by BATCH_MAX_CONCURRENCY"),
+    ] = None,
+    timeout: Annotated[
+        float | None,
+        typer.Option(help="seconds before a single case fails"),
+    ] = None,
+):
+    """Diagnose cases against one agent branch, printing NDJSON as they finish."""
+    asyncio.run(diagnose_batch(owner, agent, cases, concurrency, timeout))
+
+
+async def diagnose_batch(
+    owner_name: str,
+    agent_name: str,
+    cases_path: Path,
+    concurrency: int | None,
+    timeout: float | None,
+):
+    owner = await ensure_identity_async(owner_name)
+    agent = await load_branch_async("agent", owner.name, agent_name)
+
+    if not agent:
+        raise typer.BadParameter(f"No agent branch named '{agent_name}'")
+
+    cases = load_batch_cases(cases_path)
+    api_key = owner.secrets.get("api-keys", {}).get(agent.name)
+    failed = 0
+
+    try:
+        async for item in run_batch(
+            owner.pk,
+            agent,
+            cases,
+            api_key=api_key,
+            concurrency=concurrency,
+            timeout=timeout,
+        ):
+            line: dict[str, Any] = {
+                "index": item.index,
+                "id": item.case.id,
+                "session": str(item.session.uuid),
+                "elapsed": round(item.elapsed, 3),
+            }
+
+            if item.error is None:
+                line["output"] = item.output
+            else:
+                failed += 1
+                line["error"] = f"{type(item.error).__name__}: {item.error}"
+
+            print(to_json(line).decode(), flush=True)
+    finally:
+        await write_behind.aclose()
+        await http_pool.aclose()
+
+    typer.echo(f"{len(cases)} cases, {failed} failed", err=True)
+
+
+@app.command("batch")
+def batch_(
+    owner: Annotated[str, typer.Argument()],
+    samples: Annotated[
+        Path,
+        typer.Argument(
+            file_okay=True,
+            dir_okay=False,
+            exists=True,
+            help="JSONL or JSON list of samples with input and optional target",
+        ),
+    ],
+    output: Annotated[
+        Path,
+        typer.Argument(
+            file_okay=True,
+            dir_okay=False,
+            help="JSONL results, also the checkpoint to resume from",
+        ),
+    ],
+    agents: Annotated[
+        list[str],
+        typer.Option("--agent", help="agent branch name, repeat for several"),
+    ],
+    concurrency: Annotated[
+        int | None,
+        typer.Option(
+            help="samples in flight per agent, capped by BATCH_MAX_CONCURRENCY"
+        ),
+    ] = None,
+    timeout: Annotated[
+        float | None,
+        typer.Option(help="seconds before a single sample fails"),
+    ] = None,
+    retry_errors: Annotated[
+        bool,
+        typer.Option("--retry-errors", help="rerun samples that failed last time"),
+    ] = False,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            "--cache", help="replay earlier runs of agents with deterministic sampling"
+        ),
+    ] = False,
+):
+    """Run a sample file against agent branches, resumable from its output."""
+
+    async def run():
+        try:
+            return await run_job(
+                owner,
+                agents,
+                samples,
+                output,
+                concurrency=concurrency,
+                timeout=timeout,
+                retry_errors=retry_errors,
+                cache=cache,
+            )
+        finally:
+            await write_behind.aclose()
+            await http_pool.aclose()
+
+    for stats in asyncio.run(run()):
+        latency = " ".join(f"p{q}={v:.2f}s" for q, v in stats.percentiles().items())
+        print(
+            f"{stats.agent}: {stats.completed} completed, {stats.failed} failed, "
+            f"{stats.skipped} skipped in {stats.seconds:.1f}s "
+            f"({stats.throughput:.2f}/s) {latency}"
+        )
+
+
 @init_data.callback()
 def init_data_(
     owner: Annotated[str, typer.Argument()],
@@ -45,9 +223,28 @@ def init_data_(
             help="location of registry",
         ),
     ] = CURRENT_DIR / "data/registry.toml",
+    bulk: Annotated[
+        bool,
+        typer.Option(
+            "--bulk",
+            help="import in bulk inside a single transaction",
+        ),
+    ] = False,
 ):
     _ = ensure_identity(owner)
 
+    if bulk:
+        _, reports = dump_trail_registry_bulk(registry, owner)
+
+        for report in reports.values():
+            print(
+                f"{report.bundle}: "
+                f"{report.trails_created}/{report.trails} trails created, "
+                f"{report.branches_created}/{report.branches} branches created "
+                f"in {report.seconds:.3f}s"
+            )
+        return
+
     for bundle, branches in dump_trail_registry(registry, owner).items():
         for branch_idx, branch in branches.items():
             print(f"{branch.target.fingerprint}: {branch_idx} {bundle} {branch.name}:")
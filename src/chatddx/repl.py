@@ -23,7 +23,7 @@ from chatddx.repo.base import BranchSpec
 from chatddx.repo.branch_models import AgentBranchModel
 from chatddx.repo.shufflers.main import ensure_identity
 from chatddx.repo.trail_specs import AgentSpec
-from chatddx.runtime.runners import stream_from_session
+from chatddx.runtime.runners import stream_from_session, write_behind
 
 app = typer.Typer(invoke_without_command=True)
 console = Console()
@@ -67,7 +67,7 @@ def main(
             )
         )
         if not session_uuid:
-            session = asyncio.run(start_session(owner.id, agent_branch.id))
+            session = asyncio.run(start_session(owner.id, agent_branch))
 
     run_repl(session, agent_branch)
 
@@ -96,8 +96,8 @@ def run_repl(session: SessionSpec, agent_branch: BranchSpec[AgentSpec]):
 
         thunk = False
         content = ""
-        async for chunk, _ in stream_gen:
-            for part in chunk.parts:
+        async for chunk in stream_gen:
+            for part in chunk.response.parts:
                 match part:
                     case ThinkingPart(value):
                         if not thunk:
@@ -111,6 +111,9 @@ def run_repl(session: SessionSpec, agent_branch: BranchSpec[AgentSpec]):
                         raise ValueError(f"No handler for {type(part)}")
         print()
 
+        # the messages are read back right after
+        await write_behind.aclose()
+
     while True:
         prompt_ = prompt(
             "> ",
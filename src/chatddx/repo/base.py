@@ -1,18 +1,22 @@
 from __future__ import annotations
 
+from collections.abc import Mapping
 from datetime import datetime
-from typing import Any, override
+from functools import cache
+from typing import Any, Self, cast, get_args, get_origin, override
 
 from django.db.models import (
     PROTECT,
     CharField,
     DateTimeField,
+)
+from django.db.models import Field as DjangoField
+from django.db.models import (
     ForeignKey,
     Index,
     Manager,
     ManyToManyField,
 )
-from django.db.models import Field as DjangoField
 from django.db.models import Model as DjangoModel
 from ninja import Schema as NinjaSchema
 from pydantic import (
@@ -28,6 +32,8 @@ from chatddx.core.models import IdentityModel
 from chatddx.registry.schemas import RegistryInstance
 from chatddx.utils import generate_fingerprint
 
+RelationFingerprints = dict[str, str | list[str]]
+
 
 class BranchProxy:
     pk: int
@@ -48,16 +54,81 @@ class BranchBase(BaseModel):
 
 
 class TrailSchema(RegistryInstance):
+    """
+    Fingerprints are Merkle hashes: a trail hashes its own fields together
+    with the fingerprints of its related trails. The digest is memoized per
+    instance and recomputed only when a field is reassigned or a related
+    trail's fingerprint changes, so treat nested dicts and lists as immutable.
+    """
+
     model_config = ConfigDict(from_attributes=True)
     _name: str | None = PrivateAttr()
+    _digest: tuple[RelationFingerprints, str] | None = PrivateAttr(default=None)
 
     @computed_field
     def fingerprint(self) -> str:
-        return self.as_fingerprint()
+        # read private state directly, pydantic's __getattr__ is slow on hot paths
+        private = cast(dict[str, Any], self.__pydantic_private__)
+        relations = self.relation_fingerprints()
+        digest = private.get("_digest")
+
+        if digest is None or digest[0] != relations:
+            digest = private["_digest"] = (relations, self.as_fingerprint(relations))
+
+        return digest[1]
+
+    def as_fingerprint(self, relations: RelationFingerprints | None = None) -> str:
+        if relations is None:
+            relations = self.relation_fingerprints()
+
+        serialized = self.model_dump(exclude={"fingerprint", *relations})
+        return generate_fingerprint(serialized | relations)
+
+    def relation_fingerprints(self) -> RelationFingerprints:
+        relations: RelationFingerprints = {}
+
+        for name in self.relation_fields():
+            match getattr(self, name):
+                case TrailSchema() as value:
+                    relations[name] = value.fingerprint
+                case values:
+                    relations[name] = [value.fingerprint for value in values]
+
+        return relations
+
+    @classmethod
+    @cache
+    def relation_fields(cls) -> tuple[str, ...]:
+        def is_trail(annotation: Any) -> bool:
+            return isinstance(annotation, type) and issubclass(annotation, TrailSchema)
+
+        return tuple(
+            name
+            for name, field in cls.model_fields.items()
+            if is_trail(field.annotation)
+            or (
+                get_origin(field.annotation) is list
+                and is_trail(get_args(field.annotation)[0])
+            )
+        )
 
-    def as_fingerprint(self):
-        serialized = self.model_dump(exclude={"fingerprint"})
-        return generate_fingerprint(serialized)
+    @override
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            self._digest = None
+
+    @override
+    def model_copy(
+        self,
+        *,
+        update: Mapping[str, Any] | None = None,
+        deep: bool = False,
+    ) -> Self:
+        copy = super().model_copy(update=update, deep=deep)
+        if update:
+            copy._digest = None
+        return copy
 
 
 class TrailSchemaRef(BaseModel):
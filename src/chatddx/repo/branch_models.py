@@ -1,8 +1,17 @@
 # src/chatddx/django/repo/models/history.py
 from __future__ import annotations
 
-from django.db.models import PROTECT, ForeignKey
+from django.db.models import (
+    PROTECT,
+    BigIntegerField,
+    CharField,
+    ForeignKey,
+    Model,
+    PositiveIntegerField,
+    UniqueConstraint,
+)
 
+from chatddx.core.models import IdentityModel
 from chatddx.repo.base import BranchModel
 from chatddx.repo.trail_models import (
     AgentTrailModel,
@@ -86,3 +95,33 @@ class OutputTypeBranchModel(BranchModel):
         on_delete=PROTECT,
         related_name="branches",
     )
+
+
+class BranchHeadModel(Model):
+    """
+    Current head and version count of every (branch table, owner, name).
+
+    Branch versions are append-only, so the head only moves forward. It is
+    advanced in the same transaction that inserts the new version, which lets
+    qs_canon read heads from an index instead of ranking all versions.
+    """
+
+    class Meta:
+        app_label = "orm"
+        db_table = "agents_branch_head"
+        constraints = [
+            UniqueConstraint(
+                fields=["branch_table", "owner", "name"],
+                name="unique_branch_head",
+            ),
+        ]
+
+    branch_table = CharField(max_length=64)
+    owner = ForeignKey(
+        IdentityModel,
+        on_delete=PROTECT,
+        related_name="+",
+    )
+    name = CharField(max_length=255)
+    head_id = BigIntegerField()
+    version_count = PositiveIntegerField(default=1)
@@ -0,0 +1,285 @@
+# src/chatddx/repo/shufflers/bulk.py
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from django.db import connections, router, transaction
+from django.db.models.constants import OnConflict
+
+from chatddx.core.models import IdentityModel
+from chatddx.registry.main import parse_registry
+from chatddx.repo.base import BranchModel, TrailModel, TrailSchema
+from chatddx.repo.branch_models import BranchModelRegistry
+from chatddx.repo.main import BundleName, Repo, get_bundle, repo
+from chatddx.repo.shufflers.main import (
+    advance_branch_heads,
+    ensure_identity,
+    qs_canon,
+)
+from chatddx.repo.trail_schemas import TrailRegistry
+from chatddx.utils import ListOf, OneOf, one_or_list_of
+
+# every trail is written after the trails it references
+bundle_dependency_order: list[BundleName] = [
+    "tool",
+    "connection",
+    "sampling_params",
+    "output_type",
+    "tool_group",
+    "agent",
+]
+
+
+@dataclass
+class BundleImportReport:
+    bundle: BundleName
+    trails: int = 0
+    trails_created: int = 0
+    branches: int = 0
+    branches_created: int = 0
+    seconds: float = 0.0
+
+
+def bundle_name_of(identifier: type | object) -> BundleName:
+    bundle_obj = get_bundle(identifier)
+    return next(name for name, value in repo.items() if value is bundle_obj)  # pyright: ignore[reportReturnType]
+
+
+def dump_trail_registry_bulk(
+    registry_path: Path,
+    owner_name: str,
+) -> tuple[BranchModelRegistry, dict[BundleName, BundleImportReport]]:
+    """
+    Bulk counterpart of dump_trail_registry.
+
+    Fingerprints are computed up front, existing trails are found with one
+    IN query per bundle and the missing ones are inserted bottom-up with
+    bulk_create. Branch heads are then compared and created per bundle, all
+    inside a single transaction.
+    """
+    registry = parse_registry(
+        path=registry_path,
+        schema=TrailRegistry,
+    )
+
+    reports = {bundle: BundleImportReport(bundle) for bundle in bundle_dependency_order}
+    schemas: dict[BundleName, dict[str, TrailSchema]] = defaultdict(dict)
+
+    for _, record in registry:
+        for schema in record.values():
+            collect_trail_schemas(schema, schemas)
+
+    dumped_registry: BranchModelRegistry = {}
+
+    with transaction.atomic():
+        owner = ensure_identity(owner_name)
+        fingerprint_pks: dict[str, int] = {}
+
+        for bundle_name in bundle_dependency_order:
+            started = time.perf_counter()
+
+            report = reports[bundle_name]
+            report.trails = len(schemas[bundle_name])
+            report.trails_created = dump_trails_bulk(
+                bundle_name,
+                schemas[bundle_name],
+                fingerprint_pks,
+            )
+            report.seconds += time.perf_counter() - started
+
+        for bundle_name, record in registry:
+            started = time.perf_counter()
+
+            branches, created = dump_branches_bulk(
+                bundle_name,
+                owner,
+                {
+                    branch_name: fingerprint_pks[schema.fingerprint]
+                    for branch_name, schema in record.items()
+                },
+            )
+            dumped_registry[bundle_name] = {branch.pk: branch for branch in branches}
+
+            report = reports[bundle_name]
+            report.branches = len(branches)
+            report.branches_created = created
+            report.seconds += time.perf_counter() - started
+
+    return dumped_registry, reports
+
+
+def collect_trail_schemas(
+    schema: TrailSchema,
+    schemas: dict[BundleName, dict[str, TrailSchema]],
+):
+    bundle_name = bundle_name_of(schema)
+
+    if schema.fingerprint in schemas[bundle_name]:
+        return
+
+    schemas[bundle_name][schema.fingerprint] = schema
+
+    for _, value in schema:
+        match one_or_list_of(TrailSchema, value):
+            case OneOf(child):
+                collect_trail_schemas(child, schemas)
+            case ListOf(children):
+                for child in children:
+                    collect_trail_schemas(child, schemas)
+            case _:
+                pass
+
+
+def dump_trails_bulk(
+    bundle_name: BundleName,
+    schemas: dict[str, TrailSchema],
+    fingerprint_pks: dict[str, int],
+) -> int:
+    """
+    Insert the trails of one bundle that are not stored yet. Referenced
+    trails must already be present in fingerprint_pks, which is extended
+    with the pks of this bundle.
+    """
+    if not schemas:
+        return 0
+
+    model_cls = Repo(bundle_name, TrailModel)
+
+    fingerprint_pks |= dict(
+        model_cls.objects.filter(fingerprint__in=schemas).values_list(
+            "fingerprint", "pk"
+        )
+    )
+
+    missing = [
+        model_cls(
+            fingerprint=fingerprint,
+            **trail_values(model_cls, schema, fingerprint_pks),
+        )
+        for fingerprint, schema in schemas.items()
+        if fingerprint not in fingerprint_pks
+    ]
+
+    if not missing:
+        return 0
+
+    inserted = insert_new_trails(model_cls, missing)
+    fingerprint_pks |= inserted
+
+    # a concurrent import stored these first
+    if skipped := [m.fingerprint for m in missing if m.fingerprint not in inserted]:
+        fingerprint_pks |= dict(
+            model_cls.objects.filter(fingerprint__in=skipped).values_list(
+                "fingerprint", "pk"
+            )
+        )
+
+    return len(inserted)
+
+
+def insert_new_trails(
+    model_cls: type[TrailModel],
+    trails: list[TrailModel],
+) -> dict[str, int]:
+    """
+    bulk_create(ignore_conflicts=True) that returns the pk of every trail it
+    stored by fingerprint. bulk_create returns nothing when conflicts are
+    ignored, so this asks for ON CONFLICT DO NOTHING RETURNING, which leaves
+    out the rows a concurrent import inserted first.
+
+    A select afterwards could not tell those rows from ours, so this calls
+    QuerySet._insert the way bulk_create's _batched_insert does. Its contract
+    is pinned by test_insert_returns_only_inserted_rows.
+    """
+    db = router.db_for_write(model_cls)
+    opts = model_cls._meta
+    fields = [field for field in opts.concrete_fields if field is not opts.pk]
+    returning_fields = [opts.get_field("fingerprint"), opts.pk]
+    batch_size = max(connections[db].ops.bulk_batch_size(fields, trails), 1)
+    inserted: dict[str, int] = {}
+
+    for start in range(0, len(trails), batch_size):
+        rows = model_cls.objects.using(db)._insert(
+            trails[start : start + batch_size],
+            fields=fields,
+            returning_fields=returning_fields,
+            using=db,
+            on_conflict=OnConflict.IGNORE,
+        )
+        inserted |= dict(rows)
+
+    return inserted
+
+
+def trail_values(
+    model_cls: type[TrailModel],
+    schema: TrailSchema,
+    fingerprint_pks: dict[str, int],
+) -> dict[str, Any]:
+    values: dict[str, Any] = {}
+
+    for field_name, field_value in schema:
+        field = model_cls._meta.get_field(field_name)
+        associated_model = (
+            getattr(field, "associated_model", None) or field.related_model
+        )
+
+        match one_or_list_of(TrailSchema, field_value):
+            case OneOf(value) if associated_model:
+                values[field_name + "_id"] = fingerprint_pks[value.fingerprint]
+
+            case ListOf(values_) if associated_model:
+                values[field_name] = [
+                    fingerprint_pks[value.fingerprint] for value in values_
+                ]
+
+            case _:
+                values[field_name] = field_value
+
+    return values
+
+
+def dump_branches_bulk(
+    bundle_name: BundleName,
+    owner: IdentityModel,
+    targets: dict[str, int],
+) -> tuple[list[BranchModel], int]:
+    """
+    Point each named branch at its target trail, creating a new branch
+    version only where the canonical head differs.
+    """
+    if not targets:
+        return [], 0
+
+    branch_model_cls = Repo(bundle_name, BranchModel)
+
+    heads = {
+        branch.name: branch
+        for branch in qs_canon(
+            branch_model_cls.objects.filter(name__in=targets),
+            owner.name,
+        ).select_related("target")
+    }
+
+    new_branches = [
+        branch_model_cls(
+            target_id=target_id,
+            owner=owner,
+            name=branch_name,
+        )
+        for branch_name, target_id in targets.items()
+        if branch_name not in heads or heads[branch_name].target_id != target_id
+    ]
+
+    created = branch_model_cls.objects.bulk_create(new_branches)
+    advance_branch_heads(created)
+
+    unchanged = [
+        head
+        for branch_name, head in heads.items()
+        if head.target_id == targets[branch_name]
+    ]
+
+    return unchanged + created, len(created)
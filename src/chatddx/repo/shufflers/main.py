@@ -1,14 +1,17 @@
 # src/chatddx/repo/shufflers/main.py
 from collections import defaultdict
+from collections.abc import Iterable
 from pathlib import Path
 from typing import Any, cast, get_args
 
+from django.db import connection, transaction
 from django.db.models import (
-    Count,
     F,
+    FilteredRelation,
     ForeignKey,
     OneToOneField,
     OuterRef,
+    Q,
     QuerySet,
     Subquery,
     Window,
@@ -26,7 +29,11 @@ from chatddx.repo.base import (
     TrailSchema,
     TrailSpec,
 )
-from chatddx.repo.branch_models import BranchModelRegistry, OutputTypeBranchModel
+from chatddx.repo.branch_models import (
+    BranchHeadModel,
+    BranchModelRegistry,
+    OutputTypeBranchModel,
+)
 from chatddx.repo.form_data_out import TemplateData
 from chatddx.repo.main import BundleName, Repo
 from chatddx.repo.trail_schemas import TrailRegistry
@@ -39,32 +46,54 @@ agent_relations: list[BundleName] = [
     "tool_group",
 ]
 
+TrailInstances = dict[tuple[type[TrailModel], Any], TrailModel]
+
 
 def ensure_identity(name: str) -> IdentityModel:
     owner, _ = IdentityModel.objects.get_or_create(name=name)
     return owner
 
 
-ensure_identity_async = make_async(ensure_identity)
+async def ensure_identity_async(name: str) -> IdentityModel:
+    owner, _ = await IdentityModel.objects.aget_or_create(name=name)
+    return owner
+
+
+def qs_super_agent[T: BranchModel](qs: QuerySet[T], owner_name: str) -> QuerySet[T]:
+    """
+    Annotate agent branches with {relation}_name and {relation}_id of the
+    owner's newest branch pointing at each related trail.
 
+    The candidate branches of each relation are picked once with DISTINCT ON
+    and left joined, rather than looked up per row.
+    """
+    relations: dict[str, FilteredRelation] = {}
+    branch_annotations: dict[str, F] = {}
 
-def qs_super_agent[T: TrailModel](qs: QuerySet[T], owner_name: str):
-    def subquery(owner_name: str, model: str, column: str):
+    for model in agent_relations:
         branch_model_cls = Repo(model, BranchModel)
+        newest_per_trail = (
+            branch_model_cls.objects.filter(owner__name=owner_name)
+            .order_by("target_id", "-timestamp")
+            .distinct("target_id")
+            .values("id")
+        )
+
+        relations[f"{model}_branch"] = FilteredRelation(
+            f"target__{model}__branches",
+            condition=Q(
+                **{f"target__{model}__branches__id__in": Subquery(newest_per_trail)}
+            ),
+        )
 
-        return branch_model_cls.objects.filter(
-            target=OuterRef(f"target__{model}"),
-            owner__name=owner_name,
-        ).values(column)[:1]
+        for field in ("name", "id"):
+            branch_annotations[f"{model}_{field}"] = F(f"{model}_branch__{field}")
 
-    branch_annotations = {
-        f"{model}_{field}": Subquery(subquery(owner_name, model, field))
-        for field in ("name", "id")
-        for model in agent_relations
-    }
-    return qs.select_related(
-        *[f"target__{model}" for model in agent_relations]
-    ).annotate(**branch_annotations)
+    return (
+        qs.select_related(*[f"target__{model}" for model in agent_relations])
+        .annotate(**relations)
+        .annotate(**branch_annotations)
+    )
 
 
 def qs_owned_trails[T: TrailModel](qs: QuerySet[T], owner_name: str) -> QuerySet[T]:
@@ -77,28 +106,152 @@ def qs_owned_trails[T: TrailModel](qs: QuerySet[T], owner_name: str) -> QuerySet
 
 
 def qs_canon[T: BranchModel](qs: QuerySet[T], owner_name: str) -> QuerySet[T]:
-    owned_qs = qs.filter(owner__name=owner_name)
+    """
+    The heads in qs. A head filtered out of qs is not replaced by an older
+    version, use qs_newest when filtering on what a version points at.
+    """
+    heads = qs_heads(qs.model, owner_name)
 
-    count_subquery = (
-        qs.filter(owner_id=OuterRef("owner_id"), name=OuterRef("name"))
-        .values("owner_id", "name")
-        .annotate(total=Count("id"))
-        .values("total")
+    return (
+        qs.filter(owner__name=owner_name, id__in=heads.values("head_id"))
+        .annotate(_version_count=Subquery(version_count(heads)))
+        .order_by("-timestamp")
     )
 
-    canonical_ids = (
+
+def qs_newest[T: BranchModel](qs: QuerySet[T], owner_name: str) -> QuerySet[T]:
+    """
+    The newest version of each branch in qs, whether or not it is the head,
+    e.g. the version a relation was pinned to before its branch moved on.
+    """
+    owned_qs = qs.filter(owner__name=owner_name)
+
+    newest_ids = (
         owned_qs.order_by("owner_id", "name", "-timestamp")
         .distinct("owner_id", "name")
         .values_list("id", flat=True)
     )
 
     return (
-        owned_qs.filter(id__in=canonical_ids)
-        .annotate(_version_count=Subquery(count_subquery))
+        owned_qs.filter(id__in=newest_ids)
+        .annotate(
+            _version_count=Subquery(
+                version_count(qs_heads(qs.model, owner_name)),
+            )
+        )
         .order_by("-timestamp")
     )
 
 
+def qs_heads(model_cls: type[BranchModel], owner_name: str) -> QuerySet:
+    return BranchHeadModel.objects.filter(
+        branch_table=branch_table(model_cls),
+        owner__name=owner_name,
+    )
+
+
+def version_count(heads: QuerySet) -> QuerySet:
+    return heads.filter(
+        owner_id=OuterRef("owner_id"),
+        name=OuterRef("name"),
+    ).values("version_count")[:1]
+
+
+def branch_table(model_cls: type[BranchModel]) -> str:
+    return model_cls._meta.concrete_model._meta.db_table
+
+
+def advance_branch_heads(branches: Iterable[BranchModel]):
+    """
+    Point the head of each branch at the given version and bump its version
+    count. Call inside the transaction that inserted the versions.
+    """
+    rows = [
+        (branch_table(type(branch)), branch.owner_id, branch.name, branch.pk)
+        for branch in branches
+    ]
+
+    if not rows:
+        return
+
+    table = BranchHeadModel._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"""
+            INSERT INTO {table} (branch_table, owner_id, name, head_id, version_count)
+            VALUES (%s, %s, %s, %s, 1)
+            ON CONFLICT (branch_table, owner_id, name) DO UPDATE
+            SET head_id = EXCLUDED.head_id,
+                version_count = {table}.version_count + 1
+            """,
+            rows,
+        )
+
+
+def rebuild_branch_heads() -> dict[BundleName, int]:
+    """
+    Recompute every branch head from the version history, e.g. after
+    branches were written without advance_branch_heads.
+    """
+    table = BranchHeadModel._meta.db_table
+    counts: dict[BundleName, int] = {}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for bundle_name in get_args(BundleName):
+            source = branch_table(Repo(bundle_name, BranchModel))
+
+            cursor.execute(f"DELETE FROM {table} WHERE branch_table = %s", [source])
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (branch_table, owner_id, name, head_id, version_count)
+                SELECT DISTINCT ON (owner_id, name)
+                    %s, owner_id, name, id, COUNT(*) OVER (PARTITION BY owner_id, name)
+                FROM {source}
+                ORDER BY owner_id, name, timestamp DESC, id DESC
+                """,
+                [source],
+            )
+            counts[bundle_name] = cursor.rowcount
+
+    return counts
+
+
+def refresh_branch_heads(
+    model_cls: type[BranchModel],
+    owner_id: int,
+    names: Iterable[str],
+):
+    """
+    Recompute the heads of the named branches from the versions left, e.g.
+    after versions were deleted. A branch without versions loses its head.
+    Call inside the transaction that deleted them.
+    """
+    table = BranchHeadModel._meta.db_table
+    source = branch_table(model_cls)
+    names = list(names)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {table}
+            WHERE branch_table = %s AND owner_id = %s AND name = ANY(%s)
+            """,
+            [source, owner_id, names],
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (branch_table, owner_id, name, head_id, version_count)
+            SELECT DISTINCT ON (owner_id, name)
+                %s, owner_id, name, id, COUNT(*) OVER (PARTITION BY owner_id, name)
+            FROM {source}
+            WHERE owner_id = %s AND name = ANY(%s)
+            ORDER BY owner_id, name, timestamp DESC, id DESC
+            """,
+            [source, owner_id, names],
+        )
+
+
 def qs_owned[T: BranchModel](qs: QuerySet[T], owner_name: str) -> QuerySet[T]:
     return qs.filter(owner__name=owner_name)
 
@@ -166,11 +319,7 @@ def load_form_data(
 dump_trail_registry_async = make_async(dump_trail_registry)
 
 
-def load_agents(
-    owner_name: str,
-    output_type: str | None = None,
-):
-
+def qs_agents(owner_name: str, output_type: str | None = None) -> QuerySet:
     model_cls = Repo("agent", BranchModel)
 
     collection_a_targets = OutputTypeBranchModel.objects.filter(
@@ -181,21 +330,36 @@ def load_agents(
         target__output_type__in=collection_a_targets
     ).distinct()
 
+    return qs_canon(matching_agent_branches, owner_name)
+
+
+def load_agents(
+    owner_name: str,
+    output_type: str | None = None,
+):
     return load_branches(
         bundle_name="agent",
         owner_name=owner_name,
-        qs=qs_canon(matching_agent_branches, owner_name),
+        qs=qs_agents(owner_name, output_type),
     )
 
 
-load_agents_async = make_async(load_agents)
+async def load_agents_async(
+    owner_name: str,
+    output_type: str | None = None,
+):
+    return await load_branches_async(
+        bundle_name="agent",
+        owner_name=owner_name,
+        qs=qs_agents(owner_name, output_type),
+    )
 
 
-def load_branches(
+def qs_branches(
     bundle_name: str,
     owner_name: str,
     qs: QuerySet | None = None,
-) -> list[BranchSpec[TrailSpec]]:
+) -> QuerySet:
     if qs is None:
         model_cls = Repo(bundle_name, BranchModel)
         qs = qs_canon(
@@ -203,55 +367,99 @@ def load_branches(
             owner_name,
         )
 
+    return qs.select_related("target").prefetch_related("collaborators")
+
+
+def load_branches(
+    bundle_name: str,
+    owner_name: str,
+    qs: QuerySet | None = None,
+) -> list[BranchSpec[TrailSpec]]:
     spec_cls = Repo(bundle_name, BranchSpec)
 
-    specs: list[BranchSpec[TrailSpec]] = []
-    for model in qs:
-        model.target = resolve_related_array_fields(model.target)
-        specs.append(spec_cls.model_validate(model))
+    models = list(qs_branches(bundle_name, owner_name, qs))
+    _ = resolve_related_array_fields_bulk(model.target for model in models)
 
-    return specs
+    return [spec_cls.model_validate(model) for model in models]
 
 
-def load_agent(
+async def load_branches_async(
+    bundle_name: str,
     owner_name: str,
-    branch_name: str,
-    output_type: str | None = None,
-):
+    qs: QuerySet | None = None,
+) -> list[BranchSpec[TrailSpec]]:
+    spec_cls = Repo(bundle_name, BranchSpec)
+
+    models = [model async for model in qs_branches(bundle_name, owner_name, qs)]
+    _ = await resolve_related_array_fields_bulk_async(model.target for model in models)
+
+    return [spec_cls.model_validate(model) for model in models]
+
+
+def qs_agent(output_type: str | None = None) -> QuerySet:
     model_cls = Repo("agent", BranchModel)
     qs = model_cls.objects.all()
     if output_type:
         qs = qs.filter(target__output_type__fingerprint=output_type)
 
+    return qs
+
+
+def load_agent(
+    owner_name: str,
+    branch_name: str,
+    output_type: str | None = None,
+):
     return load_branch(
         bundle_name="agent",
         owner_name=owner_name,
-        qs=qs,
+        qs=qs_agent(output_type),
     )
 
 
-load_agent_async = make_async(load_agent)
+async def load_agent_async(
+    owner_name: str,
+    branch_name: str,
+    output_type: str | None = None,
+):
+    return await load_branch_async(
+        bundle_name="agent",
+        owner_name=owner_name,
+        qs=qs_agent(output_type),
+    )
 
 
-def load_branch(
+def qs_branch(
     bundle_name: str,
     owner_name: str,
     branch_name: str | None = None,
     trail: TrailModel | TrailSchema | None = None,
     qs: QuerySet | None = None,
-) -> BranchSpec[TrailSpec] | None:
-    spec_cls = Repo(bundle_name, BranchSpec)
-
+) -> QuerySet:
     if qs is None:
         model_cls = Repo(bundle_name, BranchModel)
         qs = model_cls.objects.all()
 
-    if trail:
-        qs = qs.filter(target__fingerprint=trail.fingerprint)
     if branch_name:
         qs = qs.filter(name=branch_name)
+    if trail:
+        # the branch may have moved on from the trail since it was pinned
+        qs = qs_newest(qs.filter(target__fingerprint=trail.fingerprint), owner_name)
+    else:
+        qs = qs_canon(qs, owner_name)
 
-    qs = qs_canon(qs, owner_name)
+    return qs.select_related("target")
+
+
+def load_branch(
+    bundle_name: str,
+    owner_name: str,
+    branch_name: str | None = None,
+    trail: TrailModel | TrailSchema | None = None,
+    qs: QuerySet | None = None,
+) -> BranchSpec[TrailSpec] | None:
+    spec_cls = Repo(bundle_name, BranchSpec)
+    qs = qs_branch(bundle_name, owner_name, branch_name, trail, qs)
 
     if (branch := qs.first()) is None:
         return branch
@@ -261,7 +469,25 @@ def load_branch(
     return spec_cls.model_validate(branch)
 
 
-load_branch_async = make_async(load_branch)
+async def load_branch_async(
+    bundle_name: str,
+    owner_name: str,
+    branch_name: str | None = None,
+    trail: TrailModel | TrailSchema | None = None,
+    qs: QuerySet | None = None,
+) -> BranchSpec[TrailSpec] | None:
+    spec_cls = Repo(bundle_name, BranchSpec)
+    qs = qs_branch(bundle_name, owner_name, branch_name, trail, qs)
+
+    # collaborators are read by validation, which must not touch the database
+    branch = await qs.prefetch_related("collaborators").afirst()
+
+    if branch is None:
+        return branch
+
+    branch.target = await resolve_related_array_fields_async(branch.target)
+
+    return spec_cls.model_validate(branch)
 
 
 def dump_branch(
@@ -275,10 +501,14 @@ def dump_branch(
 
     owner = ensure_identity(owner_name)
 
-    canon = qs_canon(
-        branch_model_cls.objects.filter(name=branch_name),
-        owner.name,
-    ).first()
+    canon = (
+        qs_canon(
+            branch_model_cls.objects.filter(name=branch_name),
+            owner.name,
+        )
+        .select_related("target")
+        .first()
+    )
 
     if canon and trail.fingerprint == canon.target.fingerprint:
         return canon, False
@@ -295,7 +525,9 @@ def dump_branch(
         name=branch_name,
     )
 
-    branch_instance.save()
+    with transaction.atomic():
+        branch_instance.save()
+        advance_branch_heads([branch_instance])
 
     return branch_instance, True
 
@@ -319,7 +551,20 @@ def load_trail[T: (TrailSpec, TrailModel)](
     return as_schema.model_validate(trail_model)
 
 
-load_trail_async = make_async(load_trail)
+async def load_trail_async[T: (TrailSpec, TrailModel)](
+    bundle: Any,
+    fingerprint: str,
+    as_schema: type[T],
+) -> T:
+    trail_model_cls = Repo(bundle, TrailModel)
+    trail_model = await trail_model_cls.objects.aget(fingerprint=fingerprint)
+
+    trail_model = await resolve_related_array_fields_async(trail_model)
+
+    if as_schema == TrailModel:
+        return cast(T, trail_model)
+
+    return as_schema.model_validate(trail_model)
 
 
 def dump_trail[T: TrailModel](
@@ -364,29 +609,148 @@ def dump_trail[T: TrailModel](
 dump_trail_async = make_async(dump_trail)
 
 
-def resolve_related_array_fields(model: TrailModel):
-    for field in model._meta.concrete_fields:
-        if isinstance(field, RelatedArrayField):
-            value = getattr(model, field.name)
+def resolve_related_array_fields[T: TrailModel](model: T) -> T:
+    (resolved,) = resolve_related_array_fields_bulk([model])
+    return resolved
 
-            if not value:
-                setattr(model, field.name, [])
-                continue
 
-            queryset = field.associated_model.objects.filter(pk__in=value)
-            resolved_value = list(queryset)
+async def resolve_related_array_fields_async[T: TrailModel](model: T) -> T:
+    (resolved,) = await resolve_related_array_fields_bulk_async([model])
+    return resolved
 
-            for obj in resolved_value:
-                _ = resolve_related_array_fields(obj)
 
-            setattr(model, field.name, resolved_value)
+def resolve_related_array_fields_bulk[T: TrailModel](models: Iterable[T]) -> list[T]:
+    """
+    Hydrate the relation trees of many trail models at once.
 
-        elif isinstance(field, (ForeignKey, OneToOneField)):
-            associated_model = getattr(model, field.name, None)
-            if associated_model is not None:
-                _ = resolve_related_array_fields(associated_model)
+    The trees are walked level by level, so each related model class costs at
+    most one query per level regardless of batch size. Trails are immutable,
+    so a trail reachable from several parents is fetched and resolved once and
+    shared between them.
+    """
+    models = list(models)
+    hydration = _Hydration(models)
 
-    return model
+    while hydration.level:
+        for model_cls, pks in hydration.missing().items():
+            hydration.add(model_cls.objects.filter(pk__in=pks))
+        hydration.link()
+
+    return models
 
 
-resolve_related_array_fields_async = make_async(resolve_related_array_fields)
+async def resolve_related_array_fields_bulk_async[T: TrailModel](
+    models: Iterable[T],
+) -> list[T]:
+    models = list(models)
+    hydration = _Hydration(models)
+
+    while hydration.level:
+        for model_cls, pks in hydration.missing().items():
+            hydration.add(
+                [model async for model in model_cls.objects.filter(pk__in=pks)]
+            )
+        hydration.link()
+
+    return models
+
+
+class _Hydration:
+    """
+    Database free state of resolve_related_array_fields_bulk. Each level is
+    resolved by fetching missing() with whatever ORM flavour the caller runs
+    in, passing the results to add() and then calling link().
+    """
+
+    def __init__(self, models: list[TrailModel]):
+        self.instances: TrailInstances = {}
+
+        for model in models:
+            _ = self.instances.setdefault((type(model), model.pk), model)
+
+        self.visited: set[tuple[type[TrailModel], Any]] = set(self.instances)
+        self.level: list[TrailModel] = list(models)
+
+    def relations(self):
+        by_cls: dict[type[TrailModel], list[TrailModel]] = defaultdict(list)
+        for model in self.level:
+            by_cls[type(model)].append(model)
+
+        for model_cls, group in by_cls.items():
+            for field in model_cls._meta.concrete_fields:
+                if isinstance(field, (RelatedArrayField, ForeignKey, OneToOneField)):
+                    yield field, group
+
+    def missing(self) -> dict[type[TrailModel], set[Any]]:
+        missing: dict[type[TrailModel], set[Any]] = defaultdict(set)
+
+        for field, group in self.relations():
+            match field:
+                case RelatedArrayField():
+                    related_cls = field.associated_model
+                    pks = {
+                        value
+                        for model in group
+                        for value in getattr(model, field.name) or []
+                        if not isinstance(value, TrailModel)
+                    }
+                case _:
+                    related_cls = field.related_model
+                    for model in group:
+                        if field.is_cached(model) and (
+                            value := getattr(model, field.name)
+                        ):
+                            _ = self.instances.setdefault(
+                                (related_cls, value.pk), value
+                            )
+
+                    pks = {
+                        pk
+                        for model in group
+                        if (pk := getattr(model, field.attname)) is not None
+                    }
+
+            missing[related_cls] |= {
+                pk for pk in pks if (related_cls, pk) not in self.instances
+            }
+
+        return {model_cls: pks for model_cls, pks in missing.items() if pks}
+
+    def add(self, models: Iterable[TrailModel]):
+        for model in models:
+            self.instances[(type(model), model.pk)] = model
+
+    def link(self):
+        children: TrailInstances = {}
+
+        for field, group in self.relations():
+            match field:
+                case RelatedArrayField():
+                    related_cls = field.associated_model
+
+                    for model in group:
+                        values = [
+                            value
+                            if isinstance(value, TrailModel)
+                            else self.instances[(related_cls, value)]
+                            for value in getattr(model, field.name) or []
+                        ]
+                        setattr(model, field.name, values)
+
+                        for value in values:
+                            children[(related_cls, value.pk)] = value
+                case _:
+                    related_cls = field.related_model
+
+                    for model in group:
+                        if (pk := getattr(model, field.attname)) is None:
+                            continue
+
+                        value = self.instances[(related_cls, pk)]
+                        setattr(model, field.name, value)
+                        children[(related_cls, pk)] = value
+
+        self.level = [
+            model for key, model in children.items() if key not in self.visited
+        ]
+        self.visited |= children.keys()
@@ -0,0 +1,52 @@
+# src/chatddx/repo/tests/benchmark_fingerprint.py
+"""
+Compare memoized Merkle fingerprints against recomputing every subtree on
+each access, which is what fingerprinting did before memoization.
+
+    python -m chatddx.repo.tests.benchmark_fingerprint
+"""
+
+import timeit
+
+import django
+
+django.setup()
+
+from chatddx.repo.base import TrailSchema  # noqa: E402
+from chatddx.repo.tests.test_fingerprint import make_agent  # noqa: E402
+
+
+def recomputed_fingerprint(schema: TrailSchema) -> str:
+    relations = {}
+
+    for name in schema.relation_fields():
+        match getattr(schema, name):
+            case TrailSchema() as value:
+                relations[name] = recomputed_fingerprint(value)
+            case values:
+                relations[name] = [recomputed_fingerprint(value) for value in values]
+
+    return schema.as_fingerprint(relations)
+
+
+def main():
+    for tool_count in (10, 100, 1000):
+        number = max(10, 1000 // tool_count)
+        agent = make_agent(tool_count)
+        _ = agent.fingerprint
+
+        recomputed = timeit.timeit(lambda: recomputed_fingerprint(agent), number=number)
+        fresh = make_agent(tool_count)
+        cold = timeit.timeit(lambda: fresh.fingerprint, number=1)
+        memoized = timeit.timeit(lambda: agent.fingerprint, number=number)
+
+        print(
+            f"{tool_count:>5} tools: "
+            f"recomputed {recomputed / number * 1e3:8.3f}ms  "
+            f"cold {cold * 1e3:8.3f}ms  "
+            f"memoized {memoized / number * 1e3:8.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# src/chatddx/repo/tests/test_branch_heads.py
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from django.contrib import admin
+from django.test import RequestFactory
+
+from chatddx.core.models import IdentityModel
+from chatddx.django.portal.forms.agent import AgentForm
+from chatddx.repo import proxies
+from chatddx.repo.branch_models import (
+    AgentBranchModel,
+    BranchHeadModel,
+    ConnectionBranchModel,
+)
+from chatddx.repo.shufflers.main import (
+    dump_branch,
+    dump_trail_registry,
+    load_branch,
+    qs_canon,
+    rebuild_branch_heads,
+)
+from chatddx.repo.trail_models import AgentTrailModel, ConnectionTrailModel
+
+
+@pytest.fixture
+def owner():
+    owner, _created = IdentityModel.objects.get_or_create(name="heads-owner")
+    return owner
+
+
+@pytest.fixture(autouse=True)
+def branches(owner: IdentityModel):
+    path = Path(__file__).parent / "data/test-registry.toml"
+    return dump_trail_registry(path, owner_name=owner.name)
+
+
+def canon(owner: IdentityModel):
+    return {
+        branch.name: (branch.pk, branch._version_count)
+        for branch in qs_canon(AgentBranchModel.objects.all(), owner.name)
+    }
+
+
+def heads():
+    return set(
+        BranchHeadModel.objects.values_list(
+            "branch_table", "owner_id", "name", "head_id", "version_count"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_canon_matches_history(owner: IdentityModel):
+    expected: dict[str, tuple[int, int]] = {}
+
+    for branch in AgentBranchModel.objects.filter(owner=owner).order_by("timestamp"):
+        count = expected.get(branch.name, (0, 0))[1]
+        expected[branch.name] = (branch.pk, count + 1)
+
+    assert canon(owner) == expected
+
+
+@pytest.mark.django_db
+def test_dump_branch_advances_head(owner: IdentityModel):
+    pk, count = canon(owner)["agent-1"]
+    current = AgentBranchModel.objects.get(pk=pk).target
+    other = AgentTrailModel.objects.exclude(pk=current.pk).first()
+    assert other
+
+    branch, created = dump_branch("agent", "agent-1", owner.name, other)
+
+    assert created
+    assert canon(owner)["agent-1"] == (branch.pk, count + 1)
+
+    _, created = dump_branch("agent", "agent-1", owner.name, other)
+
+    assert not created
+    assert canon(owner)["agent-1"] == (branch.pk, count + 1)
+
+
+@pytest.mark.django_db
+def test_rebuild_matches_maintained(owner: IdentityModel):
+    other = AgentTrailModel.objects.order_by("pk").first()
+    assert other
+    _ = dump_branch("agent", "agent-1", owner.name, other)
+
+    maintained = heads()
+    _ = rebuild_branch_heads()
+
+    assert heads() == maintained
+
+
+def admin_request(owner: IdentityModel):
+    request = RequestFactory().post("/")
+    request.user = SimpleNamespace(username=owner.name)  # pyright: ignore
+    return request
+
+
+@pytest.mark.django_db
+def test_deleting_the_head_falls_back(owner: IdentityModel):
+    pk, count = canon(owner)["agent-1"]
+    current = AgentBranchModel.objects.get(pk=pk).target
+    other = AgentTrailModel.objects.exclude(pk=current.pk).first()
+    assert other
+    head, _ = dump_branch("agent", "agent-1", owner.name, other)
+
+    model_admin = admin.site._registry[proxies.Agent]
+    model_admin.delete_model(
+        admin_request(owner), proxies.Agent.objects.get(pk=head.pk)
+    )
+
+    assert canon(owner)["agent-1"] == (pk, count)
+
+    maintained = heads()
+    _ = rebuild_branch_heads()
+    assert heads() == maintained
+
+
+@pytest.mark.django_db
+def test_deleting_a_branch_drops_its_head(owner: IdentityModel):
+    model_admin = admin.site._registry[proxies.Agent]
+    request = admin_request(owner)
+    model_admin.delete_queryset(
+        request,
+        model_admin.get_queryset(request).filter(name="agent-1"),
+    )
+
+    assert "agent-1" not in canon(owner)
+    assert not BranchHeadModel.objects.filter(name="agent-1").exists()
+
+    other = AgentTrailModel.objects.order_by("pk").first()
+    assert other
+    branch, _ = dump_branch("agent", "agent-1", owner.name, other)
+    assert canon(owner)["agent-1"] == (branch.pk, 1)
+
+
+@pytest.mark.django_db
+def test_relation_pinned_to_a_superseded_version(owner: IdentityModel):
+    pk, _count = canon(owner)["agent-1"]
+    agent = proxies.Agent.objects.get(pk=pk)
+    pinned = ConnectionBranchModel.objects.filter(
+        owner=owner, target=agent.target.connection
+    ).first()
+    assert pinned
+
+    # move the connection branch on to a copy of its trail
+    moved = ConnectionTrailModel.objects.get(pk=pinned.target_id)
+    moved.pk = None
+    moved._state.adding = True
+    moved.fingerprint = "0" * 64
+    moved.save()
+    _ = dump_branch("connection", pinned.name, owner.name, moved)
+    connection_branches = ConnectionBranchModel.objects.count()
+
+    loaded = load_branch("connection", owner.name, trail=agent.target.connection)
+    assert loaded
+    assert loaded.name == pinned.name
+
+    request = RequestFactory().get("/")
+    request.user = SimpleNamespace(username=owner.name)  # pyright: ignore
+    _ = AgentForm(instance=agent, request=request)
+
+    assert ConnectionBranchModel.objects.count() == connection_branches
@@ -9,8 +9,17 @@ from chatddx.repo.base import BranchModel
 from chatddx.repo.shufflers.main import (
     dump_trail_registry_async,
     ensure_identity_async,
+    load_agents,
+    load_agents_async,
+    load_branch,
     load_branch_async,
+    load_branches,
+    load_branches_async,
+    load_trail,
+    load_trail_async,
 )
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.utils import make_async
 
 
 @pytest_asyncio.fixture(autouse=True)
@@ -41,3 +50,26 @@ async def test_model_from_schema(owner: IdentityModel):
     )
     assert branch_model.id is not None
     assert branch_model.name == "agent-1"
+
+
+@pytest.mark.django_db
+@pytest.mark.asyncio
+async def test_async_loaders_match_sync(owner: IdentityModel):
+    branch = await load_branch_async("agent", owner.name, branch_name="agent-1")
+    assert branch is not None
+    assert branch == await make_async(load_branch)(
+        "agent", owner.name, branch_name="agent-1"
+    )
+
+    assert await load_branches_async("agent", owner.name) == await make_async(
+        load_branches
+    )("agent", owner.name)
+
+    assert await load_agents_async(owner.name, "swift") == await make_async(
+        load_agents
+    )(owner.name, "swift")
+
+    fingerprint = branch.target.fingerprint
+    assert await load_trail_async("agent", fingerprint, AgentSpec) == await make_async(
+        load_trail
+    )("agent", fingerprint, AgentSpec)
@@ -0,0 +1,110 @@
+# src/chatddx/repo/tests/test_bulk_import.py
+from pathlib import Path
+
+import pytest
+from django.db import connection
+from django.db.models.constants import OnConflict
+from django.test.utils import CaptureQueriesContext
+
+from chatddx.repo.base import TrailModel
+from chatddx.repo.branch_models import AgentBranchModel, BranchModelRegistry
+from chatddx.repo.main import Repo
+from chatddx.repo.shufflers.bulk import (
+    bundle_dependency_order,
+    dump_trail_registry_bulk,
+    insert_new_trails,
+)
+from chatddx.repo.shufflers.main import dump_trail_registry
+
+registry_path = Path(__file__).parent / "data/test-registry.toml"
+
+
+def summarize(registry: BranchModelRegistry):
+    return {
+        bundle: sorted((branch.name, branch.target_id) for branch in branches.values())
+        for bundle, branches in registry.items()
+    }
+
+
+def trail_counts():
+    return {
+        bundle: Repo(bundle, TrailModel).objects.count()
+        for bundle in bundle_dependency_order
+    }
+
+
+@pytest.mark.django_db
+def test_bulk_matches_per_branch_import():
+    before = trail_counts()
+    bulk, reports = dump_trail_registry_bulk(registry_path, "bulk-owner")
+    after = trail_counts()
+
+    single = dump_trail_registry(registry_path, "bulk-owner")
+
+    assert summarize(bulk) == summarize(single)
+    assert trail_counts() == after
+    assert reports["agent"].branches_created == len(bulk["agent"])
+    assert all(
+        report.trails_created == after[bundle] - before[bundle]
+        for bundle, report in reports.items()
+    )
+
+
+@pytest.mark.django_db
+def test_bulk_is_idempotent():
+    first, _ = dump_trail_registry_bulk(registry_path, "bulk-owner")
+    branch_count = AgentBranchModel.objects.count()
+
+    with CaptureQueriesContext(connection) as ctx:
+        second, reports = dump_trail_registry_bulk(registry_path, "bulk-owner")
+
+    assert summarize(first) == summarize(second)
+    assert AgentBranchModel.objects.count() == branch_count
+    assert all(report.trails_created == 0 for report in reports.values())
+    assert all(report.branches_created == 0 for report in reports.values())
+
+    # identity, one lookup per bundle for trails and for branch heads
+    assert len(ctx.captured_queries) <= 3 + 2 * len(bundle_dependency_order)
+
+
+def won_and_new_trails(model_cls: type[TrailModel]):
+    _ = dump_trail_registry_bulk(registry_path, "bulk-owner")
+    stored = model_cls.objects.order_by("pk").first()
+    assert stored
+
+    # a copy of a stored trail is what a concurrent import that won looks like
+    won, new = model_cls.objects.get(pk=stored.pk), model_cls.objects.get(pk=stored.pk)
+    for trail in (won, new):
+        trail.pk = None
+        trail._state.adding = True
+    new.fingerprint = "0" * 64
+
+    return won, new
+
+
+@pytest.mark.django_db
+def test_insert_returns_only_inserted_rows():
+    # the private QuerySet._insert contract insert_new_trails relies on
+    model_cls = Repo("connection", TrailModel)
+    won, new = won_and_new_trails(model_cls)
+    opts = model_cls._meta
+
+    rows = model_cls.objects.using("default")._insert(
+        [won, new],
+        fields=[field for field in opts.concrete_fields if field is not opts.pk],
+        returning_fields=[opts.get_field("fingerprint"), opts.pk],
+        using="default",
+        on_conflict=OnConflict.IGNORE,
+    )
+
+    assert rows == [(new.fingerprint, model_cls.objects.get(fingerprint="0" * 64).pk)]
+
+
+@pytest.mark.django_db
+def test_trails_stored_concurrently_are_not_counted():
+    model_cls = Repo("connection", TrailModel)
+    won, new = won_and_new_trails(model_cls)
+
+    inserted = insert_new_trails(model_cls, [won, new])
+
+    assert inserted == {new.fingerprint: model_cls.objects.get(fingerprint="0" * 64).pk}
@@ -1,8 +1,13 @@
 # src/chatddx/backend/repo/test/test_fingerprint.py
 from pathlib import Path
+from typing import Any
+
+import pytest
 
 from chatddx.registry.main import parse_registry
-from chatddx.repo.trail_schemas import TrailRegistry
+from chatddx.repo import base
+from chatddx.repo.trail_schemas import AgentSchema, TrailRegistry
+from chatddx.utils import generate_fingerprint
 
 registry: TrailRegistry = parse_registry(
     path=Path(__file__).parent / "data/test-registry.toml",
@@ -21,3 +26,59 @@ def test_properties():
 
     agent_1_.instructions += "a"
     assert agent_1_.fingerprint != fingerprint
+
+
+def make_agent(tool_count: int) -> AgentSchema:
+    return AgentSchema.model_validate(
+        {
+            "instructions": "benchmark",
+            "connection": {
+                "provider": "vllm",
+                "model": "Test/test-1",
+                "endpoint": "http://example.com/v1/",
+            },
+            "tool_group": {
+                "instructions": "use these tools",
+                "tools": [
+                    {"command": f"tool-{i}", "type": "function"}
+                    for i in range(tool_count)
+                ],
+            },
+        }
+    )
+
+
+def test_merkle_memoization(monkeypatch: pytest.MonkeyPatch):
+    calls: list[None] = []
+
+    def counting_fingerprint(data: Any):
+        calls.append(None)
+        return generate_fingerprint(data)
+
+    monkeypatch.setattr(base, "generate_fingerprint", counting_fingerprint)
+
+    agent = make_agent(tool_count=50)
+    fingerprint = agent.fingerprint
+
+    # agent, four relations and fifty tools, each hashed once
+    assert len(calls) == 1 + 4 + 50
+
+    calls.clear()
+    _ = agent.model_dump()
+    assert agent.fingerprint == fingerprint
+    assert len(calls) == 0
+
+
+def test_merkle_invalidation():
+    agent = make_agent(tool_count=3)
+    fingerprint = agent.fingerprint
+    tool_group_fingerprint = agent.tool_group.fingerprint
+
+    agent.tool_group.tools[0].description = "changed"
+
+    assert agent.tool_group.fingerprint != tool_group_fingerprint
+    assert agent.fingerprint != fingerprint
+
+    copy = agent.model_copy(update={"instructions": "copied"})
+    assert copy.fingerprint != agent.fingerprint
+    assert copy.fingerprint == AgentSchema.model_validate(copy.model_dump()).fingerprint
@@ -0,0 +1,75 @@
+# src/chatddx/repo/tests/test_hydration.py
+from pathlib import Path
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chatddx.core.models import IdentityModel
+from chatddx.repo.shufflers.main import (
+    dump_trail_registry,
+    load_branches,
+    load_template_data,
+    resolve_related_array_fields_bulk,
+)
+from chatddx.repo.trail_models import AgentTrailModel, ToolGroupTrailModel
+from chatddx.repo.trail_specs import AgentSpec
+
+
+@pytest.fixture
+def owner():
+    owner, _created = IdentityModel.objects.get_or_create(name="alex")
+    return owner
+
+
+@pytest.fixture(autouse=True)
+def branches(owner: IdentityModel):
+    path = Path(__file__).parent / "data/test-registry.toml"
+    return dump_trail_registry(path, owner_name=owner.name)
+
+
+@pytest.mark.django_db
+def test_bulk_matches_single():
+    agents = list(AgentTrailModel.objects.order_by("pk"))
+    _ = resolve_related_array_fields_bulk(agents)
+
+    for agent in agents:
+        assert isinstance(agent.tool_group.tools, list)
+        assert AgentSpec.model_validate(agent).fingerprint == agent.fingerprint
+
+
+@pytest.mark.django_db
+def test_bulk_preserves_array_order():
+    tool_group = ToolGroupTrailModel.objects.exclude(tools=[]).first()
+    assert tool_group
+
+    pks = list(tool_group.tools)
+    (resolved,) = resolve_related_array_fields_bulk([tool_group])
+
+    assert [tool.pk for tool in resolved.tools] == pks
+
+
+@pytest.mark.django_db
+def test_bulk_query_count():
+    agents = list(AgentTrailModel.objects.all())
+
+    with CaptureQueriesContext(connection) as ctx:
+        _ = resolve_related_array_fields_bulk(agents)
+
+    # one level of foreign keys, then one level of tools
+    assert len(ctx.captured_queries) == 5
+
+
+@pytest.mark.django_db
+def test_page_load_query_count(owner: IdentityModel):
+    with CaptureQueriesContext(connection) as ctx:
+        _ = load_branches("agent", owner.name)
+
+    agent_queries = len(ctx.captured_queries)
+
+    with CaptureQueriesContext(connection) as ctx:
+        _ = load_template_data(owner.name)
+
+    # branches, collaborators, four foreign keys and tools
+    assert agent_queries == 7
+    assert len(ctx.captured_queries) <= agent_queries + 5 * 3
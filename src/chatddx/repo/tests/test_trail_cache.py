@@ -0,0 +1,113 @@
+# src/chatddx/repo/tests/test_trail_cache.py
+from pathlib import Path
+
+import pytest
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from chatddx.core.models import IdentityModel
+from chatddx.repo.branch_models import BranchModelRegistry
+from chatddx.repo.shufflers.main import (
+    dump_trail_registry,
+    dump_trail_registry_async,
+    ensure_identity_async,
+)
+from chatddx.repo.trail_cache import TrailCache
+from chatddx.repo.trail_specs import AgentSpec
+
+
+@pytest.fixture
+def owner():
+    owner, _created = IdentityModel.objects.get_or_create(name="alex")
+    return owner
+
+
+@pytest.fixture
+def branches(owner: IdentityModel):
+    path = Path(__file__).parent / "data/test-registry.toml"
+    return dump_trail_registry(path, owner_name=owner.name)
+
+
+def agent_pks(branches: BranchModelRegistry) -> list[int]:
+    return sorted({branch.target_id for branch in branches["agent"].values()})
+
+
+@pytest.mark.django_db
+def test_sync_fills_cache(branches: BranchModelRegistry):
+    cache = TrailCache(max_size=10)
+    pk = agent_pks(branches)[0]
+
+    spec = cache.get_sync(AgentSpec, pk)
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert cache.get_sync(AgentSpec, pk) is spec
+        assert cache.get_by_fingerprint_sync(AgentSpec, spec.fingerprint) is spec
+
+    assert len(ctx.captured_queries) == 0
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.asyncio
+async def test_async_shares_sync_entries():
+    owner = await ensure_identity_async("alex")
+    path = Path(__file__).parent / "data/test-registry.toml"
+    branches = await dump_trail_registry_async(path, owner_name=owner.name)
+
+    cache = TrailCache(max_size=10)
+    pk = agent_pks(branches)[0]
+
+    spec = await cache.get_async(AgentSpec, pk)
+
+    assert cache.get_sync(AgentSpec, pk) is spec
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.django_db
+def test_eviction(branches: BranchModelRegistry):
+    cache = TrailCache(max_size=2)
+    pks = agent_pks(branches)
+
+    for pk in pks:
+        _ = cache.get_sync(AgentSpec, pk)
+
+    assert cache.stats.size == 2
+    assert cache.stats.evictions == len(pks) - 2
+    assert list(key[1] for key in cache.cache) == pks[-2:]
+    assert len(cache.fingerprints) == 2
+
+
+@pytest.mark.django_db
+def test_byte_bound(branches: BranchModelRegistry):
+    cache = TrailCache(max_size=100, max_bytes=1)
+
+    for pk in agent_pks(branches):
+        _ = cache.get_sync(AgentSpec, pk)
+
+    assert cache.stats.size == 1
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "trails": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
+)
+def test_shared_tier(branches: BranchModelRegistry):
+    caches["trails"].clear()
+    pk = agent_pks(branches)[0]
+
+    worker_a = TrailCache(max_size=10, shared_alias="trails")
+    worker_b = TrailCache(max_size=10, shared_alias="trails")
+
+    spec = worker_a.get_sync(AgentSpec, pk)
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert worker_b.get_sync(AgentSpec, pk) == spec
+        assert worker_b.get_by_fingerprint_sync(AgentSpec, spec.fingerprint) == spec
+
+    assert len(ctx.captured_queries) == 0
+    assert worker_b.stats.shared_hits == 1
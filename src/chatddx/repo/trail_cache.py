@@ -1,51 +1,274 @@
 from collections import OrderedDict
-from typing import cast
+from collections.abc import Iterable
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, cast
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
 
 from chatddx.repo.base import TrailModel, TrailSpec
 from chatddx.repo.main import Repo
 from chatddx.repo.shufflers.main import (
-    resolve_related_array_fields,
-    resolve_related_array_fields_async,
+    resolve_related_array_fields_bulk,
+    resolve_related_array_fields_bulk_async,
 )
 
+CacheKey = tuple[type[TrailSpec], int]
+
+
+@dataclass
+class TrailCacheStats:
+    hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class TrailCacheEntry:
+    spec: TrailSpec
+    nbytes: int
+
 
 class TrailCache:
-    cache: OrderedDict[tuple[type[TrailSpec], int], TrailSpec]
+    """
+    Trails are content addressed and immutable, so a hydrated spec never goes
+    stale. Entries are shared between callers and must be treated as read-only.
+
+    The local tier is a bounded LRU per process. The optional shared tier is a
+    django cache alias (e.g. redis or memcached) holding the serialized spec,
+    which lets workers skip hydration for trails another worker already loaded.
+    """
 
-    def __init__(self, max_size: int):
+    cache: OrderedDict[CacheKey, TrailCacheEntry]
+
+    def __init__(
+        self,
+        max_size: int,
+        max_bytes: int | None = None,
+        shared_alias: str | None = None,
+    ):
         self.max_size: int = max_size
+        self.max_bytes: int | None = max_bytes
+        self.shared_alias: str | None = shared_alias
         self.cache = OrderedDict()
+        self.fingerprints: dict[tuple[type[TrailSpec], str], int] = {}
+        self.stats = TrailCacheStats()
+        self._lock = Lock()
+
+    @property
+    def shared(self) -> BaseCache | None:
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
 
     def get_sync[T: TrailSpec](self, Spec: type[T], pk: int) -> T:
+        return self.get_many_sync(Spec, [pk])[pk]
+
+    async def get_async[T: TrailSpec](self, Spec: type[T], pk: int) -> T:
+        return (await self.get_many_async(Spec, [pk]))[pk]
+
+    def get_many_sync[T: TrailSpec](
+        self,
+        Spec: type[T],
+        pks: Iterable[int],
+    ) -> dict[int, T]:
+        specs, missing = self._get_many_local(Spec, pks)
+
+        if missing and (shared := self.shared) is not None:
+            keys = {self._shared_key(Spec, pk): pk for pk in missing}
+            for key, data in shared.get_many(list(keys)).items():
+                specs[keys[key]] = self._put_shared_hit(Spec, keys[key], data)
+                missing.remove(keys[key])
+
+        if not missing:
+            return specs
+
         trail_model_cls = Repo(Spec, TrailModel)
-        key = (Spec, pk)
+        trail_models = list(trail_model_cls.objects.filter(pk__in=missing))
+        _ = resolve_related_array_fields_bulk(trail_models)
 
-        if key in self.cache:
-            self.cache.move_to_end(key)
-            return cast(T, self.cache[key])
+        loaded = self._put_loaded(Spec, missing, trail_models)
 
-        trail_model = trail_model_cls.objects.get(pk=pk)
-        trail_model = resolve_related_array_fields(trail_model)
-        return Spec.model_validate(trail_model)
+        if (shared := self.shared) is not None:
+            shared.set_many(self._shared_items(Spec, loaded), timeout=None)
+
+        return specs | {pk: spec for pk, (spec, _) in loaded.items()}
+
+    async def get_many_async[T: TrailSpec](
+        self,
+        Spec: type[T],
+        pks: Iterable[int],
+    ) -> dict[int, T]:
+        specs, missing = self._get_many_local(Spec, pks)
+
+        if missing and (shared := self.shared) is not None:
+            keys = {self._shared_key(Spec, pk): pk for pk in missing}
+            for key, data in (await shared.aget_many(list(keys))).items():
+                specs[keys[key]] = self._put_shared_hit(Spec, keys[key], data)
+                missing.remove(keys[key])
+
+        if not missing:
+            return specs
+
+        trail_model_cls = Repo(Spec, TrailModel)
+        trail_models = [m async for m in trail_model_cls.objects.filter(pk__in=missing)]
+        _ = await resolve_related_array_fields_bulk_async(trail_models)
+
+        loaded = self._put_loaded(Spec, missing, trail_models)
+
+        if (shared := self.shared) is not None:
+            await shared.aset_many(self._shared_items(Spec, loaded), timeout=None)
+
+        return specs | {pk: spec for pk, (spec, _) in loaded.items()}
+
+    def get_by_fingerprint_sync[T: TrailSpec](
+        self, Spec: type[T], fingerprint: str
+    ) -> T:
+        return self.get_sync(Spec, self._resolve_pk_sync(Spec, fingerprint))
+
+    async def get_by_fingerprint_async[T: TrailSpec](
+        self,
+        Spec: type[T],
+        fingerprint: str,
+    ) -> T:
+        return await self.get_async(
+            Spec,
+            await self._resolve_pk_async(Spec, fingerprint),
+        )
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.fingerprints.clear()
+            self.stats = TrailCacheStats()
+
+    def _resolve_pk_sync(self, Spec: type[TrailSpec], fingerprint: str) -> int:
+        if (pk := self.fingerprints.get((Spec, fingerprint))) is not None:
+            return pk
+
+        if (shared := self.shared) is not None:
+            if (pk := shared.get(self._shared_fp_key(Spec, fingerprint))) is not None:
+                return pk
 
-    async def get_async[T: TrailSpec](self, Spec: type[T], pk: int) -> T:
         trail_model_cls = Repo(Spec, TrailModel)
-        key = (Spec, pk)
+        return trail_model_cls.objects.values_list("pk", flat=True).get(
+            fingerprint=fingerprint
+        )
 
-        if key in self.cache:
-            self.cache.move_to_end(key)
-            return cast(T, self.cache[key])
+    async def _resolve_pk_async(self, Spec: type[TrailSpec], fingerprint: str) -> int:
+        if (pk := self.fingerprints.get((Spec, fingerprint))) is not None:
+            return pk
+
+        if (shared := self.shared) is not None:
+            key = self._shared_fp_key(Spec, fingerprint)
+            if (pk := await shared.aget(key)) is not None:
+                return pk
+
+        trail_model_cls = Repo(Spec, TrailModel)
+        return await trail_model_cls.objects.values_list("pk", flat=True).aget(
+            fingerprint=fingerprint
+        )
 
-        trail_model = await trail_model_cls.objects.select_related().aget(pk=pk)
-        trail_model = await resolve_related_array_fields_async(trail_model)
-        spec = Spec.model_validate(trail_model)
+    def _get_many_local[T: TrailSpec](
+        self,
+        Spec: type[T],
+        pks: Iterable[int],
+    ) -> tuple[dict[int, T], list[int]]:
+        specs: dict[int, T] = {}
+        missing: list[int] = []
 
-        self.cache[key] = spec
+        with self._lock:
+            for pk in dict.fromkeys(pks):
+                key = (Spec, pk)
 
-        if len(self.cache) > self.max_size:
-            _ = self.cache.popitem(last=False)
+                if (entry := self.cache.get(key)) is None:
+                    self.stats.misses += 1
+                    missing.append(pk)
+                    continue
+
+                self.cache.move_to_end(key)
+                self.stats.hits += 1
+                specs[pk] = cast(T, entry.spec)
+
+        return specs, missing
+
+    def _put_shared_hit[T: TrailSpec](self, Spec: type[T], pk: int, data: str) -> T:
+        spec = Spec.model_validate_json(data)
+
+        with self._lock:
+            self.stats.shared_hits += 1
+            self._insert((Spec, pk), TrailCacheEntry(spec, len(data)))
 
         return spec
 
+    def _put_loaded[T: TrailSpec](
+        self,
+        Spec: type[T],
+        pks: list[int],
+        trail_models: list[TrailModel],
+    ) -> dict[int, tuple[T, str]]:
+        loaded: dict[int, tuple[T, str]] = {}
+
+        for trail_model in trail_models:
+            spec = Spec.model_validate(trail_model)
+            loaded[trail_model.pk] = (spec, spec.model_dump_json())
+
+        if missing := set(pks) - loaded.keys():
+            raise Repo(Spec, TrailModel).DoesNotExist(
+                f"{Spec.__name__} matching pks {sorted(missing)} does not exist."
+            )
 
-trail_cache = TrailCache(max_size=100)
+        with self._lock:
+            for pk, (spec, data) in loaded.items():
+                self._insert((Spec, pk), TrailCacheEntry(spec, len(data)))
+
+        return loaded
+
+    def _insert(self, key: CacheKey, entry: TrailCacheEntry):
+        if (previous := self.cache.pop(key, None)) is not None:
+            self.stats.bytes -= previous.nbytes
+
+        self.cache[key] = entry
+        self.fingerprints[(key[0], entry.spec.fingerprint)] = key[1]
+        self.stats.bytes += entry.nbytes
+
+        while len(self.cache) > 1 and (
+            len(self.cache) > self.max_size
+            or (self.max_bytes is not None and self.stats.bytes > self.max_bytes)
+        ):
+            (Spec, _), evicted = self.cache.popitem(last=False)
+            _ = self.fingerprints.pop((Spec, evicted.spec.fingerprint), None)
+            self.stats.bytes -= evicted.nbytes
+            self.stats.evictions += 1
+
+        self.stats.size = len(self.cache)
+
+    def _shared_key(self, Spec: type[TrailSpec], pk: int) -> str:
+        return f"trail:{Spec.__name__}:pk:{pk}"
+
+    def _shared_fp_key(self, Spec: type[TrailSpec], fingerprint: str) -> str:
+        return f"trail:{Spec.__name__}:fp:{fingerprint}"
+
+    def _shared_items(
+        self,
+        Spec: type[TrailSpec],
+        loaded: dict[int, tuple[TrailSpec, str]],
+    ) -> dict[str, Any]:
+        items: dict[str, Any] = {}
+
+        for pk, (spec, data) in loaded.items():
+            items[self._shared_key(Spec, pk)] = data
+            items[self._shared_fp_key(Spec, spec.fingerprint)] = pk
+
+        return items
+
+
+trail_cache = TrailCache(
+    max_size=getattr(settings, "TRAIL_CACHE_MAX_SIZE", 100),
+    max_bytes=getattr(settings, "TRAIL_CACHE_MAX_BYTES", None),
+    shared_alias=getattr(settings, "TRAIL_CACHE_ALIAS", None),
+)
@@ -1,7 +1,7 @@
 # src/chatddx/django/repo/schemas.py
 from __future__ import annotations
 
-from typing import Annotated, override
+from typing import Annotated
 
 from pydantic import (
     AfterValidator,
@@ -108,15 +108,6 @@ class ToolGroupBase(BaseModel):
 class ToolGroupSchema(ToolGroupBase, TrailSchema):
     tools: list[ToolSchema]
 
-    @override
-    def as_fingerprint(self):
-        from chatddx.utils import generate_fingerprint
-
-        serialized = self.model_dump(exclude={"fingerprint", "tools"})
-        fingerprints = {"tools": [ref.as_fingerprint() for ref in self.tools]}
-
-        return generate_fingerprint(serialized | fingerprints)
-
 
 class AgentBase(BaseModel):
     instructions: str
@@ -138,14 +129,3 @@ class AgentSchema(AgentBase, TrailSchema):
             tools=[],
         ),
     )
-
-    @override
-    def as_fingerprint(self):
-        from chatddx.utils import generate_fingerprint
-
-        relations = {"connection", "sampling_params", "output_type", "tool_group"}
-
-        serialized = self.model_dump(exclude={"fingerprint"} | relations)
-        fingerprints = {ref: getattr(self, ref).as_fingerprint() for ref in relations}
-
-        return generate_fingerprint(serialized | fingerprints)
@@ -0,0 +1,389 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from pydantic import BaseModel, ConfigDict
+from pydantic_ai import ModelMessage, ModelResponse, ModelSettings, RunContext
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+
+from chatddx.repo.trail_specs import ConnectionSpec
+
+SHARED_POLL_INTERVAL = 0.05
+# a worker that dies holding slots leaks them until the counter expires
+SHARED_COUNTER_TIMEOUT = 600
+
+
+class AdmissionSettings(BaseModel):
+    """
+    Read from the "admission" table of a connection profile, e.g.
+
+        [connection.qwen3-8b.profile.admission]
+        max_in_flight = 16
+        requests_per_second = 8
+        tokens_per_minute = 200000
+        shared = true
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    max_in_flight: int | None = None
+    requests_per_second: float | None = None
+    tokens_per_minute: int | None = None
+    queue_timeout: float = 60.0
+    # also cap max_in_flight across workers through ADMISSION_CACHE_ALIAS
+    shared: bool = False
+
+
+class AdmissionTimeout(Exception):
+    pass
+
+
+@dataclass
+class AdmissionStats:
+    connection: str
+    in_flight: int = 0
+    queued: int = 0
+    admitted: int = 0
+    timeouts: int = 0
+    tokens: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float, amount: float = 1.0) -> float:
+        """
+        Seconds until the bucket holds amount tokens, after refilling it.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= amount:
+            return 0.0
+
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        # may go negative, the debt is paid back before the next admission
+        self.tokens -= amount
+
+
+@dataclass(eq=False)
+class _Waiter:
+    future: asyncio.Future[None]
+    loop: asyncio.AbstractEventLoop
+    queued_at: float
+    admitted: bool = False
+
+
+class Ticket:
+    """
+    Set tokens to the usage of the admitted call before the slot is released,
+    it is charged to the tokens per minute budget.
+    """
+
+    tokens: int = 0
+
+
+class AdmissionController:
+    """
+    Admission for the calls to one connection: at most max_in_flight at a
+    time, no faster than requests_per_second, and no more than
+    tokens_per_minute. Callers are admitted in FIFO order and give up with
+    AdmissionTimeout after queue_timeout.
+
+    Token usage is only known after a call, so it is charged on release and
+    the next caller waits until the budget is positive again.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        settings: AdmissionSettings,
+        shared: BaseCache | None = None,
+    ):
+        self.key = key
+        self.settings = settings
+        self.shared = shared if settings.shared and settings.max_in_flight else None
+        self.stats = AdmissionStats(key)
+        self.queue: deque[_Waiter] = deque()
+        self.requests = (
+            TokenBucket(
+                settings.requests_per_second, max(1.0, settings.requests_per_second)
+            )
+            if settings.requests_per_second
+            else None
+        )
+        self.tokens = (
+            TokenBucket(settings.tokens_per_minute / 60, settings.tokens_per_minute)
+            if settings.tokens_per_minute
+            else None
+        )
+        self._timer_due: float | None = None
+        self._lock = Lock()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[Ticket]:
+        deadline = time.monotonic() + self.settings.queue_timeout
+        await self.acquire()
+
+        try:
+            await self._acquire_shared(deadline)
+        except BaseException:
+            self.release()
+            raise
+
+        ticket = Ticket()
+
+        try:
+            yield ticket
+        finally:
+            await self._release_shared()
+            self.release(ticket.tokens)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), loop, time.monotonic())
+
+        with self._lock:
+            self.queue.append(waiter)
+            self.stats.queued += 1
+            self._dispatch()
+
+        try:
+            # shielded so a timeout leaves the future to _dispatch
+            await asyncio.wait_for(
+                asyncio.shield(waiter.future), self.settings.queue_timeout
+            )
+        except TimeoutError:
+            with self._lock:
+                if not waiter.admitted:
+                    self._abandon(waiter)
+                    self.stats.timeouts += 1
+                    raise AdmissionTimeout(
+                        f"No capacity on {self.key} "
+                        f"after {self.settings.queue_timeout}s"
+                    ) from None
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.admitted:
+                    self._release(0)
+                else:
+                    self._abandon(waiter)
+            raise
+
+        waited = time.monotonic() - waiter.queued_at
+
+        with self._lock:
+            self.stats.wait_seconds += waited
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+
+    def release(self, tokens: int = 0):
+        with self._lock:
+            self._release(tokens)
+
+    def _release(self, tokens: int):
+        self.stats.in_flight -= 1
+        self.stats.tokens += tokens
+
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+        self._dispatch()
+
+    def _abandon(self, waiter: _Waiter):
+        self.queue.remove(waiter)
+        self.stats.queued -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        # called with the lock held whenever capacity may have freed up
+        limit = self.settings.max_in_flight
+
+        while self.queue and (limit is None or self.stats.in_flight < limit):
+            waiter = self.queue[0]
+            now = time.monotonic()
+            delay = max(
+                self.requests.delay(now) if self.requests else 0.0,
+                self.tokens.delay(now) if self.tokens else 0.0,
+            )
+
+            if delay > 0:
+                self._schedule(waiter.loop, now, delay)
+                return
+
+            if self.requests is not None:
+                self.requests.take(1)
+
+            _ = self.queue.popleft()
+            waiter.admitted = True
+            self.stats.queued -= 1
+            self.stats.in_flight += 1
+            self.stats.admitted += 1
+            waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop, now: float, delay: float):
+        due = now + delay
+
+        # a timer that is long overdue was lost with its event loop
+        if self._timer_due is not None and self._timer_due + 1.0 > now:
+            if self._timer_due <= due:
+                return
+
+        self._timer_due = due
+
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(loop.call_later, delay, self._on_timer)
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer_due = None
+            self._dispatch()
+
+    async def _acquire_shared(self, deadline: float):
+        if self.shared is None:
+            return
+
+        key = f"admission:{self.key}"
+
+        while True:
+            _ = await self.shared.aadd(key, 0, timeout=SHARED_COUNTER_TIMEOUT)
+
+            if await self.shared.aincr(key) <= (self.settings.max_in_flight or 0):
+                await self.shared.atouch(key, timeout=SHARED_COUNTER_TIMEOUT)
+                return
+
+            _ = await self.shared.adecr(key)
+
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    self.stats.timeouts += 1
+
+                raise AdmissionTimeout(
+                    f"No shared capacity on {self.key} "
+                    f"after {self.settings.queue_timeout}s"
+                )
+
+            await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+    async def _release_shared(self):
+        if self.shared is None:
+            return
+
+        try:
+            _ = await self.shared.adecr(f"admission:{self.key}")
+        except ValueError:
+            # the counter expired while the call was running
+            pass
+
+
+def _wake(future: asyncio.Future[None]):
+    if not future.done():
+        future.set_result(None)
+
+
+class Admission:
+    """
+    Process wide admission controllers keyed by connection fingerprint and
+    replica endpoint. With a shared_alias, connections whose settings say
+    shared = true also count in-flight calls in that Django cache, so the
+    cap holds across workers.
+    """
+
+    def __init__(self, shared_alias: str | None = None):
+        self.shared_alias = shared_alias
+        self.controllers: dict[str, AdmissionController] = {}
+        self._lock = Lock()
+
+    @property
+    def shared(self) -> BaseCache | None:
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
+
+    def get(
+        self,
+        connection: ConnectionSpec,
+        endpoint: str | None = None,
+    ) -> AdmissionController:
+        # replicas of a connection are admitted separately
+        key = connection.fingerprint
+
+        if endpoint is not None and endpoint != str(connection.endpoint):
+            key = f"{key}@{endpoint}"
+
+        with self._lock:
+            if (controller := self.controllers.get(key)) is None:
+                controller = self.controllers[key] = AdmissionController(
+                    key,
+                    AdmissionSettings.model_validate(
+                        connection.profile.get("admission", {})
+                    ),
+                    self.shared,
+                )
+
+        return controller
+
+    def stats(self) -> list[AdmissionStats]:
+        with self._lock:
+            controllers = list(self.controllers.values())
+
+        return [controller.stats for controller in controllers]
+
+
+class AdmittedModel(WrapperModel):
+    """
+    A model whose requests, streamed or not, are admitted by a controller
+    before they reach the provider, and charged their token usage after.
+    """
+
+    def __init__(self, wrapped: Model | str, controller: AdmissionController):
+        super().__init__(wrapped)
+        self.controller = controller
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        async with self.controller.admit() as ticket:
+            response = await super().request(
+                messages, model_settings, model_request_parameters
+            )
+            ticket.tokens = response.usage.total_tokens
+            return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context: RunContext[Any] | None = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        async with self.controller.admit() as ticket:
+            async with super().request_stream(
+                messages, model_settings, model_request_parameters, run_context
+            ) as stream:
+                try:
+                    yield stream
+                finally:
+                    ticket.tokens = stream.usage().total_tokens
+
+
+admission = Admission(shared_alias=getattr(settings, "ADMISSION_CACHE_ALIAS", None))
@@ -0,0 +1,94 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+
+from django.conf import settings
+from pydantic_ai import Agent as PydanticAgent
+
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.builder import build_agent, build_output_type
+from chatddx.runtime.context import AgentContext, OutputType
+
+AgentCacheKey = tuple[str, str]
+
+
+@dataclass
+class AgentCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
+@dataclass
+class AgentCacheEntry:
+    agent: PydanticAgent[AgentContext, OutputType]
+    output_type: type[OutputType]
+
+
+class AgentCache:
+    """
+    Built agents keyed by agent fingerprint and a hash of the api key.
+
+    An agent spec is immutable, so everything build_agent derives from it
+    (provider, profile, rendered instructions, tools and output type) can be
+    reused across runs. Run state lives in the deps passed to each run.
+    """
+
+    cache: OrderedDict[AgentCacheKey, AgentCacheEntry]
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.cache = OrderedDict()
+        self.stats = AgentCacheStats()
+        self._lock = Lock()
+
+    def get(
+        self,
+        agent_spec: AgentSpec,
+        api_key: str | None = None,
+    ) -> AgentCacheEntry:
+        key = (agent_spec.fingerprint, self._hash_api_key(api_key))
+
+        with self._lock:
+            if (entry := self.cache.get(key)) is not None:
+                self.cache.move_to_end(key)
+                self.stats.hits += 1
+                return entry
+
+            self.stats.misses += 1
+
+        output_type = build_output_type(agent_spec)
+        entry = AgentCacheEntry(
+            agent=build_agent(agent_spec, output_type, api_key),
+            output_type=output_type,
+        )
+
+        with self._lock:
+            # a concurrent miss may have built the same agent, keep the first
+            entry = self.cache.setdefault(key, entry)
+            self.cache.move_to_end(key)
+
+            while len(self.cache) > self.max_size:
+                _ = self.cache.popitem(last=False)
+                self.stats.evictions += 1
+
+            self.stats.size = len(self.cache)
+
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.stats = AgentCacheStats()
+
+    def _hash_api_key(self, api_key: str | None) -> str:
+        if api_key is None:
+            return ""
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+agent_cache = AgentCache(
+    max_size=getattr(settings, "AGENT_CACHE_MAX_SIZE", 32),
+)
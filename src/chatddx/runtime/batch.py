@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+from django.conf import settings
+
+from chatddx.history.schemas import SessionSpec
+from chatddx.history.session import start_session
+from chatddx.repo.base import BranchSpec
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.context import OutputType
+from chatddx.runtime.http_pool import HttpClientSettings
+from chatddx.runtime.runners import run_from_session
+
+
+@dataclass
+class BatchCase:
+    prompt: str
+    id: str | None = None
+
+
+@dataclass
+class BatchItem:
+    index: int
+    case: BatchCase
+    session: SessionSpec
+    output: OutputType | None = None
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+
+def load_batch_cases(path: Path) -> list[BatchCase]:
+    """
+    Read cases from a JSON list or a JSONL file. A case is either a prompt
+    string or an object with "symptoms" (or "prompt") and an optional "id".
+    """
+    text = path.read_text()
+
+    if text.lstrip().startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    cases: list[BatchCase] = []
+
+    for index, row in enumerate(rows):
+        match row:
+            case str():
+                cases.append(BatchCase(row))
+            case {"symptoms": str(prompt)} | {"prompt": str(prompt)}:
+                case_id = row.get("id")
+                cases.append(
+                    BatchCase(prompt, None if case_id is None else str(case_id))
+                )
+            case _:
+                raise ValueError(f"Case {index} in {path} has no symptoms")
+
+    return cases
+
+
+def batch_concurrency(agent_spec: AgentSpec, requested: int | None = None) -> int:
+    """
+    Workers of a batch, capped by BATCH_MAX_CONCURRENCY and by the
+    connection's own max_connections, beyond which requests only queue in
+    the http pool. The cap also bounds the cases in flight on a connection
+    across batches, see BatchSlots.
+    """
+    http_settings = HttpClientSettings.model_validate(
+        agent_spec.connection.profile.get("http", {})
+    )
+    cap = min(
+        getattr(settings, "BATCH_MAX_CONCURRENCY", 8),
+        http_settings.max_connections,
+    )
+
+    return max(1, min(requested or cap, cap))
+
+
+class BatchSlots:
+    """
+    Cases in flight per connection fingerprint, shared by every batch on an
+    event loop, so concurrent batches against one connection split the cap
+    of batch_concurrency instead of each getting all of it. The cap holds
+    per process, the admission settings of a connection bound calls across
+    workers.
+    """
+
+    def __init__(self):
+        self.semaphores: dict[
+            tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore
+        ] = {}
+        self._lock = Lock()
+
+    def get(self, agent_spec: AgentSpec) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        key = (loop, agent_spec.connection.fingerprint)
+
+        with self._lock:
+            if (semaphore := self.semaphores.get(key)) is None:
+                # slots of event loops that are gone went with them
+                for closed in [
+                    other for other in self.semaphores if other[0].is_closed()
+                ]:
+                    del self.semaphores[closed]
+
+                semaphore = self.semaphores[key] = asyncio.Semaphore(
+                    batch_concurrency(agent_spec)
+                )
+
+        return semaphore
+
+
+batch_slots = BatchSlots()
+
+
+async def run_batch(
+    owner_id: int,
+    agent_branch: BranchSpec[AgentSpec],
+    cases: Iterable[BatchCase],
+    api_key: str | None = None,
+    concurrency: int | None = None,
+    timeout: float | None = None,
+    cache: bool = False,
+) -> AsyncIterator[BatchItem]:
+    """
+    Run independent cases against one agent branch, each in its own session,
+    and yield them in completion order. A case that fails or times out is
+    yielded with its error and does not hold up the rest.
+
+    Cases are read by a fixed number of workers and a case's session is
+    started when the case begins, so a large or lazily read case list costs
+    no more rows and tasks than are in flight.
+    """
+    agent_spec = agent_branch.target
+    workers_count = batch_concurrency(agent_spec, concurrency)
+    pending = enumerate(cases)
+    results: asyncio.Queue[BatchItem | None] = asyncio.Queue(workers_count)
+    slots = batch_slots.get(agent_spec)
+
+    async def run(index: int, case: BatchCase) -> BatchItem:
+        session = await start_session(owner_id, agent_branch)
+        item = BatchItem(index, case, session)
+
+        async with slots:
+            started = time.perf_counter()
+
+            try:
+                result = await asyncio.wait_for(
+                    run_from_session(
+                        session=item.session,
+                        prompt=item.case.prompt,
+                        agent_spec=agent_spec,
+                        api_key=api_key,
+                        cache=cache,
+                    ),
+                    timeout,
+                )
+                item.output = result.output
+            except TimeoutError:
+                item.error = TimeoutError(f"Case timed out after {timeout}s")
+            except Exception as e:
+                item.error = e
+
+            item.elapsed = time.perf_counter() - started
+
+        return item
+
+    async def work():
+        # the workers share one iterator, each case is taken once
+        try:
+            for index, case in pending:
+                await results.put(await run(index, case))
+        except Exception:
+            await results.put(None)
+            raise
+
+        # not when cancelled, a consumer that went away drains nothing
+        await results.put(None)
+
+    workers = [asyncio.create_task(work()) for _ in range(workers_count)]
+    running = len(workers)
+
+    try:
+        while running:
+            if (item := await results.get()) is None:
+                running -= 1
+            else:
+                yield item
+
+        # a session that could not be started ends the batch
+        for worker in workers:
+            worker.result()
+    finally:
+        # the consumer went away, e.g. a client disconnected mid batch
+        for worker in workers:
+            _ = worker.cancel()
@@ -13,6 +13,7 @@ from pydantic_ai import (
     StructuredDict,
 )
 from pydantic_ai import Tool as PydanticTool
+from pydantic_ai.models import Model
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.output import StructuredOutputMode
 from pydantic_ai.providers.openai import OpenAIProvider
@@ -20,7 +21,16 @@ from pydantic_ai.providers.openai import OpenAIProvider
 from chatddx.core.choices import ToolChoices, ValidationChoices
 from chatddx.repo.trail_specs import AgentSpec, SamplingParamsSpec, ToolGroupSpec
 from chatddx.runtime import tools
+from chatddx.runtime.admission import AdmittedModel, admission
 from chatddx.runtime.context import AgentContext, OutputType
+from chatddx.runtime.http_pool import HttpClientSettings, http_pool
+from chatddx.runtime.output_validators import output_validators
+from chatddx.runtime.replicas import (
+    Replica,
+    ReplicaSettings,
+    ReplicatedModel,
+    replica_health,
+)
 
 
 def build_agent(
@@ -29,7 +39,7 @@ def build_agent(
     api_key: str | None = None,
 ) -> PydanticAgent[AgentContext, OutputType]:
 
-    model: OpenAIChatModel = build_model(agent_spec, api_key)
+    model = build_replicated_model(agent_spec, api_key)
     model_settings = build_config(agent_spec.sampling_params)
     tool_group_instructions, tools = build_tools(agent_spec.tool_group)
 
@@ -53,9 +63,33 @@ def build_agent(
     return pydantic_agent
 
 
+def build_replicated_model(
+    agent_spec: AgentSpec,
+    api_key: str | None = None,
+) -> Model:
+    connection = agent_spec.connection
+    settings = ReplicaSettings.model_validate(connection.profile.get("replicas", {}))
+    replicas = [
+        Replica(
+            AdmittedModel(
+                build_model(agent_spec, api_key, endpoint),
+                admission.get(connection, endpoint),
+            ),
+            replica_health.get(connection, endpoint),
+        )
+        for endpoint in [str(connection.endpoint), *map(str, settings.endpoints)]
+    ]
+
+    if len(replicas) == 1:
+        return replicas[0].model
+
+    return ReplicatedModel(replicas, settings, replica_health.latencies(connection))
+
+
 def build_model(
     agent_spec: AgentSpec,
     api_key: str | None = None,
+    endpoint: str | None = None,
 ):
     model_kwargs: dict[str, Any] = {}
     profile_kwargs: dict[str, Any] = agent_spec.connection.profile.copy()
@@ -65,14 +99,21 @@ def build_model(
             agent_spec.output_type.coercion_strategy
         )
 
-    model_kwargs["profile"] = ModelProfile(**profile_kwargs)
-    model_kwargs["model_name"] = agent_spec.connection.model
+    endpoint = endpoint or str(agent_spec.connection.endpoint)
+    http_settings = HttpClientSettings.model_validate(profile_kwargs.pop("http", {}))
+    # read by build_replicated_model and the admission controllers
+    _ = profile_kwargs.pop("admission", None)
+    _ = profile_kwargs.pop("replicas", None)
 
     model_kwargs["provider"] = OpenAIProvider(
-        base_url=str(agent_spec.connection.endpoint),
+        base_url=endpoint,
         api_key=api_key,
+        http_client=http_pool.get(endpoint, api_key, http_settings),
     )
 
+    model_kwargs["profile"] = ModelProfile(**profile_kwargs)
+    model_kwargs["model_name"] = agent_spec.connection.model
+
     return OpenAIChatModel(**model_kwargs)
 
 
@@ -134,9 +175,7 @@ async def validate_output(
         return output
 
     try:
-        jsonschema.validate(
-            instance=output, schema=ctx.deps.agent.output_type.definition
-        )
+        output_validators.validate(ctx.deps.agent.output_type, output)
         return output
     except jsonschema.ValidationError as e:
         match strategy:
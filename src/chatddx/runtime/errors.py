@@ -0,0 +1,24 @@
+from pydantic_ai.exceptions import ModelHTTPError
+
+from chatddx.runtime.admission import AdmissionTimeout
+
+
+def execution_error(e: Exception) -> tuple[int, dict[str, str]]:
+    """
+    The status and body a failed run is reported with. Upstream model errors
+    are the client's to fix (400), a connection out of capacity is
+    temporary (503), anything else is ours (500).
+    """
+    if isinstance(e, AdmissionTimeout):
+        return 503, {"error": str(e)}
+
+    if isinstance(e, ModelHTTPError):
+        error_message = "An upstream model error occurred."
+        if isinstance(e.body, dict) and "message" in e.body:
+            error_message = e.body["message"]
+        elif hasattr(e, "message"):
+            error_message = e.message
+
+        return 400, {"error": error_message}
+
+    return 500, {"error": f"Execution error: {str(e)}"}
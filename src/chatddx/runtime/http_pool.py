@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+import httpx
+from pydantic import BaseModel, ConfigDict
+from pydantic_ai.models import get_user_agent
+
+
+class HttpClientSettings(BaseModel):
+    """
+    Read from the "http" table of a connection profile, e.g.
+
+        [connection.qwen3-8b.profile.http]
+        max_connections = 200
+        http2 = true
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    timeout: float = 600.0
+    connect_timeout: float = 5.0
+
+
+HttpPoolKey = tuple[str, str, HttpClientSettings]
+
+
+@dataclass
+class HttpPoolStats:
+    endpoint: str
+    connections: int = 0
+    idle: int = 0
+    active: int = 0
+    queued: int = 0
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    Sends each request through the pool's connections for the event loop it
+    runs on. Clients holding it can outlive the loop they were built on.
+    """
+
+    def __init__(self, pool: "HttpPool", key: HttpPoolKey):
+        self.pool = pool
+        self.key = key
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self.pool.transport(self.key)
+        return await transport.handle_async_request(request)
+
+    async def aclose(self):
+        # the connections belong to the pool
+        pass
+
+
+class HttpPool:
+    """
+    Process wide keep-alive clients keyed by endpoint, api key hash and client
+    settings, so runs against the same endpoint reuse open connections instead
+    of paying TCP and TLS setup per provider.
+
+    Connections are bound to an event loop, so a client is looked up once and
+    kept by the agents built with it, while its connections are kept per
+    event loop and looked up per request. Those of closed loops, e.g. of
+    jobs run with async_to_sync, are dropped. Call aclose before a loop
+    ends, the ASGI application does this on lifespan shutdown.
+    """
+
+    def __init__(self):
+        self.clients: dict[HttpPoolKey, httpx.AsyncClient] = {}
+        self.transports: dict[
+            tuple[asyncio.AbstractEventLoop, HttpPoolKey],
+            httpx.AsyncHTTPTransport,
+        ] = {}
+        self._lock = Lock()
+
+    def get(
+        self,
+        endpoint: str,
+        api_key: str | None = None,
+        settings: HttpClientSettings | None = None,
+    ) -> httpx.AsyncClient:
+        settings = settings or HttpClientSettings()
+        key = (endpoint, self._hash_api_key(api_key), settings)
+
+        with self._lock:
+            if (client := self.clients.get(key)) is None:
+                client = self.clients[key] = self._create(key)
+
+        return client
+
+    def transport(self, key: HttpPoolKey) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            if (transport := self.transports.get((loop, key))) is None:
+                # connections of event loops that are gone went with them
+                for closed in [
+                    other for other in self.transports if other[0].is_closed()
+                ]:
+                    del self.transports[closed]
+
+                transport = self.transports[(loop, key)] = self._create_transport(
+                    key[2]
+                )
+
+        return transport
+
+    def stats(self) -> list[HttpPoolStats]:
+        with self._lock:
+            items = list(self.transports.items())
+
+        return [
+            self._client_stats(endpoint, transport)
+            for (_, (endpoint, _, _)), transport in items
+        ]
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            transports = [
+                self.transports.pop(key)
+                for key in list(self.transports)
+                if key[0] is loop or key[0].is_closed()
+            ]
+
+        for transport in transports:
+            await transport.aclose()
+
+    def _create(self, key: HttpPoolKey) -> httpx.AsyncClient:
+        settings = key[2]
+
+        return httpx.AsyncClient(
+            transport=PooledTransport(self, key),
+            timeout=httpx.Timeout(
+                timeout=settings.timeout,
+                connect=settings.connect_timeout,
+            ),
+            headers={"User-Agent": get_user_agent()},
+        )
+
+    def _create_transport(
+        self, settings: HttpClientSettings
+    ) -> httpx.AsyncHTTPTransport:
+        return httpx.AsyncHTTPTransport(
+            http2=settings.http2,
+            limits=httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            ),
+        )
+
+    def _client_stats(
+        self, endpoint: str, transport: httpx.AsyncHTTPTransport
+    ) -> HttpPoolStats:
+        stats = HttpPoolStats(endpoint)
+        # httpx exposes no public pool metrics, read them from httpcore
+        pool: Any = getattr(transport, "_pool", None)
+
+        if pool is None:
+            return stats
+
+        for connection in pool.connections:
+            stats.connections += 1
+            if connection.is_idle():
+                stats.idle += 1
+            else:
+                stats.active += 1
+
+        stats.queued = sum(request.is_queued() for request in pool._requests)
+
+        return stats
+
+    def _hash_api_key(self, api_key: str | None) -> str:
+        if api_key is None:
+            return ""
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+http_pool = HttpPool()
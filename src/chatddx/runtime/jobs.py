@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TextIO
+
+from pydantic_core import to_json
+
+from chatddx.core.models import IdentityModel
+from chatddx.repo.base import BranchSpec
+from chatddx.repo.shufflers.main import ensure_identity_async, load_branch_async
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.batch import BatchCase, BatchItem, run_batch
+from chatddx.runtime.utils import percentile
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class JobSample:
+    index: int
+    prompt: str
+    target: Any = None
+
+
+@dataclass
+class JobStats:
+    agent: str
+    skipped: int = 0
+    completed: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.seconds if self.seconds else 0.0
+
+    def percentiles(self) -> dict[int, float]:
+        return {q: percentile(self.latencies, q) for q in PERCENTILES}
+
+
+def sample_prompt(row: Any) -> str:
+    """
+    The prompt of a dataset row, whose "input" is a string or a list of
+    role/content messages. Multi turn inputs are flattened into one prompt
+    since a run takes a single one.
+    """
+    match row.get("input"):
+        case str(prompt):
+            return prompt
+        case [{"content": str(prompt)}]:
+            return prompt
+        case [*messages] if messages:
+            return "\n\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        case _:
+            raise ValueError("Sample has no input")
+
+
+def load_samples(path: Path) -> Iterator[JobSample]:
+    """
+    Read samples from a JSONL file, or a JSON list like dataset.json. The
+    sample index is the row number, which is what checkpoints refer to.
+    """
+    with path.open() as f:
+        if f.read(1024).lstrip().startswith("["):
+            f.seek(0)
+            rows = enumerate(json.load(f))
+        else:
+            f.seek(0)
+            rows = (
+                (index, json.loads(line))
+                for index, line in enumerate(f)
+                if line.strip()
+            )
+
+        for index, row in rows:
+            try:
+                prompt = sample_prompt(row)
+            except ValueError as e:
+                raise ValueError(f"Sample {index} in {path}: {e}") from e
+
+            yield JobSample(index, prompt, row.get("target"))
+
+
+def read_checkpoint(path: Path, retry_errors: bool = False) -> set[tuple[str, int]]:
+    """
+    The (agent, sample) pairs already written to an output file. A line cut
+    short by an interruption is dropped so appending starts on a clean line.
+    """
+    if not path.exists():
+        return set()
+
+    done: set[tuple[str, int]] = set()
+    content = path.read_bytes()
+
+    if content and not content.endswith(b"\n"):
+        content = content[: content.rfind(b"\n") + 1]
+        _ = path.write_bytes(content)
+
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+
+        row = json.loads(line)
+
+        if retry_errors and row.get("error") is not None:
+            done.discard((row["agent"], row["sample"]))
+        else:
+            done.add((row["agent"], row["sample"]))
+
+    return done
+
+
+async def run_job(
+    owner_name: str,
+    agent_names: list[str],
+    input_path: Path,
+    output_path: Path,
+    concurrency: int | None = None,
+    timeout: float | None = None,
+    retry_errors: bool = False,
+    cache: bool = False,
+) -> list[JobStats]:
+    """
+    Run every sample against every agent branch, appending one line per
+    result to the output file as it completes. Rerunning with the same
+    output file resumes where the last run stopped.
+    """
+    owner = await ensure_identity_async(owner_name)
+    branches: list[BranchSpec[AgentSpec]] = []
+
+    for name in agent_names:
+        branch = await load_branch_async("agent", owner.name, name)
+
+        if not branch:
+            raise ValueError(f"No agent branch named '{name}'")
+
+        branches.append(branch)  # pyright: ignore[reportArgumentType]
+
+    samples = {sample.index: sample for sample in load_samples(input_path)}
+    done = read_checkpoint(output_path, retry_errors)
+
+    with output_path.open("a") as output:
+        return list(
+            await asyncio.gather(
+                *(
+                    run_agent(
+                        owner,
+                        branch,
+                        samples,
+                        done,
+                        output,
+                        concurrency=concurrency,
+                        timeout=timeout,
+                        cache=cache,
+                    )
+                    for branch in branches
+                )
+            )
+        )
+
+
+async def run_agent(
+    owner: IdentityModel,
+    branch: BranchSpec[AgentSpec],
+    samples: dict[int, JobSample],
+    done: set[tuple[str, int]],
+    output: TextIO,
+    concurrency: int | None,
+    timeout: float | None,
+    cache: bool = False,
+) -> JobStats:
+    stats = JobStats(branch.name)
+    stats.skipped = sum((branch.name, index) in done for index in samples)
+
+    if stats.skipped == len(samples):
+        return stats
+
+    api_key = owner.secrets.get("api-keys", {}).get(branch.name)
+    started = time.perf_counter()
+
+    # read as the workers get to them, sessions are only started for samples
+    # that run, so an interrupted job leaves none behind for the rerun
+    pending = (
+        BatchCase(sample.prompt, str(sample.index))
+        for sample in samples.values()
+        if (branch.name, sample.index) not in done
+    )
+
+    items: AsyncIterator[BatchItem] = run_batch(
+        owner.pk,
+        branch,
+        pending,
+        api_key=api_key,
+        concurrency=concurrency,
+        timeout=timeout,
+        cache=cache,
+    )
+
+    async for item in items:
+        sample = samples[int(item.case.id)]  # pyright: ignore[reportArgumentType]
+        line: dict[str, Any] = {
+            "agent": branch.name,
+            "sample": sample.index,
+            "session": str(item.session.uuid),
+            "latency": round(item.elapsed, 3),
+            "target": sample.target,
+            "output": item.output,
+            "error": None,
+        }
+
+        if item.error is None:
+            stats.completed += 1
+            stats.latencies.append(item.elapsed)
+        else:
+            stats.failed += 1
+            line["error"] = f"{type(item.error).__name__}: {item.error}"
+
+        _ = output.write(to_json(line).decode() + "\n")
+        output.flush()
+
+    stats.seconds = time.perf_counter() - started
+
+    return stats
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
+from jsonschema.validators import validator_for
+
+from chatddx.repo.trail_specs import OutputTypeSpec
+
+
+@dataclass
+class OutputValidatorStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
+class OutputValidators:
+    """
+    Compiled json schema validators keyed by output type fingerprint.
+
+    jsonschema.validate checks the schema against its meta schema and builds
+    a new validator on every call. An output type is immutable, so both are
+    done once here. Errors are the same best_match that jsonschema.validate
+    raises.
+    """
+
+    cache: OrderedDict[str, Validator]
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.cache = OrderedDict()
+        self.stats = OutputValidatorStats()
+        self._lock = Lock()
+
+    def get(self, output_type: OutputTypeSpec) -> Validator:
+        key = output_type.fingerprint
+
+        with self._lock:
+            if (validator := self.cache.get(key)) is not None:
+                self.cache.move_to_end(key)
+                self.stats.hits += 1
+                return validator
+
+            self.stats.misses += 1
+
+        schema = output_type.definition
+        validator_cls = validator_for(schema)
+        validator_cls.check_schema(schema)
+        validator = validator_cls(schema)
+
+        with self._lock:
+            self.cache[key] = validator
+
+            while len(self.cache) > self.max_size:
+                _ = self.cache.popitem(last=False)
+                self.stats.evictions += 1
+
+            self.stats.size = len(self.cache)
+
+        return validator
+
+    def validate(self, output_type: OutputTypeSpec, instance: Any):
+        error = best_match(self.get(output_type).iter_errors(instance))
+
+        if error is not None:
+            raise error
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.stats = OutputValidatorStats()
+
+
+output_validators = OutputValidators(
+    max_size=getattr(settings, "OUTPUT_VALIDATOR_CACHE_MAX_SIZE", 256),
+)
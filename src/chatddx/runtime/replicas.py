@@ -0,0 +1,286 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+from pydantic_ai import ModelMessage, ModelResponse, ModelSettings, RunContext
+from pydantic_ai.exceptions import ModelAPIError, ModelHTTPError
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+
+from chatddx.repo.trail_specs import ConnectionSpec
+from chatddx.runtime.admission import AdmissionTimeout
+from chatddx.runtime.utils import percentile
+
+LATENCY_WINDOW = 200
+
+
+class ReplicaSettings(BaseModel):
+    """
+    Read from the "replicas" table of a connection profile, e.g.
+
+        [connection.qwen3-8b.profile.replicas]
+        endpoints = ["http://vllm-2:8000/v1", "http://vllm-3:8000/v1"]
+        attempt_timeout = 120
+        hedge = true
+
+    The endpoints serve the same model as the connection endpoint and are
+    used alongside it.
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    endpoints: list[HttpUrl] = Field(default_factory=list)
+    # fail over to the next replica when an attempt takes longer
+    attempt_timeout: float | None = None
+    # how long a failed replica is tried last
+    cooldown: float = 30.0
+    hedge: bool = False
+    # hedge after this many seconds, or after the observed hedge_quantile
+    hedge_after: float | None = None
+    hedge_quantile: float = 95
+    hedge_min_samples: int = 20
+
+
+@dataclass
+class ReplicaStats:
+    endpoint: str
+    requests: int = 0
+    failures: int = 0
+    hedges: int = 0
+    down_until: float = 0.0
+
+
+@dataclass
+class Replica:
+    model: Model
+    stats: ReplicaStats
+
+
+def is_failover(e: BaseException) -> bool:
+    """
+    Whether another replica might succeed where this one failed. Errors in
+    the request itself, like a 400, would fail the same way everywhere.
+    """
+    if isinstance(e, ModelHTTPError):
+        return e.status_code == 429 or e.status_code >= 500
+
+    return isinstance(e, (ModelAPIError, TimeoutError, AdmissionTimeout))
+
+
+class ReplicatedModel(WrapperModel):
+    """
+    A model served by equivalent replicas. Requests go round robin to the
+    replicas that have not failed lately, fail over to the next one on
+    connection errors, server errors and attempt timeouts, and with hedging
+    enabled, a request still running after the hedge delay is also sent to
+    the next replica and the first answer wins.
+
+    Streamed requests fail over until the stream has started, they are not
+    hedged.
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        settings: ReplicaSettings,
+        latencies: deque[float] | None = None,
+    ):
+        super().__init__(replicas[0].model)
+        self.replicas = replicas
+        self.replica_settings = settings
+        self.latencies = (
+            deque(maxlen=LATENCY_WINDOW) if latencies is None else latencies
+        )
+        self._next = 0
+
+    def stats(self) -> list[ReplicaStats]:
+        return [replica.stats for replica in self.replicas]
+
+    def ordered(self) -> list[Replica]:
+        start = self._next % len(self.replicas)
+        self._next += 1
+        rotated = self.replicas[start:] + self.replicas[:start]
+        now = time.monotonic()
+
+        # sorting is stable, so healthy replicas keep their round robin order
+        return sorted(rotated, key=lambda replica: replica.stats.down_until > now)
+
+    def hedge_delay(self) -> float | None:
+        if not self.replica_settings.hedge:
+            return None
+
+        if self.replica_settings.hedge_after is not None:
+            return self.replica_settings.hedge_after
+
+        if len(self.latencies) < self.replica_settings.hedge_min_samples:
+            return None
+
+        return percentile(list(self.latencies), self.replica_settings.hedge_quantile)
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        replicas = iter(self.ordered())
+        attempts: dict[asyncio.Task[ModelResponse], Replica] = {}
+        errors: list[BaseException] = []
+
+        def attempt() -> Replica | None:
+            if (replica := next(replicas, None)) is not None:
+                task = asyncio.ensure_future(
+                    self._attempt(
+                        replica, messages, model_settings, model_request_parameters
+                    )
+                )
+                attempts[task] = replica
+            return replica
+
+        _ = attempt()
+        hedge_delay = self.hedge_delay()
+
+        try:
+            while attempts:
+                done, _ = await asyncio.wait(
+                    attempts,
+                    timeout=hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                hedge_delay = None
+
+                if not done:
+                    if (hedge := attempt()) is not None:
+                        hedge.stats.hedges += 1
+                    continue
+
+                finished = [(task, attempts.pop(task)) for task in done]
+
+                for task, _replica in finished:
+                    if task.exception() is None:
+                        return task.result()
+
+                for task, _replica in finished:
+                    error = task.exception()
+                    assert error is not None
+
+                    if not is_failover(error):
+                        raise error
+
+                    errors.append(error)
+
+                if not attempts:
+                    _ = attempt()
+
+        finally:
+            for task in attempts:
+                _ = task.cancel()
+
+        raise errors[-1]
+
+    async def _attempt(
+        self,
+        replica: Replica,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        started = time.monotonic()
+        replica.stats.requests += 1
+
+        try:
+            async with asyncio.timeout(self.replica_settings.attempt_timeout):
+                response = await replica.model.request(
+                    messages, model_settings, model_request_parameters
+                )
+        except Exception as e:
+            self._failed(replica, e)
+            raise
+
+        self.latencies.append(time.monotonic() - started)
+
+        return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+        run_context: RunContext[Any] | None = None,
+    ) -> AsyncIterator[StreamedResponse]:
+        error: BaseException | None = None
+
+        for replica in self.ordered():
+            replica.stats.requests += 1
+
+            async with AsyncExitStack() as stack:
+                try:
+                    async with asyncio.timeout(self.replica_settings.attempt_timeout):
+                        stream = await stack.enter_async_context(
+                            replica.model.request_stream(
+                                messages,
+                                model_settings,
+                                model_request_parameters,
+                                run_context,
+                            )
+                        )
+                except Exception as e:
+                    self._failed(replica, e)
+                    if not is_failover(e):
+                        raise
+                    error = e
+                    continue
+
+                yield stream
+                return
+
+        assert error is not None
+        raise error
+
+    def _failed(self, replica: Replica, e: BaseException):
+        if is_failover(e):
+            replica.stats.failures += 1
+            replica.stats.down_until = time.monotonic() + self.replica_settings.cooldown
+
+
+class ReplicaHealth:
+    """
+    Process wide replica stats keyed by connection fingerprint and endpoint,
+    and observed latencies by connection fingerprint. Agents are built per
+    api key, so models of the same connection share what they learn about
+    its replicas, a replica one of them saw fail is tried last by all.
+    """
+
+    def __init__(self):
+        self.replica_stats: dict[tuple[str, str], ReplicaStats] = {}
+        self.latency_windows: dict[str, deque[float]] = {}
+        self._lock = Lock()
+
+    def get(self, connection: ConnectionSpec, endpoint: str) -> ReplicaStats:
+        key = (connection.fingerprint, endpoint)
+
+        with self._lock:
+            if (stats := self.replica_stats.get(key)) is None:
+                stats = self.replica_stats[key] = ReplicaStats(endpoint)
+
+        return stats
+
+    def latencies(self, connection: ConnectionSpec) -> deque[float]:
+        with self._lock:
+            return self.latency_windows.setdefault(
+                connection.fingerprint, deque(maxlen=LATENCY_WINDOW)
+            )
+
+    def stats(self) -> list[ReplicaStats]:
+        with self._lock:
+            return list(self.replica_stats.values())
+
+
+replica_health = ReplicaHealth()
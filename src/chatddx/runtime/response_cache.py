@@ -0,0 +1,205 @@
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass, replace
+from threading import Lock
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.utils import timezone
+from pydantic_ai import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelResponse,
+    ModelSettings,
+    RequestUsage,
+)
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_core import to_json, to_jsonable_python
+
+from chatddx.repo.trail_specs import AgentSpec, SamplingParamsSpec
+
+# differ between runs that are otherwise the same
+VOLATILE_KEYS = frozenset(
+    {
+        "timestamp",
+        "run_id",
+        "conversation_id",
+        "provider_response_id",
+        "provider_details",
+        "usage",
+    }
+)
+
+
+def is_deterministic(sampling_params: SamplingParamsSpec) -> bool:
+    return sampling_params.temperature == 0 or sampling_params.seed is not None
+
+
+def is_cached(message: ModelMessage) -> bool:
+    return isinstance(message, ModelResponse) and bool(
+        (message.provider_details or {}).get("cached")
+    )
+
+
+def stable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: stable(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [stable(v) for v in value]
+    return value
+
+
+class ReplayExhausted(Exception):
+    pass
+
+
+class ReplayModel(Model):
+    """
+    Answers a run with the responses of an earlier one, in order, flagged as
+    cached and without usage since they cost nothing. Takes the profile of
+    the model it stands in for so output tools are the same.
+    """
+
+    def __init__(self, responses: Sequence[ModelResponse], model: Model):
+        super().__init__(profile=model.profile)
+        self.responses = iter(responses)
+        self._model_name = model.model_name
+        self._system = model.system
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    @property
+    def system(self) -> str:
+        return self._system
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> ModelResponse:
+        if (response := next(self.responses, None)) is None:
+            raise ReplayExhausted("The cached run took fewer steps")
+
+        return replace(
+            response,
+            usage=RequestUsage(),
+            timestamp=timezone.now(),
+            provider_details=(response.provider_details or {}) | {"cached": True},
+        )
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
+class ResponseCache:
+    """
+    Model responses of earlier runs keyed by agent fingerprint, message
+    history and prompt, so a deterministic run that was already made can be
+    replayed instead of paying for it again.
+
+    The local tier is a bounded LRU per process whose entries expire after
+    ttl seconds. The optional shared tier is a Django cache alias holding
+    the serialized responses with the same ttl.
+    """
+
+    cache: OrderedDict[str, tuple[float, list[ModelResponse]]]
+
+    def __init__(self, max_size: int, ttl: float, shared_alias: str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self.cache = OrderedDict()
+        self.stats = ResponseCacheStats()
+        self._lock = Lock()
+
+    @property
+    def shared(self) -> BaseCache | None:
+        if self.shared_alias is None:
+            return None
+        return caches[self.shared_alias]
+
+    def key(
+        self,
+        agent_spec: AgentSpec,
+        history: list[ModelMessage],
+        prompt: str,
+    ) -> str:
+        digest = hashlib.sha256(agent_spec.fingerprint.encode())
+        digest.update(to_json(stable(to_jsonable_python(history))))
+        digest.update(prompt.encode())
+        return f"response:{digest.hexdigest()}"
+
+    async def aget(self, key: str) -> list[ModelResponse] | None:
+        with self._lock:
+            if (entry := self.cache.get(key)) is not None:
+                expires, responses = entry
+
+                if expires > time.monotonic():
+                    self.cache.move_to_end(key)
+                    self.stats.hits += 1
+                    return responses
+
+                del self.cache[key]
+                self.stats.size = len(self.cache)
+
+        if (shared := self.shared) is not None and (
+            data := await shared.aget(key)
+        ) is not None:
+            responses = [
+                m
+                for m in ModelMessagesTypeAdapter.validate_json(data)
+                if isinstance(m, ModelResponse)
+            ]
+            self._store(key, responses)
+
+            with self._lock:
+                self.stats.hits += 1
+
+            return responses
+
+        with self._lock:
+            self.stats.misses += 1
+
+        return None
+
+    async def aset(self, key: str, responses: list[ModelResponse]):
+        self._store(key, responses)
+
+        if (shared := self.shared) is not None:
+            await shared.aset(
+                key, ModelMessagesTypeAdapter.dump_json(responses), timeout=self.ttl
+            )
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.stats = ResponseCacheStats()
+
+    def _store(self, key: str, responses: list[ModelResponse]):
+        with self._lock:
+            self.cache[key] = (time.monotonic() + self.ttl, responses)
+            self.cache.move_to_end(key)
+
+            while len(self.cache) > self.max_size:
+                _ = self.cache.popitem(last=False)
+                self.stats.evictions += 1
+
+            self.stats.size = len(self.cache)
+
+
+response_cache = ResponseCache(
+    max_size=getattr(settings, "RESPONSE_CACHE_MAX_SIZE", 1024),
+    ttl=getattr(settings, "RESPONSE_CACHE_TTL", 24 * 60 * 60),
+    shared_alias=getattr(settings, "RESPONSE_CACHE_ALIAS", None),
+)
@@ -1,93 +1,142 @@
 # src/chatddx/django/runtime/runners.py
 import uuid
 from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+from typing import cast
 
+from django.conf import settings
 from django.utils import timezone
 from pydantic_ai import (
     AgentRunResult,
+    ModelMessage,
     ModelRequest,
     ModelResponse,
+    ModelRetry,
     UnexpectedModelBehavior,
 )
+from pydantic_ai.models import Model
 from pydantic_ai.result import StreamedRunResult
-from pydantic_core import to_jsonable_python
+from pydantic_core import ValidationError, to_jsonable_python
 
 from chatddx.core.choices import RoleChoices
+from chatddx.history.aggregates import record_messages_async
 from chatddx.history.models import MessageModel
 from chatddx.history.schemas import SessionSpec
+from chatddx.history.sink import message_sink
 from chatddx.repo.trail_specs import AgentSpec
 from chatddx.runtime.context import AgentContext, OutputType
-from chatddx.utils import Dispatcher
-
-from .builder import (
-    build_agent,
-    build_output_type,
+from chatddx.runtime.response_cache import (
+    ReplayExhausted,
+    ReplayModel,
+    is_cached,
+    is_deterministic,
+    response_cache,
 )
+from chatddx.utils import Dispatcher, WriteBehind
+
+from .agent_cache import AgentCacheEntry, agent_cache
+
+# session messages are recorded on this queue when WRITE_BEHIND is set, so a
+# run returns without waiting for the database
+write_behind = WriteBehind(max_size=getattr(settings, "WRITE_BEHIND_MAX_SIZE", 1000))
 
 
 async def run_from_spec(
     agent_spec: AgentSpec,
     prompt: str,
     dispatcher: Dispatcher | None = None,
+    cache: bool = False,
 ) -> AgentRunResult[OutputType]:
 
     if not dispatcher:
-        dispatcher = Dispatcher()
+        dispatcher = new_dispatcher()
 
-    output_type = build_output_type(agent_spec)
-    agent = build_agent(agent_spec, output_type)
-    agent_context = AgentContext(agent=agent_spec, output_type=output_type)
+    built = agent_cache.get(agent_spec)
+    agent_context = AgentContext(agent=agent_spec, output_type=built.output_type)
 
-    result = await agent.run(prompt, deps=agent_context)
+    result = await run_or_replay(built, agent_spec, prompt, agent_context, [], cache)
 
     await dispatcher.publish(result)
 
     return result
 
 
+@dataclass(frozen=True)
+class StreamChunk:
+    response: ModelResponse
+    output: OutputType | None
+    is_last: bool
+
+
 async def stream_from_session(
     session: SessionSpec,
     prompt: str,
     dispatcher: Dispatcher | None = None,
     agent_spec: AgentSpec | None = None,
-) -> AsyncGenerator[tuple[ModelResponse, bool], None]:
+    api_key: str | None = None,
+) -> AsyncGenerator[StreamChunk, None]:
+    """
+    Streamed run_from_session. Every chunk carries the response so far and
+    the output validated from it, partially until the last chunk.
+    """
 
     if not dispatcher:
-        dispatcher = Dispatcher()
+        dispatcher = new_dispatcher()
 
     if not agent_spec:
         agent_spec = session.default_agent.target
 
-    _ = dispatcher.subscribe(
-        on_result(
-            session.id,
-            agent_spec.id,
-        )
-    )
+    subscribe_session(dispatcher, session.id, agent_spec.id)
 
-    output_type = build_output_type(agent_spec)
+    await dispatcher.publish(prompt)
+
+    built = agent_cache.get(agent_spec, api_key)
 
     agent_context = AgentContext(
         agent=agent_spec,
-        output_type=output_type,
+        output_type=built.output_type,
         session=session,
     )
 
-    agent = build_agent(
-        agent_spec,
-        output_type,
-    )
+    try:
+        async with built.agent.run_stream(
+            prompt,
+            deps=agent_context,
+            message_history=get_message_history(session),
+        ) as result:
+            output = None
+            done = False
 
-    async with agent.run_stream(
-        prompt,
-        deps=agent_context,
-        message_history=get_message_history(session),
-    ) as result:
-        async for msg in result.stream_response(debounce_by=0.1):
-            is_last = msg.state != "incomplete"
-            yield msg, is_last
+            async for msg in result.stream_response(debounce_by=0.1):
+                is_last = msg.state != "incomplete"
 
-        await dispatcher.publish(result)
+                # the completed response can be yielded more than once
+                if done:
+                    continue
+                done = is_last
+
+                try:
+                    output = await result.validate_response_output(
+                        msg,
+                        allow_partial=not is_last,
+                    )
+                except (ValidationError, ModelRetry, UnexpectedModelBehavior):
+                    # a partial output that does not parse yet, keep the last one
+                    if is_last:
+                        raise
+
+                yield StreamChunk(msg, output, is_last)
+
+            await dispatcher.publish(result)
+
+    except UnexpectedModelBehavior as e:
+        e = explain_unexpected(e)
+        await dispatcher.publish(e)
+        raise e
+
+    except Exception as e:
+        await dispatcher.publish(e)
+        raise e
 
 
 def get_message_history(session: SessionSpec):
@@ -104,75 +153,42 @@ async def run_from_session(
     dispatcher: Dispatcher | None = None,
     agent_spec: AgentSpec | None = None,
     api_key: str | None = None,
+    cache: bool = False,
 ) -> AgentRunResult[OutputType]:
 
     if not dispatcher:
-        dispatcher = Dispatcher()
+        dispatcher = new_dispatcher()
 
     if not agent_spec:
         agent_spec = session.default_agent.target
 
-    _ = dispatcher.subscribe(
-        on_result(
-            session.id,
-            agent_spec.id,
-        )
-    )
-    _ = dispatcher.subscribe(
-        on_prompt(
-            session.id,
-            agent_spec.id,
-        )
-    )
-    _ = dispatcher.subscribe(
-        on_error(
-            session.id,
-            agent_spec.id,
-        )
-    )
+    subscribe_session(dispatcher, session.id, agent_spec.id)
 
     await dispatcher.publish(prompt)
 
-    output_type = build_output_type(agent_spec)
-
-    agent = build_agent(
-        agent_spec=agent_spec,
-        output_type=output_type,
-        api_key=api_key,
-    )
+    built = agent_cache.get(agent_spec, api_key)
 
     agent_context = AgentContext(
         agent=agent_spec,
-        output_type=output_type,
+        output_type=built.output_type,
         session=session,
     )
 
     try:
-        result = await agent.run(
+        result = await run_or_replay(
+            built,
+            agent_spec,
             prompt,
-            deps=agent_context,
-            message_history=get_message_history(session),
+            agent_context,
+            get_message_history(session),
+            cache,
         )
 
         await dispatcher.publish(result)
         return result
 
     except UnexpectedModelBehavior as e:
-        if e.__cause__:
-            enhanced_message = (
-                f"{e}\n\n"
-                f"--- Original Root Cause ({type(e.__cause__).__name__}) ---\n"
-                f"{e.__cause__}"
-            )
-
-            e.enhanced_message = enhanced_message
-
-            new_exception = UnexpectedModelBehavior(enhanced_message)
-            new_exception.__cause__ = e.__cause__
-
-            await dispatcher.publish(new_exception)
-            raise new_exception
-
+        e = explain_unexpected(e)
         await dispatcher.publish(e)
         raise e
 
@@ -181,9 +197,82 @@ async def run_from_session(
         raise e
 
 
+async def run_or_replay(
+    built: AgentCacheEntry,
+    agent_spec: AgentSpec,
+    prompt: str,
+    deps: AgentContext,
+    history: list[ModelMessage],
+    cache: bool = False,
+) -> AgentRunResult[OutputType]:
+    """
+    Run the agent, or with cache set and deterministic sampling, replay the
+    responses of the same run made before. A replay that does not take the
+    same steps falls back to a real run.
+    """
+    if not cache or not is_deterministic(agent_spec.sampling_params):
+        return await built.agent.run(prompt, deps=deps, message_history=history)
+
+    key = response_cache.key(agent_spec, history, prompt)
+
+    if (responses := await response_cache.aget(key)) is not None:
+        replay = ReplayModel(responses, cast(Model, built.agent.model))
+
+        try:
+            with built.agent.override(model=replay):
+                return await built.agent.run(prompt, deps=deps, message_history=history)
+        except ReplayExhausted:
+            pass
+
+    result = await built.agent.run(prompt, deps=deps, message_history=history)
+    await response_cache.aset(
+        key, [m for m in result.new_messages() if isinstance(m, ModelResponse)]
+    )
+
+    return result
+
+
+def new_dispatcher() -> Dispatcher:
+    if getattr(settings, "WRITE_BEHIND", False):
+        return Dispatcher(write_behind)
+    return Dispatcher()
+
+
+def subscribe_session(dispatcher: Dispatcher, session_id: int, agent_id: int):
+    _ = dispatcher.subscribe(on_result(session_id, agent_id), behind=True)
+    _ = dispatcher.subscribe(on_prompt(session_id, agent_id), behind=True)
+    _ = dispatcher.subscribe(on_error(session_id, agent_id), behind=True)
+
+
+def explain_unexpected(e: UnexpectedModelBehavior) -> UnexpectedModelBehavior:
+    if not e.__cause__:
+        return e
+
+    enhanced_message = (
+        f"{e}\n\n"
+        f"--- Original Root Cause ({type(e.__cause__).__name__}) ---\n"
+        f"{e.__cause__}"
+    )
+
+    e.enhanced_message = enhanced_message
+
+    new_exception = UnexpectedModelBehavior(enhanced_message)
+    new_exception.__cause__ = e.__cause__
+
+    return new_exception
+
+
+async def write_messages(messages: list[MessageModel]):
+    # with MESSAGE_SINK, concurrent runs share their inserts
+    if getattr(settings, "MESSAGE_SINK", False):
+        await message_sink.write(messages)
+    else:
+        _ = await record_messages_async(messages)
+
+
 def on_prompt(session_id: int, agent_id: int):
     async def _on_prompt(prompt: str):
-        _ = await MessageModel.objects.acreate(
+        message = MessageModel(
             agent_id=agent_id,
             session_id=session_id,
             kind="prompt",
@@ -192,6 +281,7 @@ def on_prompt(session_id: int, agent_id: int):
             payload={"content": prompt},
             timestamp=timezone.now(),
         )
+        await write_messages([message])
 
     return _on_prompt
 
@@ -200,7 +290,7 @@ def on_error(session_id: int, agent_id: int):
     async def _on_error(error: Exception):
         error_message = f"Agent execution failed: {type(error).__name__} - {str(error)}"
 
-        _ = await MessageModel.objects.acreate(
+        message = MessageModel(
             agent_id=agent_id,
             session_id=session_id,
             kind="error",
@@ -209,6 +299,7 @@ def on_error(session_id: int, agent_id: int):
             payload={"error_type": type(error).__name__, "content": error_message},
             timestamp=timezone.now(),
         )
+        await write_messages([message])
 
     return _on_error
 
@@ -230,11 +321,12 @@ def on_result(session_id: int, agent_id: int):
                     role=role,
                     payload=to_jsonable_python(msg),
                     timestamp=msg.timestamp,
+                    cached=is_cached(msg),
                 )
             )
 
         if messages_to_create:
-            _ = await MessageModel.objects.abulk_create(messages_to_create)
+            await write_messages(messages_to_create)
 
     return _on_result
 
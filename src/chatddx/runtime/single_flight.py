@@ -0,0 +1,47 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class SingleFlightStats:
+    leaders: int = 0
+    coalesced: int = 0
+    in_flight: int = 0
+
+
+class SingleFlight:
+    """
+    Calls made with the key of a call still in flight wait for that call and
+    share its result, or its exception, instead of making their own.
+
+    The call runs in its own task, so a caller that goes away, like a client
+    that disconnected, does not cancel it for the others. Calls are per event
+    loop since their tasks cannot be awaited from another one.
+    """
+
+    def __init__(self):
+        self.calls: dict[tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self.stats = SingleFlightStats()
+
+    async def do[T](self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        flight = (asyncio.get_running_loop(), key)
+
+        if (task := self.calls.get(flight)) is None:
+            task = self.calls[flight] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda _: self._land(flight, task))
+            self.stats.leaders += 1
+            self.stats.in_flight += 1
+        else:
+            self.stats.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _land(self, flight: tuple[asyncio.AbstractEventLoop, Hashable], task: Any):
+        if self.calls.get(flight) is task:
+            del self.calls[flight]
+            self.stats.in_flight -= 1
+
+
+single_flight = SingleFlight()
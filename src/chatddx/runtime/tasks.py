@@ -0,0 +1,73 @@
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from django.conf import settings
+from pydantic_core import to_jsonable_python
+
+from chatddx.core.choices import JobStatusChoices
+from chatddx.core.models import IdentityModel
+from chatddx.history.models import SessionModel
+from chatddx.history.session import resume_session
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.errors import execution_error
+from chatddx.runtime.http_pool import http_pool
+from chatddx.runtime.runners import run_from_session, write_behind
+
+
+def diagnose_queue(agent_spec: AgentSpec) -> str:
+    """
+    The queue a diagnose job for this agent goes to, looked up by connection
+    model name, then endpoint, in DIAGNOSE_QUEUES. Give slow models their
+    own queue and workers so they do not starve fast ones.
+    """
+    queues: dict[str, str] = getattr(settings, "DIAGNOSE_QUEUES", {})
+    connection = agent_spec.connection
+
+    return (
+        queues.get(connection.model)
+        or queues.get(str(connection.endpoint))
+        or getattr(settings, "CELERY_TASK_DEFAULT_QUEUE", "diagnose")
+    )
+
+
+@shared_task(ignore_result=True)
+def diagnose_task(session_id: int, prompt: str, cache: bool = False):
+    # api keys are read from the owner here, never sent through the broker
+    async def run():
+        try:
+            await run_diagnose_job(session_id, prompt, cache)
+        finally:
+            # the event loop of this task may not outlive it
+            await write_behind.aclose()
+            await http_pool.aclose()
+
+    async_to_sync(run)()
+
+
+async def run_diagnose_job(session_id: int, prompt: str, cache: bool = False):
+    """
+    Run a prompt on a session started by the submit endpoint and store the
+    output, or the error as the API would have answered it, on the session.
+    """
+    jobs = SessionModel.objects.filter(pk=session_id)
+    _ = await jobs.aupdate(job_status=JobStatusChoices.RUNNING)
+
+    try:
+        session_model = await jobs.select_related("owner").aget()
+        owner: IdentityModel = session_model.owner
+        session = await resume_session(owner.pk, session_model.uuid)
+
+        api_key = owner.secrets.get("api-keys", {}).get(session.default_agent.name)
+        result = await run_from_session(session, prompt, api_key=api_key, cache=cache)
+
+    except Exception as e:
+        status, body = execution_error(e)
+        _ = await jobs.aupdate(
+            job_status=JobStatusChoices.FAILED,
+            job_error=body | {"status": status},
+        )
+        return
+
+    _ = await jobs.aupdate(
+        job_status=JobStatusChoices.SUCCEEDED,
+        job_output=to_jsonable_python(result.output),
+    )
@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import pytest
+from django.core.cache import caches
+from pydantic_ai import Agent, ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.runtime.admission import (
+    AdmissionController,
+    AdmissionSettings,
+    AdmissionTimeout,
+    AdmittedModel,
+)
+from chatddx.runtime.errors import execution_error
+
+
+def controller(**settings) -> AdmissionController:
+    return AdmissionController("test", AdmissionSettings(**settings))
+
+
+@pytest.mark.asyncio
+async def test_max_in_flight_is_fifo():
+    admission = controller(max_in_flight=2)
+    running = 0
+    peak = 0
+    order: list[int] = []
+
+    async def call(i: int):
+        nonlocal running, peak
+        async with admission.admit():
+            order.append(i)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    _ = await asyncio.gather(*(call(i) for i in range(6)))
+
+    assert peak == 2
+    assert order == list(range(6))
+    assert admission.stats.admitted == 6
+    assert admission.stats.in_flight == 0
+    assert admission.stats.queued == 0
+    assert admission.stats.max_wait_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_requests_per_second():
+    admission = controller(requests_per_second=20)
+
+    async def call():
+        async with admission.admit():
+            pass
+
+    started = time.monotonic()
+    _ = await asyncio.gather(*(call() for _ in range(24)))
+
+    # a second's worth is let through at once, the other four wait
+    assert time.monotonic() - started >= 4 / 20 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_tokens_per_minute_waits_for_budget():
+    admission = controller(tokens_per_minute=600)
+
+    async with admission.admit() as ticket:
+        ticket.tokens = 605
+
+    # 5 tokens of debt at 10 tokens a second
+    started = time.monotonic()
+    async with admission.admit():
+        pass
+
+    assert time.monotonic() - started >= 0.05
+    assert admission.stats.tokens == 605
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout():
+    admission = controller(max_in_flight=1, queue_timeout=0.05)
+
+    async with admission.admit():
+        with pytest.raises(AdmissionTimeout):
+            async with admission.admit():
+                pass
+
+    assert admission.stats.timeouts == 1
+    assert admission.stats.queued == 0
+
+    # the abandoned waiter does not hold the slot
+    async with admission.admit():
+        pass
+
+    status, _body = execution_error(AdmissionTimeout("full"))
+    assert status == 503
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    admission = controller(max_in_flight=1)
+
+    async with admission.admit():
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.stats.queued == 1
+
+        _ = waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    assert admission.stats.queued == 0
+    assert admission.stats.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_in_flight():
+    settings = AdmissionSettings(max_in_flight=1, queue_timeout=0.1, shared=True)
+    shared = caches["default"]
+    # two workers admitting calls to the same connection
+    first = AdmissionController("shared-test", settings, shared)
+    second = AdmissionController("shared-test", settings, shared)
+
+    async with first.admit():
+        with pytest.raises(AdmissionTimeout):
+            async with second.admit():
+                pass
+
+    assert second.stats.in_flight == 0
+
+    async with second.admit():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_model_charges_usage():
+    admission = controller(max_in_flight=1, tokens_per_minute=100_000)
+
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        assert admission.stats.in_flight == 1
+        return ModelResponse(parts=[TextPart("ok")])
+
+    async def stream(messages: list[ModelMessage], info: AgentInfo):
+        assert admission.stats.in_flight == 1
+        yield "ok"
+
+    model = FunctionModel(respond, stream_function=stream)
+    agent = Agent(AdmittedModel(model, admission))
+    result = await agent.run("hello")
+
+    assert result.output == "ok"
+    assert admission.stats.admitted == 1
+    assert admission.stats.in_flight == 0
+    assert admission.stats.tokens == result.usage.total_tokens > 0
+
+    async with agent.run_stream("hello") as streamed:
+        _ = await streamed.get_output()
+
+    assert admission.stats.admitted == 2
+    assert admission.stats.in_flight == 0
@@ -0,0 +1,43 @@
+# src/chatddx/runtime/tests/test_agent_cache.py
+from pathlib import Path
+
+import pytest
+
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branches
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.agent_cache import AgentCache
+
+
+@pytest.fixture
+def agent_specs() -> list[AgentSpec]:
+    path = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(path, owner_name="agent-cache-owner")
+
+    return [branch.target for branch in load_branches("agent", "agent-cache-owner")]
+
+
+@pytest.mark.django_db
+def test_reuses_built_agent(agent_specs: list[AgentSpec]):
+    cache = AgentCache(max_size=10)
+    spec = agent_specs[0]
+
+    built = cache.get(spec, "key-a")
+
+    assert cache.get(spec.model_copy(), "key-a") is built
+    assert cache.get(spec, "key-b") is not built
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+    assert all("key-a" not in key for key in cache.cache)
+
+
+@pytest.mark.django_db
+def test_eviction(agent_specs: list[AgentSpec]):
+    cache = AgentCache(max_size=2)
+
+    for spec in agent_specs:
+        _ = cache.get(spec)
+
+    distinct = len({spec.fingerprint for spec in agent_specs})
+
+    assert cache.stats.size == min(2, distinct)
+    assert cache.stats.evictions == max(0, distinct - 2)
@@ -0,0 +1,222 @@
+# src/chatddx/runtime/tests/test_batch.py
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from django.test import override_settings
+from pydantic_ai import ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.history.models import SessionModel
+from chatddx.repo.base import BranchSpec
+from chatddx.repo.shufflers.main import (
+    dump_trail_registry,
+    ensure_identity_async,
+    load_branch,
+)
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.agent_cache import agent_cache
+from chatddx.runtime.batch import BatchCase, load_batch_cases, run_batch
+
+OWNER = "batch-owner"
+
+
+@pytest.fixture
+def agent_branch(transactional_db) -> BranchSpec[AgentSpec]:
+    path = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(path, owner_name=OWNER)
+    branch = load_branch("agent", OWNER, "no-thinking")
+    assert branch
+    return branch  # pyright: ignore[reportReturnType]
+
+
+class Model:
+    """
+    Fast cases wait for release, the slow one for the others to finish, or
+    forever when slow_after is None, so only its timeout ends it.
+    """
+
+    def __init__(self, released: bool = True, slow_after: int | None = None):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.finished = 0
+        self.slow_after = slow_after
+        self.release = asyncio.Event()
+        self.others_done = asyncio.Event()
+
+        if released:
+            self.release.set()
+
+    async def respond(self, messages: list[ModelMessage], info: AgentInfo):
+        prompt = messages[-1].parts[-1].content  # pyright: ignore
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            if prompt == "slow":
+                await self.others_done.wait()
+            else:
+                await self.release.wait()
+            if prompt == "fail":
+                raise RuntimeError("boom")
+            return ModelResponse(parts=[TextPart(f"diagnosed {prompt}")])
+        finally:
+            self.in_flight -= 1
+
+            if prompt != "slow":
+                self.finished += 1
+                if self.finished == self.slow_after:
+                    self.others_done.set()
+
+
+async def collect(
+    agent_branch: BranchSpec[AgentSpec],
+    cases,
+    model: Model | None = None,
+    **kwargs,
+):
+    owner = await ensure_identity_async(OWNER)
+    model = model or Model()
+
+    with agent_cache.get(agent_branch.target).agent.override(
+        model=FunctionModel(model.respond)
+    ):
+        items = [
+            item async for item in run_batch(owner.pk, agent_branch, cases, **kwargs)
+        ]
+
+    return model, items
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_completion_order_and_errors(agent_branch: BranchSpec[AgentSpec]):
+    cases = [BatchCase("slow", "a"), BatchCase("fail", "b")] + [
+        BatchCase(f"case {i}") for i in range(6)
+    ]
+
+    _, items = await collect(
+        agent_branch, cases, Model(slow_after=len(cases) - 1), concurrency=4
+    )
+
+    assert len(items) == len(cases)
+    assert items[-1].case.id == "a"
+    assert items[-1].output == "diagnosed slow"
+
+    (failed,) = [item for item in items if item.error]
+    assert failed.case.id == "b"
+    assert "boom" in str(failed.error)
+
+    session_ids = {item.session.id for item in items}
+    assert len(session_ids) == len(cases)
+    assert await SessionModel.objects.filter(pk__in=session_ids).acount() == len(cases)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+@override_settings(BATCH_MAX_CONCURRENCY=3)
+async def test_concurrency_cap_and_timeout(agent_branch: BranchSpec[AgentSpec]):
+    cases = [BatchCase("slow")] + [BatchCase(f"case {i}") for i in range(9)]
+    model = Model(released=False)
+
+    async def release():
+        # the cases are held until the cap is reached
+        while model.in_flight < 3:
+            await asyncio.sleep(0.01)
+        model.release.set()
+
+    releaser = asyncio.create_task(release())
+    _, items = await collect(agent_branch, cases, model, concurrency=50, timeout=0.5)
+    await releaser
+
+    assert model.max_in_flight == 3
+
+    (timed_out,) = [item for item in items if item.error]
+    assert isinstance(timed_out.error, TimeoutError)
+    assert timed_out.case.prompt == "slow"
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+@override_settings(BATCH_MAX_CONCURRENCY=3)
+async def test_batches_share_the_connection_cap(agent_branch: BranchSpec[AgentSpec]):
+    owner = await ensure_identity_async(OWNER)
+    model = Model(released=False)
+
+    async def release():
+        # every worker of both batches has a case, past the cap they wait
+        while model.in_flight < 3 or await SessionModel.objects.acount() < 6:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        model.release.set()
+
+    async def batch(name: str):
+        cases = [BatchCase(f"{name} {i}") for i in range(5)]
+        return [item async for item in run_batch(owner.pk, agent_branch, cases)]
+
+    with agent_cache.get(agent_branch.target).agent.override(
+        model=FunctionModel(model.respond)
+    ):
+        _, a, b = await asyncio.gather(release(), batch("a"), batch("b"))
+
+    assert len(a) == len(b) == 5
+    assert model.max_in_flight == 3
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_cases_are_read_as_workers_take_them(
+    agent_branch: BranchSpec[AgentSpec],
+):
+    owner = await ensure_identity_async(OWNER)
+    taken: list[int] = []
+
+    def cases():
+        for i in range(100):
+            taken.append(i)
+            yield BatchCase(f"case {i}")
+
+    with agent_cache.get(agent_branch.target).agent.override(
+        model=FunctionModel(Model().respond)
+    ):
+        async for _ in run_batch(owner.pk, agent_branch, cases(), concurrency=2):
+            break
+
+    # the cases in flight and the one each worker took next, no more
+    assert len(taken) <= 4
+    assert await SessionModel.objects.acount() <= len(taken)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_workers_end_when_the_consumer_leaves(
+    agent_branch: BranchSpec[AgentSpec],
+):
+    owner = await ensure_identity_async(OWNER)
+    cases = [BatchCase(f"case {i}") for i in range(20)]
+    before = asyncio.all_tasks()
+
+    with agent_cache.get(agent_branch.target).agent.override(
+        model=FunctionModel(Model().respond)
+    ):
+        items = run_batch(owner.pk, agent_branch, cases, concurrency=2)
+        _ = await anext(items)
+        # the workers fill the results queue and block on it
+        await asyncio.sleep(0.5)
+        await items.aclose()
+
+    await asyncio.sleep(0.1)
+    assert [task for task in asyncio.all_tasks() - before if not task.done()] == []
+
+
+def test_load_batch_cases(tmp_path: Path):
+    jsonl = tmp_path / "cases.jsonl"
+    jsonl.write_text('{"symptoms": "fever", "id": 1}\n\n"cough"\n')
+
+    listed = tmp_path / "cases.json"
+    listed.write_text(json.dumps([{"prompt": "rash"}]))
+
+    assert load_batch_cases(jsonl) == [BatchCase("fever", "1"), BatchCase("cough")]
+    assert load_batch_cases(listed) == [BatchCase("rash")]
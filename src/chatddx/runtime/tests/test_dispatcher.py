@@ -0,0 +1,133 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from pydantic_ai import ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.history.models import MessageModel
+from chatddx.history.session import start_session
+from chatddx.repo.shufflers.main import (
+    dump_trail_registry,
+    ensure_identity,
+    load_branch,
+)
+from chatddx.runtime.agent_cache import agent_cache
+from chatddx.runtime.runners import run_from_session, write_behind
+from chatddx.utils import Dispatcher, WriteBehind, observed_type
+
+OWNER = "dispatcher-owner"
+
+
+def observer(seen: list):
+    async def on_number(number: int | float):
+        seen.append(number)
+
+    return on_number
+
+
+def test_observed_type_is_resolved_once_per_def():
+    assert observed_type(observer([])) == int | float
+    assert observed_type(observer([])) == int | float
+
+    with pytest.raises(TypeError):
+        _ = observed_type(lambda untyped: None)
+
+
+def test_observed_type_follows_closure_annotations():
+    def observer_of(item_type: type):
+        def on_item(item: item_type):  # pyright: ignore[reportInvalidTypeForm]
+            pass
+
+        return on_item
+
+    assert observed_type(observer_of(int)) is int
+    assert observed_type(observer_of(str)) is str
+
+
+@pytest.mark.asyncio
+async def test_publish_resolves_subtypes():
+    seen: list = []
+    dispatcher = Dispatcher()
+    _ = dispatcher.subscribe(observer(seen))
+
+    def on_text(text: str):
+        seen.append(text)
+
+    _ = dispatcher.subscribe(on_text)
+
+    # bool is an int by its mro
+    for data in [1, 2.5, True, "a", None]:
+        await dispatcher.publish(data)
+
+    assert seen == [1, 2.5, True, "a"]
+
+
+@pytest.mark.asyncio
+async def test_write_behind():
+    written: list[int] = []
+    release = asyncio.Event()
+
+    async def on_number(number: int):
+        await release.wait()
+        written.append(number)
+
+    def on_failure(number: float):
+        raise RuntimeError("database is down")
+
+    queue = WriteBehind(max_size=2)
+    dispatcher = Dispatcher(queue)
+    _ = dispatcher.subscribe(on_number, behind=True)
+    _ = dispatcher.subscribe(on_failure, behind=True)
+
+    # the first is taken by the worker, two more fill the queue
+    for number in range(3):
+        await dispatcher.publish(number)
+
+    assert written == []
+
+    # a full queue holds the publisher back
+    blocked = asyncio.ensure_future(dispatcher.publish(3))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await dispatcher.publish(0.5)
+    await queue.aclose()
+
+    assert written == [0, 1, 2, 3]
+    assert queue.stats.written == 4
+    assert queue.stats.failed == 1
+    assert queue.stats.queued == 0
+
+
+@pytest.fixture
+def branch(transactional_db, settings):
+    settings.WRITE_BEHIND = True
+    registry = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(registry, owner_name=OWNER)
+    branch = load_branch("agent", OWNER, "no-thinking")
+    assert branch
+    return ensure_identity(OWNER), branch
+
+
+def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return ModelResponse(parts=[TextPart("appendicitis")])
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_session_messages_written_behind(branch):
+    owner, branch = branch
+    session = await start_session(owner.pk, branch.id)
+
+    with agent_cache.get(branch.target).agent.override(model=FunctionModel(respond)):
+        result = await run_from_session(session, "pain")
+
+    assert result.output == "appendicitis"
+
+    await write_behind.aclose()
+
+    kinds = [m.kind async for m in MessageModel.objects.filter(session_id=session.id)]
+    assert sorted(kinds) == ["prompt", "request", "response"]
@@ -0,0 +1,116 @@
+# src/chatddx/runtime/tests/test_http_pool.py
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from chatddx.django.asgi import application
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branches
+from chatddx.runtime.builder import build_model
+from chatddx.runtime.http_pool import HttpClientSettings, HttpPool, http_pool
+
+
+def test_clients_are_shared_per_key():
+    pool = HttpPool()
+
+    client = pool.get("http://llm/v1/", "key-a")
+
+    assert pool.get("http://llm/v1/", "key-a") is client
+    assert pool.get("http://llm/v1/", "key-b") is not client
+    assert (
+        pool.get("http://llm/v1/", "key-a", HttpClientSettings(http2=False)) is client
+    )
+    assert (
+        pool.get("http://llm/v1/", "key-a", HttpClientSettings(max_connections=1))
+        is not client
+    )
+    assert pool.stats() == []
+
+
+class Ok(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Ok)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_kept_per_event_loop(server: str):
+    pool = HttpPool()
+    client = pool.get(server)
+
+    async def job():
+        response = await client.get(server)
+        return response.status_code, pool.stats()
+
+    # like jobs run with async_to_sync, each on a loop of its own, the
+    # keep-alive connection of the previous loop must not be reused
+    results = [asyncio.run(job()) for _ in range(3)]
+
+    assert [status for status, _ in results] == [200, 200, 200]
+    assert all(len(stats) == 1 for _, stats in results)
+    assert pool.get(server) is client
+
+
+@pytest.mark.asyncio
+async def test_aclose_closes_connections_of_the_loop(server: str):
+    pool = HttpPool()
+    client = pool.get(server)
+
+    _ = await client.get(server)
+    assert [stats.idle for stats in pool.stats()] == [1]
+
+    await pool.aclose()
+
+    assert pool.stats() == []
+    assert not client.is_closed
+    assert (await client.get(server)).status_code == 200
+
+
+@pytest.mark.django_db
+def test_models_share_endpoint_client():
+    path = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(path, owner_name="http-pool-owner")
+    agents = [branch.target for branch in load_branches("agent", "http-pool-owner")]
+
+    clients = {
+        id(build_model(agent)._provider.client._client)
+        for agent in agents
+        if agent.connection.endpoint == agents[0].connection.endpoint
+    }
+
+    assert len(clients) == 1
+
+
+@pytest.mark.asyncio
+async def test_lifespan_shutdown_closes_pool():
+    _ = http_pool.transport(("http://llm/v1/", "", HttpClientSettings()))
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent: list[str] = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    await application({"type": "lifespan"}, receive, send)
+
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert http_pool.stats() == []
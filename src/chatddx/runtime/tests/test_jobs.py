@@ -0,0 +1,127 @@
+# src/chatddx/runtime/tests/test_jobs.py
+import json
+from contextlib import ExitStack
+from pathlib import Path
+
+import pytest
+from pydantic_ai import Agent, ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.history.models import SessionModel
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branch
+from chatddx.runtime.agent_cache import agent_cache
+from chatddx.runtime.jobs import load_samples, percentile, run_job
+
+OWNER = "jobs-owner"
+AGENTS = ["no-thinking", "thinking"]
+
+dataset = [
+    {"input": [{"role": "user", "content": "first"}], "target": "1"},
+    {"input": [{"role": "user", "content": "fail"}], "target": "2"},
+    {
+        "input": [
+            {"role": "system", "content": "be brief"},
+            {"role": "user", "content": "third"},
+        ]
+    },
+]
+
+
+@pytest.fixture
+def samples_path(transactional_db, tmp_path: Path) -> Path:
+    registry = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(registry, owner_name=OWNER)
+
+    path = tmp_path / "samples.jsonl"
+    _ = path.write_text("".join(json.dumps(row) + "\n" for row in dataset))
+    return path
+
+
+@pytest.fixture
+def agents(samples_path: Path) -> list[Agent]:
+    branches = [load_branch("agent", OWNER, name) for name in AGENTS]
+    return [agent_cache.get(branch.target).agent for branch in branches]  # pyright: ignore
+
+
+def overridden(agents: list[Agent], fail: bool) -> ExitStack:
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        prompt = messages[-1].parts[-1].content  # pyright: ignore
+        if fail and prompt == "fail":
+            raise RuntimeError("boom")
+        return ModelResponse(parts=[TextPart(f"answered {prompt}")])
+
+    stack = ExitStack()
+
+    for agent in agents:
+        _ = stack.enter_context(agent.override(model=FunctionModel(respond)))
+
+    return stack
+
+
+def read_lines(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_resume_from_checkpoint(
+    samples_path: Path, agents: list[Agent], tmp_path: Path
+):
+    output = tmp_path / "results.jsonl"
+
+    with overridden(agents, fail=True):
+        first = await run_job(OWNER, AGENTS, samples_path, output)
+
+    assert [(s.completed, s.failed, s.skipped) for s in first] == [(2, 1, 0)] * 2
+    assert all(len(s.latencies) == 2 for s in first)
+
+    lines = read_lines(output)
+    assert len(lines) == 6
+    assert {line["agent"] for line in lines} == set(AGENTS)
+    assert {line["error"] for line in lines if line["sample"] == 1} == {
+        "RuntimeError: boom"
+    }
+    assert {line["target"] for line in lines if line["sample"] == 0} == {"1"}
+
+    # an interrupted write leaves a torn last line
+    with output.open("a") as f:
+        _ = f.write('{"agent": "no-thi')
+
+    with overridden(agents, fail=False):
+        resumed = await run_job(OWNER, AGENTS, samples_path, output)
+
+    assert [(s.completed, s.skipped) for s in resumed] == [(0, 3)] * 2
+
+    with overridden(agents, fail=False):
+        retried = await run_job(OWNER, AGENTS, samples_path, output, retry_errors=True)
+
+    assert [(s.completed, s.failed, s.skipped) for s in retried] == [(1, 0, 2)] * 2
+
+    lines = read_lines(output)
+    assert len(lines) == 8
+    assert {line["output"] for line in lines[-2:]} == {"answered fail"}
+    # sessions are only started for the samples that ran
+    assert await SessionModel.objects.acount() == len(lines)
+
+
+def test_load_samples(tmp_path: Path):
+    path = tmp_path / "samples.json"
+    _ = path.write_text(json.dumps(dataset))
+
+    samples = list(load_samples(path))
+
+    assert [sample.prompt for sample in samples] == [
+        "first",
+        "fail",
+        "system: be brief\n\nuser: third",
+    ]
+    assert [sample.target for sample in samples] == ["1", "2", None]
+
+
+def test_percentile():
+    latencies = [float(i) for i in range(1, 101)]
+
+    assert percentile(latencies, 50) == 50.0
+    assert percentile(latencies, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
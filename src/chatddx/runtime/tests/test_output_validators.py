@@ -0,0 +1,79 @@
+# src/chatddx/runtime/tests/test_output_validators.py
+from datetime import datetime
+
+import jsonschema
+import pytest
+
+from chatddx.repo.trail_specs import OutputTypeSpec
+from chatddx.runtime.output_validators import OutputValidators
+
+definition = {
+    "type": "object",
+    "properties": {
+        "diagnoses": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "probability": {"type": "number", "minimum": 0, "maximum": 1},
+                },
+                "required": ["name", "probability"],
+            },
+        },
+    },
+    "required": ["diagnoses"],
+}
+
+
+def make_output_type(fingerprint: str = "a" * 64) -> OutputTypeSpec:
+    return OutputTypeSpec(
+        id=1,
+        fingerprint=fingerprint,
+        timestamp=datetime.now(),
+        definition=definition,
+    )
+
+
+def test_compiles_once():
+    validators = OutputValidators(max_size=2)
+    output_type = make_output_type()
+
+    validator = validators.get(output_type)
+
+    assert validators.get(make_output_type()) is validator
+    assert validators.stats.hits == 1
+    assert validators.stats.misses == 1
+
+    for fingerprint in ("b" * 64, "c" * 64):
+        _ = validators.get(make_output_type(fingerprint))
+
+    assert validators.stats.size == 2
+    assert validators.stats.evictions == 1
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        {"diagnoses": [{"name": "flu", "probability": 0.5}]},
+        {"diagnoses": [{"name": "flu", "probability": 2}]},
+        {"diagnoses": [{"name": "flu"}]},
+        {},
+    ],
+)
+def test_matches_jsonschema_validate(instance: dict):
+    validators = OutputValidators(max_size=2)
+
+    try:
+        jsonschema.validate(instance=instance, schema=definition)
+        expected = None
+    except jsonschema.ValidationError as e:
+        expected = e.message
+
+    try:
+        validators.validate(make_output_type(), instance)
+        actual = None
+    except jsonschema.ValidationError as e:
+        actual = e.message
+
+    assert actual == expected
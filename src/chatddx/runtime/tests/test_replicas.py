@@ -0,0 +1,163 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from pydantic_ai import Agent, ModelMessage, ModelResponse, TextPart
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.repo.shufflers.main import dump_trail_registry, load_branch
+from chatddx.runtime.builder import build_replicated_model
+from chatddx.runtime.replicas import (
+    Replica,
+    ReplicaSettings,
+    ReplicaStats,
+    ReplicatedModel,
+)
+
+OWNER = "replicas-owner"
+
+
+def replica(name: str, behavior: str = "ok") -> Replica:
+    async def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        match behavior:
+            case "down":
+                raise ModelHTTPError(503, name, {"message": "overloaded"})
+            case "invalid":
+                raise ModelHTTPError(400, name, {"message": "bad request"})
+            case "slow":
+                await asyncio.sleep(5)
+        return ModelResponse(parts=[TextPart(name)])
+
+    async def stream(messages: list[ModelMessage], info: AgentInfo):
+        if behavior == "down":
+            raise ModelHTTPError(503, name, {"message": "overloaded"})
+        yield name
+
+    return Replica(FunctionModel(respond, stream_function=stream), ReplicaStats(name))
+
+
+def agent(*replicas: Replica, **settings) -> tuple[Agent, ReplicatedModel]:
+    model = ReplicatedModel(list(replicas), ReplicaSettings(**settings))
+    return Agent(model), model
+
+
+@pytest.mark.asyncio
+async def test_round_robin():
+    pool, _model = agent(replica("a"), replica("b"))
+
+    outputs = [(await pool.run("hello")).output for _ in range(4)]
+
+    assert outputs == ["a", "b", "a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_failover_and_cooldown():
+    down = replica("a", "down")
+    pool, _model = agent(down, replica("b"))
+
+    assert (await pool.run("hello")).output == "b"
+    assert down.stats.failures == 1
+
+    # the failed replica is tried last while it cools down
+    assert [(await pool.run("hello")).output for _ in range(2)] == ["b", "b"]
+    assert down.stats.requests == 1
+
+
+@pytest.mark.asyncio
+async def test_request_errors_do_not_fail_over():
+    other = replica("b")
+    pool, _model = agent(replica("a", "invalid"), other)
+
+    with pytest.raises(ModelHTTPError):
+        _ = await pool.run("hello")
+
+    assert other.stats.requests == 0
+
+
+@pytest.mark.asyncio
+async def test_all_replicas_down():
+    pool, _model = agent(replica("a", "down"), replica("b", "down"))
+
+    with pytest.raises(ModelHTTPError) as e:
+        _ = await pool.run("hello")
+
+    assert e.value.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_attempt_timeout():
+    pool, _model = agent(replica("a", "slow"), replica("b"), attempt_timeout=0.05)
+
+    assert (await pool.run("hello")).output == "b"
+
+
+@pytest.mark.asyncio
+async def test_hedge():
+    slow = replica("a", "slow")
+    fast = replica("b")
+    pool, _model = agent(slow, fast, hedge=True, hedge_after=0.05)
+
+    assert (await pool.run("hello")).output == "b"
+    assert fast.stats.hedges == 1
+    assert slow.stats.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_after_observed_quantile():
+    _pool, model = agent(replica("a"), replica("b"), hedge=True, hedge_min_samples=3)
+
+    assert model.hedge_delay() is None
+
+    model.latencies.extend([0.1, 0.2, 0.3])
+    assert model.hedge_delay() == 0.3
+
+
+@pytest.mark.asyncio
+async def test_stream_failover():
+    pool, _model = agent(replica("a", "down"), replica("b"))
+
+    async with pool.run_stream("hello") as streamed:
+        assert await streamed.get_output() == "b"
+
+
+def replicated_spec():
+    registry = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(registry, owner_name=OWNER)
+    branch = load_branch("agent", OWNER, "no-thinking")
+    assert branch
+
+    spec = branch.target
+    assert not isinstance(build_replicated_model(spec), ReplicatedModel)
+
+    profile = spec.connection.profile | {
+        "replicas": {"endpoints": ["http://replica:8000/v1"], "hedge": True}
+    }
+    connection = spec.connection.model_copy(update={"profile": profile})
+    return spec.model_copy(update={"connection": connection})
+
+
+@pytest.mark.django_db
+def test_build_from_profile():
+    spec = replicated_spec()
+
+    model = build_replicated_model(spec)
+
+    assert isinstance(model, ReplicatedModel)
+    assert [s.endpoint for s in model.stats()] == [
+        str(spec.connection.endpoint),
+        "http://replica:8000/v1",
+    ]
+
+
+@pytest.mark.django_db
+def test_health_is_shared_across_api_keys():
+    spec = replicated_spec()
+
+    first = build_replicated_model(spec, "key-1")
+    second = build_replicated_model(spec, "key-2")
+    assert isinstance(first, ReplicatedModel)
+    assert isinstance(second, ReplicatedModel)
+
+    assert all(a is b for a, b in zip(first.stats(), second.stats(), strict=True))
+    assert first.latencies is second.latencies
@@ -0,0 +1,120 @@
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+from django.utils import timezone
+from pydantic_ai import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RequestUsage,
+    TextPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from chatddx.history.models import MessageModel
+from chatddx.history.session import start_session
+from chatddx.repo.base import BranchSpec
+from chatddx.repo.shufflers.main import (
+    dump_trail_registry,
+    ensure_identity,
+    load_branch,
+)
+from chatddx.repo.trail_specs import AgentSpec
+from chatddx.runtime.agent_cache import agent_cache
+from chatddx.runtime.response_cache import response_cache
+from chatddx.runtime.runners import run_from_session
+
+OWNER = "response-cache-owner"
+
+
+@pytest.fixture
+def branch(transactional_db) -> BranchSpec[AgentSpec]:
+    registry = Path(__file__).parent / "data/test-llm-basics.toml"
+    _ = dump_trail_registry(registry, owner_name=OWNER)
+    branch = load_branch("agent", OWNER, "no-thinking")
+    assert branch
+
+    response_cache.clear()
+    return branch  # pyright: ignore[reportReturnType]
+
+
+@pytest.fixture
+def owner_id(branch) -> int:
+    return ensure_identity(OWNER).pk
+
+
+class Counted:
+    def __init__(self):
+        self.calls = 0
+
+    def respond(self, messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        self.calls += 1
+        return ModelResponse(
+            parts=[TextPart("appendicitis")],
+            usage=RequestUsage(input_tokens=10, output_tokens=2),
+        )
+
+
+async def run(owner_id: int, branch: BranchSpec[AgentSpec], agent_spec: AgentSpec):
+    session = await start_session(owner_id, branch)
+    result = await run_from_session(session, "pain", agent_spec=agent_spec, cache=True)
+    return session, result
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_replays_deterministic_runs(owner_id: int, branch):
+    model = Counted()
+    agent = agent_cache.get(branch.target).agent
+
+    with agent.override(model=FunctionModel(model.respond)):
+        _first, result = await run(owner_id, branch, branch.target)
+        session, replayed = await run(owner_id, branch, branch.target)
+
+    assert model.calls == 1
+    assert replayed.output == result.output == "appendicitis"
+    assert response_cache.stats.hits == 1
+
+    response = await MessageModel.objects.aget(session_id=session.id, kind="response")
+    assert response.cached
+    assert response.input_tokens == response.output_tokens == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_sampled_runs_are_not_cached(owner_id: int, branch):
+    model = Counted()
+    agent = agent_cache.get(branch.target).agent
+    sampled = branch.target.model_copy(
+        update={
+            "sampling_params": branch.target.sampling_params.model_copy(
+                update={"seed": None, "temperature": None}
+            )
+        }
+    )
+
+    with agent.override(model=FunctionModel(model.respond)):
+        _ = await run(owner_id, branch, sampled)
+        _ = await run(owner_id, branch, sampled)
+
+    assert model.calls == 2
+    assert response_cache.stats.size == 0
+
+
+def test_key_ignores_timestamps(branch):
+    history: list[ModelMessage] = [
+        ModelRequest(parts=[UserPromptPart("pain")]),
+        ModelResponse(parts=[TextPart("appendicitis")]),
+    ]
+    later = timezone.now().replace(year=2030)
+    rerun: list[ModelMessage] = [
+        replace(history[0], parts=[UserPromptPart("pain", timestamp=later)]),
+        replace(history[1], timestamp=later, provider_response_id="other"),
+    ]
+
+    key = response_cache.key(branch.target, history, "more pain")
+
+    assert key == response_cache.key(branch.target, rerun, "more pain")
+    assert key != response_cache.key(branch.target, history, "less pain")
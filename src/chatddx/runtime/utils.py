@@ -39,3 +39,14 @@ def get_part_content(
 
     if content:
         return content[0]
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest rank, so every reported latency was actually observed
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+
+    return ordered[int(rank) - 1]
@@ -1,15 +1,18 @@
 import asyncio
 import hashlib
 import inspect
+import logging
 from collections.abc import Awaitable, Coroutine
 from dataclasses import dataclass, field
 from decimal import Decimal
+from types import CodeType
 from typing import (
     Any,
     Callable,
     cast,
     get_type_hints,
 )
+from weakref import WeakKeyDictionary
 
 from asgiref.sync import sync_to_async
 from django.db.models import Model as DjangoModel
@@ -18,6 +21,8 @@ from pydantic import HttpUrl, JsonValue
 
 type Observer[T] = Callable[[T], None | Awaitable[None]]
 
+logger = logging.getLogger(__name__)
+
 
 def make_async[**P, R](func: Callable[P, R]) -> Callable[P, Coroutine[None, None, R]]:
     return sync_to_async(func)
@@ -64,42 +69,168 @@ def one_or_list_of[T](t: type[T], value: object) -> OneOf[T] | ListOf[T] | None:
             return ListOf(cast(list[T], value))
 
 
-class Dispatcher:
-    def __init__(self):
-        self._handlers: dict[type[Any], list[Observer[Any]]] = {}
+# fn, whether it is a coroutine function, whether it may run write-behind
+type Subscription = tuple[Observer[Any], bool, bool]
 
-    def subscribe[T](self, fn: Observer[T]) -> Observer[T]:
-        target = fn if inspect.isroutine(fn) else fn.__call__
+# observed types by code object with the annotations they were resolved
+# from, closures made by one def share an entry while their annotations agree
+_observed_types: WeakKeyDictionary[CodeType, tuple[dict[str, Any], Any]] = (
+    WeakKeyDictionary()
+)
 
-        hints = get_type_hints(target)
-        sig = inspect.signature(target)
-        params = list(sig.parameters.values())
 
-        name = getattr(fn, "__name__", type(fn).__name__)
-        if not params:
-            raise ValueError(f"Handler {name} must accept an argument.")
+def observed_type(fn: Observer[Any]) -> Any:
+    target = fn if inspect.isroutine(fn) else fn.__call__
+    function = getattr(target, "__func__", target)
+    code: CodeType | None = getattr(function, "__code__", None)
+    annotations: dict[str, Any] = getattr(function, "__annotations__", {})
 
-        first_arg_name = params[0].name
-        item_type = hints.get(first_arg_name)
+    if code is not None and (entry := _observed_types.get(code)) is not None:
+        resolved_from, item_type = entry
+        if resolved_from == annotations:
+            return item_type
+
+    hints = get_type_hints(target)
+    sig = inspect.signature(target)
+    params = list(sig.parameters.values())
+
+    name = getattr(fn, "__name__", type(fn).__name__)
+    if not params:
+        raise ValueError(f"Handler {name} must accept an argument.")
+
+    first_arg_name = params[0].name
+    item_type = hints.get(first_arg_name)
+
+    if not item_type:
+        raise TypeError(f"Missing type hint for '{first_arg_name}' in {fn.__name__}")
+
+    if code is not None:
+        _observed_types[code] = (dict(annotations), item_type)
+
+    return item_type
 
-        if not item_type:
-            raise TypeError(
-                f"Missing type hint for '{first_arg_name}' in {fn.__name__}"
-            )
 
-        self._handlers.setdefault(item_type, []).append(fn)
+class Dispatcher:
+    """
+    Publishes data to the handlers subscribed to its type. Handlers
+    subscribed with behind=True only persist what they are given, with a
+    write_behind queue they run on it and publish does not wait for them.
+    """
+
+    def __init__(self, write_behind: "WriteBehind | None" = None):
+        self.write_behind = write_behind
+        self._handlers: dict[Any, list[Subscription]] = {}
+        self._resolved: dict[type[Any], list[Subscription]] = {}
+
+    def subscribe[T](self, fn: Observer[T], behind: bool = False) -> Observer[T]:
+        item_type = observed_type(fn)
+
+        self._handlers.setdefault(item_type, []).append(
+            (fn, inspect.iscoroutinefunction(fn), behind)
+        )
+        self._resolved.clear()
         return fn
 
     async def publish(self, data: Any):
         tasks: list[Awaitable[Any]] = []
-        for registered_type, handlers in self._handlers.items():
-            if registered_type == Any or isinstance(data, registered_type):
-                for handler in handlers:
-                    if inspect.iscoroutinefunction(handler):
-                        tasks.append(handler(data))
-                    else:
-                        tasks.append(asyncio.to_thread(handler, data))
-        _ = await asyncio.gather(*tasks)
+
+        for handler, is_coroutine, behind in self._resolve(type(data)):
+            if behind and self.write_behind is not None:
+                await self.write_behind.submit(handler, data)
+            elif is_coroutine:
+                tasks.append(handler(data))
+            else:
+                tasks.append(asyncio.to_thread(handler, data))
+
+        if tasks:
+            _ = await asyncio.gather(*tasks)
+
+    def _resolve(self, data_type: type[Any]) -> list[Subscription]:
+        # issubclass walks the mro and understands unions and abcs, once a type
+        if (subscriptions := self._resolved.get(data_type)) is None:
+            subscriptions = self._resolved[data_type] = [
+                subscription
+                for registered_type, handlers in self._handlers.items()
+                if registered_type == Any or issubclass(data_type, registered_type)
+                for subscription in handlers
+            ]
+
+        return subscriptions
+
+
+@dataclass
+class WriteBehindStats:
+    queued: int = 0
+    written: int = 0
+    failed: int = 0
+
+
+class WriteBehind:
+    """
+    A bounded queue of handler calls run in order by one background task per
+    event loop. submit waits while the queue is full, so a database that
+    falls behind slows publishers down instead of growing the queue.
+
+    A failed call is logged and dropped. Call flush to wait for everything
+    submitted so far, and aclose on shutdown.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.stats = WriteBehindStats()
+        self._workers: dict[
+            asyncio.AbstractEventLoop,
+            tuple[asyncio.Queue[tuple[Observer[Any], Any]], asyncio.Task[None]],
+        ] = {}
+
+    async def submit(self, handler: Observer[Any], data: Any):
+        queue, _ = self._worker()
+        self.stats.queued += 1
+        await queue.put((handler, data))
+
+    async def flush(self):
+        if (worker := self._workers.get(asyncio.get_running_loop())) is not None:
+            await worker[0].join()
+
+    async def aclose(self):
+        if (worker := self._workers.pop(asyncio.get_running_loop(), None)) is None:
+            return
+
+        queue, task = worker
+        await queue.join()
+        _ = task.cancel()
+
+    def _worker(self):
+        loop = asyncio.get_running_loop()
+
+        if (worker := self._workers.get(loop)) is None:
+            # workers of event loops that are gone went with them
+            for closed in [other for other in self._workers if other.is_closed()]:
+                del self._workers[closed]
+
+            queue: asyncio.Queue[tuple[Observer[Any], Any]] = asyncio.Queue(
+                self.max_size
+            )
+            worker = self._workers[loop] = (queue, loop.create_task(self._run(queue)))
+
+        return worker
+
+    async def _run(self, queue: asyncio.Queue[tuple[Observer[Any], Any]]):
+        while True:
+            handler, data = await queue.get()
+
+            try:
+                if inspect.iscoroutinefunction(handler):
+                    await handler(data)
+                else:
+                    await asyncio.to_thread(handler, data)
+                self.stats.written += 1
+            except Exception:
+                self.stats.failed += 1
+                logger.exception("Write-behind handler %s failed", handler)
+            finally:
+                self.stats.queued -= 1
+                queue.task_done()
 
 
 @dataclass